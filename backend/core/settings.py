@@ -1,4 +1,5 @@
 """Django settings for core project."""
+import sys
 from pathlib import Path
 
 import environ
@@ -30,11 +31,13 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "crm.compression.CompressionMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "crm.profiling.ProfilingMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -97,6 +100,8 @@ REST_FRAMEWORK = {
         "rest_framework.authentication.SessionAuthentication",
         "rest_framework.authentication.BasicAuthentication",
     ],
+    "DEFAULT_FILTER_BACKENDS": ["crm.filters.IndexedFilterBackend"],
+    "DEFAULT_PAGINATION_CLASS": "crm.pagination.EstimatedCountPagination",
 }
 
 CORS_ALLOWED_ORIGINS: list[str] = env.list(
@@ -115,3 +120,87 @@ CSRF_COOKIE_SAMESITE = SESSION_COOKIE_SAMESITE
 CSRF_COOKIE_SECURE = SESSION_COOKIE_SECURE
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+TESTING = sys.argv[1:2] == ["test"]
+
+# In-memory lead-to-client matching (crm.matching). Off under the test runner,
+# whose in-memory SQLite database the warm-up thread cannot share.
+CRM_CONTACT_INDEX = env.bool("CRM_CONTACT_INDEX", default=not TESTING)
+CRM_CONTACT_INDEX_REFRESH_SECONDS = env.int("CRM_CONTACT_INDEX_REFRESH_SECONDS", default=30)
+
+# Generated numbers look like POL-2025-000123; override per kind (prefix,
+# width, yearly, separator, block_size).
+CRM_NUMBER_FORMATS: dict = {}
+
+# Lists larger than this report the planner's row estimate instead of COUNT(*).
+CRM_ESTIMATED_COUNT_THRESHOLD = env.int("CRM_ESTIMATED_COUNT_THRESHOLD", default=100_000)
+
+CACHES = {"default": env.cache_url("CACHE_URL", default="locmemcache://")}
+
+vars().update(env.email_url("EMAIL_URL", default="consolemail://"))
+DEFAULT_FROM_EMAIL = env("DEFAULT_FROM_EMAIL", default="no-reply@crossinsurancepr.com")
+
+CRM_REMINDER_RENEWAL_DAYS = env.int("CRM_REMINDER_RENEWAL_DAYS", default=30)
+CRM_REMINDER_WORKERS = env.int("CRM_REMINDER_WORKERS", default=4)
+
+# Queue name -> tasks of that queue allowed to run at once per worker.
+CRM_TASK_QUEUES = {
+    "default": env.int("CRM_TASK_CONCURRENCY", default=4),
+    "purge": 1,
+}
+CRM_TASK_TIMEOUT = env.int("CRM_TASK_TIMEOUT", default=900)
+CRM_TASK_RETRY_BACKOFF = 30
+
+# Change log readers skip events younger than this so concurrent commits settle.
+CRM_CHANGE_LOG_SETTLE_SECONDS = env.int("CRM_CHANGE_LOG_SETTLE_SECONDS", default=2)
+
+CRM_DASHBOARD_PUSH_INTERVAL = env.int("CRM_DASHBOARD_PUSH_INTERVAL", default=2)
+CRM_DASHBOARD_REFRESH_SECONDS = env.int("CRM_DASHBOARD_REFRESH_SECONDS", default=60)
+CRM_DASHBOARD_STREAM_SECONDS = env.int("CRM_DASHBOARD_STREAM_SECONDS", default=300)
+
+# Opt-in: GET list/retrieve on the crm viewsets build JSON from values() rows
+# (crm.fast_serializers).
+CRM_FAST_SERIALIZATION = env.bool("CRM_FAST_SERIALIZATION", default=False)
+
+# Response compression (crm.compression): gzip always, br/zstd when installed.
+CRM_COMPRESSION_PATHS = ["/api/"]
+CRM_COMPRESSION_MIN_SIZE = env.int("CRM_COMPRESSION_MIN_SIZE", default=1024)
+
+# Days between an installment's issue date and its due date (crm.billing).
+CRM_INSTALLMENT_DUE_DAYS = env.int("CRM_INSTALLMENT_DUE_DAYS", default=30)
+
+# Country assumed for client addresses without one (crm.analytics territories).
+CRM_DEFAULT_COUNTRY = env("CRM_DEFAULT_COUNTRY", default="PR")
+
+# Where export_snapshot writes the Parquet/Arrow snapshots (crm.snapshots).
+CRM_SNAPSHOT_DIR = env("CRM_SNAPSHOT_DIR", default=str(BASE_DIR / "snapshots"))
+
+# Public lead submissions are spooled and written in batches (crm.lead_buffer).
+CRM_LEAD_BUFFER = env.bool("CRM_LEAD_BUFFER", default=False)
+CRM_LEAD_BUFFER_SIZE = env.int("CRM_LEAD_BUFFER_SIZE", default=200)
+CRM_LEAD_BUFFER_SECONDS = env.float("CRM_LEAD_BUFFER_SECONDS", default=1.0)
+CRM_LEAD_SPOOL_DIR = env("CRM_LEAD_SPOOL_DIR", default=str(BASE_DIR / "spool" / "leads"))
+CRM_LEAD_SPOOL_FSYNC = True
+
+# Chunked client purges and retention (crm.purge).
+CRM_PURGE_CHUNK_SIZE = env.int("CRM_PURGE_CHUNK_SIZE", default=500)
+CRM_PURGE_THROTTLE_SECONDS = env.float("CRM_PURGE_THROTTLE_SECONDS", default=0.05)
+CRM_PURGE_TASK_SECONDS = 300
+# Days rows are kept per retention policy (None keeps them forever). Deleting
+# leads is opt-in: set CRM_LEAD_RETENTION_DAYS (e.g. 730) to enable it.
+CRM_RETENTION_DAYS = {
+    "leads": env.int("CRM_LEAD_RETENTION_DAYS", default=None),
+    "tasks": 30,
+    "reminders": 400,
+    "change_events": 30,
+}
+
+# Sampled request profiling (crm.profiling): staff (session or API credentials)
+# send "X-CRM-Profile: 1", or a fraction of the requests under CRM_PROFILING_PATHS
+# is profiled.
+CRM_PROFILING_SAMPLE_RATE = env.float("CRM_PROFILING_SAMPLE_RATE", default=0.0)
+CRM_PROFILING_PATHS = env.list(
+    "CRM_PROFILING_PATHS", default=["/api/policies/", "/api/dashboard/metrics/"]
+)
+CRM_PROFILING_INTERVAL = 0.005
+CRM_PROFILING_DIR = env("CRM_PROFILING_DIR", default=str(BASE_DIR / "profiles"))
@@ -1,10 +1,197 @@
+from functools import cached_property
+
+from django.conf import settings
 from django.contrib import admin
+from django.contrib.admin.utils import get_fields_from_path
+from django.core import checks
+from django.core.exceptions import FieldDoesNotExist
+from django.core.paginator import Paginator
+from django.db import models
+
+from .counts import estimated_count
+from .models import (
+    ChangeConsumer,
+    Client,
+    CommissionLine,
+    CommissionSchedule,
+    CommissionStatement,
+    Document,
+    ImportRun,
+    InsuranceProduct,
+    Invoice,
+    Lead,
+    LeadCohort,
+    NumberSequence,
+    Policy,
+    ReminderDispatch,
+    Renewal,
+    Task,
+    Territory,
+    TerritoryRollup,
+)
+
+
+class EstimatedCountPaginator(Paginator):
+    @cached_property
+    def count(self):
+        if hasattr(self.object_list, "query"):
+            return estimated_count(self.object_list)[0]
+        return super().count
+
+
+class KnownValuesFieldListFilter(admin.AllValuesFieldListFilter):
+    """Lists the values from the admin's ``list_filter_values`` for the field.
+
+    Django's default filter for a char field without ``choices`` runs a
+    ``SELECT DISTINCT`` over the whole table on every changelist.
+    """
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        self.lookup_kwarg = field_path
+        self.lookup_kwarg_isnull = f"{field_path}__isnull"
+        self.lookup_val = params.get(self.lookup_kwarg)
+        self.lookup_val_isnull = params.get(self.lookup_kwarg_isnull)
+        self.empty_value_display = model_admin.get_empty_value_display()
+        self.lookup_choices = sorted(set(model_admin.list_filter_values[field_path]()))
+        admin.FieldListFilter.__init__(
+            self, field, request, params, model, model_admin, field_path
+        )
+
+
+def product_categories():
+    return InsuranceProduct.ProductCategory.values
+
+
+def cohort_sources():
+    """Lead sources seen by the weekly cohorts (a new one shows after a refresh)."""
+
+    return LeadCohort.objects.order_by().values_list("source", flat=True).distinct()
+
+
+class ScalableAdminMixin:
+    """Keeps changelists cheap on large tables.
+
+    ``select_related`` is derived from the foreign keys shown in
+    ``list_display`` (plus the non-null keys of their targets, which their
+    ``__str__`` usually walks), FK inputs use autocomplete widgets whenever the
+    related admin is searchable, and the paginator reports planner estimates
+    instead of running ``COUNT(*)`` on big tables. Char ``list_filter`` fields
+    without ``choices`` take their options from ``list_filter_values``
+    (field path -> callable) rather than a ``DISTINCT`` scan.
+    """
 
-from .models import Client, Document, InsuranceProduct, Invoice, Lead, Policy, Renewal
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_select_related_depth = 2
+    list_filter_values: dict = {}
+
+    def get_list_filter(self, request):
+        return [
+            (
+                (name, KnownValuesFieldListFilter)
+                if isinstance(name, str) and name in self.list_filter_values
+                else name
+            )
+            for name in super().get_list_filter(request)
+        ]
+
+    def get_list_select_related(self, request):
+        if self.list_select_related is not False:
+            return self.list_select_related
+        paths = []
+        for name in self.get_list_display(request):
+            if name == "__str__":
+                paths.extend(
+                    self._related_paths(self.model, "", self.list_select_related_depth)
+                )
+                continue
+            if not isinstance(name, str):
+                continue
+            field = self._forward_fk(self.model, name)
+            if field:
+                paths.append(name)
+                paths.extend(
+                    self._related_paths(
+                        field.related_model,
+                        f"{name}__",
+                        self.list_select_related_depth - 1,
+                    )
+                )
+        return list(dict.fromkeys(paths)) or False
+
+    def get_autocomplete_fields(self, request):
+        if self.autocomplete_fields:
+            return self.autocomplete_fields
+        fields = []
+        for field in self.model._meta.get_fields():
+            if not (field.many_to_one and field.concrete):
+                continue
+            related_admin = self.admin_site._registry.get(field.related_model)
+            if related_admin and related_admin.search_fields:
+                fields.append(field.name)
+        return fields
+
+    def check(self, **kwargs):
+        errors = super().check(**kwargs)
+        if self.date_hierarchy:
+            field = self.model._meta.get_field(self.date_hierarchy)
+            indexed = (
+                field.db_index
+                or field.unique
+                or any(
+                    index.fields and index.fields[0].lstrip("-") == field.name
+                    for index in self.model._meta.indexes
+                )
+            )
+            if not indexed:
+                errors.append(
+                    checks.Warning(
+                        f"date_hierarchy '{self.date_hierarchy}' is not indexed.",
+                        hint="Add db_index=True or a Meta.indexes entry.",
+                        obj=self.__class__,
+                        id="crm.W001",
+                    )
+                )
+        for name in self.list_filter:
+            if not isinstance(name, str) or name in self.list_filter_values:
+                continue
+            field = get_fields_from_path(self.model, name)[-1]
+            if isinstance(field, models.CharField) and not field.choices:
+                errors.append(
+                    checks.Warning(
+                        f"list_filter '{name}' lists its options with SELECT DISTINCT.",
+                        hint="Give it choices or a list_filter_values entry.",
+                        obj=self.__class__,
+                        id="crm.W003",
+                    )
+                )
+        return errors
+
+    @staticmethod
+    def _forward_fk(model, name):
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return None
+        return field if field.many_to_one and field.concrete else None
+
+    @classmethod
+    def _related_paths(cls, model, prefix, depth):
+        if depth <= 0:
+            return []
+        paths = []
+        for field in model._meta.get_fields():
+            if field.many_to_one and field.concrete and not field.null:
+                path = f"{prefix}{field.name}"
+                paths.append(path)
+                paths.extend(
+                    cls._related_paths(field.related_model, f"{path}__", depth - 1)
+                )
+        return paths
 
 
 @admin.register(Client)
-class ClientAdmin(admin.ModelAdmin):
+class ClientAdmin(ScalableAdminMixin, admin.ModelAdmin):
     list_display = ("first_name", "last_name", "email", "phone_primary", "created_at")
     search_fields = (
         "first_name",
@@ -17,14 +204,14 @@ class ClientAdmin(admin.ModelAdmin):
 
 
 @admin.register(InsuranceProduct)
-class InsuranceProductAdmin(admin.ModelAdmin):
+class InsuranceProductAdmin(ScalableAdminMixin, admin.ModelAdmin):
     list_display = ("name", "category", "is_active", "updated_at")
     list_filter = ("category", "is_active")
     search_fields = ("name",)
 
 
 @admin.register(Policy)
-class PolicyAdmin(admin.ModelAdmin):
+class PolicyAdmin(ScalableAdminMixin, admin.ModelAdmin):
     list_display = (
         "policy_number",
         "client",
@@ -34,18 +221,20 @@ class PolicyAdmin(admin.ModelAdmin):
         "renewal_date",
     )
     search_fields = ("policy_number", "client__first_name", "client__last_name")
-    list_filter = ("status", "product__category")
+    list_filter = ("status", "product__category", "payment_plan")
+    date_hierarchy = "renewal_date"
 
 
 @admin.register(Renewal)
-class RenewalAdmin(admin.ModelAdmin):
+class RenewalAdmin(ScalableAdminMixin, admin.ModelAdmin):
     list_display = ("policy", "renewal_date", "status", "updated_at")
     list_filter = ("status", "renewal_date")
     search_fields = ("policy__policy_number",)
+    date_hierarchy = "renewal_date"
 
 
 @admin.register(Invoice)
-class InvoiceAdmin(admin.ModelAdmin):
+class InvoiceAdmin(ScalableAdminMixin, admin.ModelAdmin):
     list_display = (
         "invoice_number",
         "policy",
@@ -56,10 +245,11 @@ class InvoiceAdmin(admin.ModelAdmin):
     )
     list_filter = ("status", "is_manual")
     search_fields = ("invoice_number", "policy__policy_number")
+    date_hierarchy = "issue_date"
 
 
 @admin.register(Document)
-class DocumentAdmin(admin.ModelAdmin):
+class DocumentAdmin(ScalableAdminMixin, admin.ModelAdmin):
     list_display = (
         "title",
         "client",
@@ -73,7 +263,134 @@ class DocumentAdmin(admin.ModelAdmin):
 
 
 @admin.register(Lead)
-class LeadAdmin(admin.ModelAdmin):
-    list_display = ("name", "insurance_type", "phone", "email", "created_at", "source")
+class LeadAdmin(ScalableAdminMixin, admin.ModelAdmin):
+    list_display = (
+        "name",
+        "insurance_type",
+        "phone",
+        "email",
+        "created_at",
+        "source",
+        "matched_client",
+        "match_confidence",
+        "converted_at",
+    )
     list_filter = ("insurance_type", "source", "created_at")
+    list_filter_values = {"source": cohort_sources}
     search_fields = ("name", "phone", "email")
+    date_hierarchy = "created_at"
+
+
+@admin.register(NumberSequence)
+class NumberSequenceAdmin(admin.ModelAdmin):
+    list_display = ("name", "next_value")
+    search_fields = ("name",)
+
+
+@admin.register(ReminderDispatch)
+class ReminderDispatchAdmin(ScalableAdminMixin, admin.ModelAdmin):
+    list_display = ("kind", "object_id", "cycle", "recipient", "status", "sent_at")
+    list_filter = ("kind", "status")
+    search_fields = ("recipient",)
+
+
+@admin.register(Task)
+class TaskAdmin(ScalableAdminMixin, admin.ModelAdmin):
+    list_display = ("name", "queue", "status", "priority", "attempts", "run_at")
+    list_filter = ("queue", "status")
+    list_filter_values = {"queue": lambda: settings.CRM_TASK_QUEUES}
+    search_fields = ("name",)
+
+
+@admin.register(ChangeConsumer)
+class ChangeConsumerAdmin(admin.ModelAdmin):
+    list_display = ("name", "position", "updated_at")
+    search_fields = ("name",)
+
+
+@admin.register(ImportRun)
+class ImportRunAdmin(ScalableAdminMixin, admin.ModelAdmin):
+    list_display = (
+        "source",
+        "status",
+        "rows_read",
+        "rows_imported",
+        "rows_rejected",
+        "updated_at",
+    )
+    list_filter = ("status",)
+    search_fields = ("source", "fingerprint")
+
+
+@admin.register(CommissionSchedule)
+class CommissionScheduleAdmin(admin.ModelAdmin):
+    list_display = (
+        "category",
+        "policy_status",
+        "basis",
+        "rate",
+        "effective_from",
+        "effective_to",
+    )
+    list_filter = ("category", "basis", "policy_status")
+
+
+@admin.register(CommissionStatement)
+class CommissionStatementAdmin(admin.ModelAdmin):
+    list_display = (
+        "period_start",
+        "period_end",
+        "written_premium",
+        "collected_premium",
+        "commission_total",
+        "line_count",
+        "unmatched_count",
+        "computed_at",
+    )
+    readonly_fields = list_display
+    date_hierarchy = "period_start"
+
+
+@admin.register(CommissionLine)
+class CommissionLineAdmin(ScalableAdminMixin, admin.ModelAdmin):
+    list_display = ("statement", "policy", "basis", "base_amount", "rate", "amount")
+    list_filter = ("basis", "category")
+    list_filter_values = {"category": product_categories}
+    search_fields = ("policy__policy_number",)
+
+
+@admin.register(Territory)
+class TerritoryAdmin(admin.ModelAdmin):
+    list_display = ("municipality", "state", "country", "key")
+    list_filter = ("country", "state")
+    search_fields = ("municipality", "key")
+
+
+@admin.register(TerritoryRollup)
+class TerritoryRollupAdmin(ScalableAdminMixin, admin.ModelAdmin):
+    list_display = (
+        "territory",
+        "category",
+        "client_count",
+        "active_policies",
+        "premium",
+        "refreshed_at",
+    )
+    list_filter = ("category",)
+    list_filter_values = {"category": product_categories}
+    search_fields = ("territory__municipality",)
+
+
+@admin.register(LeadCohort)
+class LeadCohortAdmin(admin.ModelAdmin):
+    list_display = (
+        "week",
+        "source",
+        "insurance_type",
+        "leads",
+        "converted",
+        "with_policy",
+        "refreshed_at",
+    )
+    list_filter = ("source", "insurance_type")
+    date_hierarchy = "week"
@@ -0,0 +1,449 @@
+"""Precomputed analytics tables kept up to date from the change log.
+
+Territories: client addresses are normalized into ``Territory`` rows
+(country, state, municipality) and ``Client.territory`` points at them;
+``TerritoryRollup`` holds client counts, active policies and premium per
+territory and product category. ``refresh_territories()`` reads the client and
+policy events of the change log and recomputes only the territories they
+touch, including the ones recorded in the context of delete events.
+
+Lead funnel: ``LeadCohort`` counts leads per week of arrival, ``source`` and
+``insurance_type``, with how many converted into a client and a policy and how
+long they took. ``refresh_lead_cohorts()`` recomputes the weeks of the leads in
+the change log the same way. Weeks older than the lead retention window have
+lost leads to ``crm.purge.apply_retention()`` and are never recomputed: their
+cohorts keep the counts from when all their leads were still there.
+"""
+import re
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max, Q, Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .changes import ChangeFeed
+from .dedup import strip_accents
+from .models import (
+    ChangeEvent,
+    Client,
+    Lead,
+    LeadCohort,
+    Policy,
+    Territory,
+    TerritoryRollup,
+)
+
+COUNTRY_ALIASES = {
+    "PUERTO RICO": "PR",
+    "P R": "PR",
+    "US": "US",
+    "USA": "US",
+    "U S A": "US",
+    "UNITED STATES": "US",
+    "ESTADOS UNIDOS": "US",
+    "EE UU": "US",
+    "EEUU": "US",
+}
+STATE_ALIASES = {"PUERTO RICO": "PR", "P R": "PR"}
+TERRITORY_FEED = "territory-rollups"
+LEAD_COHORT_FEED = "lead-cohorts"
+# (upper bound in days, label); converted leads are counted in the first match.
+TIME_TO_CONVERT_BUCKETS = (
+    (1, "<1d"),
+    (3, "1-3d"),
+    (7, "3-7d"),
+    (14, "7-14d"),
+    (30, "14-30d"),
+    (60, "30-60d"),
+    (90, "60-90d"),
+    (None, "90d+"),
+)
+
+_SEPARATORS = re.compile(r"[\s.,]+")
+
+
+def _clean(value: str) -> str:
+    return _SEPARATORS.sub(" ", strip_accents(value or "")).strip().upper()
+
+
+def normalize_territory(city="", state="", postal_code="", country=""):
+    """Return ``(key, country, state, municipality)``, or ``None`` without an address."""
+
+    if not any(_clean(value) for value in (city, state, postal_code, country)):
+        return None
+    country = _clean(country)
+    country = COUNTRY_ALIASES.get(country, country) or getattr(
+        settings, "CRM_DEFAULT_COUNTRY", "PR"
+    )
+    state = _clean(state)
+    state = "PR" if country == "PR" else STATE_ALIASES.get(state, state)
+    municipality = " ".join((city or "").split()).title()
+    key = "|".join((country, state, _clean(city))).lower()
+    return key, country, state, municipality
+
+
+def assign_territories(client_ids) -> set:
+    """Point ``Client.territory`` at the normalized address; return touched territories."""
+
+    clients = list(
+        Client.objects.filter(pk__in=client_ids).values_list(
+            "pk", "territory_id", "city", "state", "postal_code", "country"
+        )
+    )
+    wanted = {}
+    for pk, _, *address in clients:
+        wanted[pk] = normalize_territory(*address)
+    territories = {}
+    for values in wanted.values():
+        # Among spellings of one municipality, keep one with accents.
+        if values and (
+            values[0] not in territories or strip_accents(values[3]) != values[3]
+        ):
+            territories[values[0]] = values
+    known = dict(Territory.objects.filter(key__in=territories).values_list("key", "pk"))
+    missing = [values for key, values in territories.items() if key not in known]
+    if missing:
+        Territory.objects.bulk_create(
+            [
+                Territory(key=key, country=country, state=state, municipality=name)
+                for key, country, state, name in missing
+            ],
+            ignore_conflicts=True,
+        )
+        known.update(
+            Territory.objects.filter(
+                key__in=[values[0] for values in missing]
+            ).values_list("key", "pk")
+        )
+
+    touched, changed = set(), []
+    for pk, current, *_ in clients:
+        values = wanted[pk]
+        territory_id = known[values[0]] if values else None
+        if territory_id != current:
+            touched.update({current, territory_id})
+            changed.append(Client(pk=pk, territory_id=territory_id))
+        elif territory_id:
+            touched.add(territory_id)
+    # The plain manager keeps this derived column out of the change log, which
+    # would otherwise feed the consumer its own writes.
+    Client._base_manager.bulk_update(changed, ["territory"], batch_size=1000)
+    touched.discard(None)
+    return touched
+
+
+def refresh_rollups(territory_ids=None) -> int:
+    """Recompute the rollups of ``territory_ids`` (all territories for ``None``)."""
+
+    clients = Client.objects.exclude(territory=None)
+    policies = Policy.objects.filter(
+        status=Policy.PolicyStatus.ACTIVE, client__territory__isnull=False
+    )
+    rollups = TerritoryRollup.objects.all()
+    if territory_ids is not None:
+        territory_ids = list(territory_ids)
+        clients = clients.filter(territory__in=territory_ids)
+        policies = policies.filter(client__territory__in=territory_ids)
+        rollups = rollups.filter(territory__in=territory_ids)
+
+    now = timezone.now()
+    rows = {}
+
+    def row(territory_id, category):
+        if (territory_id, category) not in rows:
+            rows[territory_id, category] = TerritoryRollup(
+                territory_id=territory_id, category=category, refreshed_at=now
+            )
+        return rows[territory_id, category]
+
+    for territory_id, count in (
+        clients.order_by().values_list("territory").annotate(count=Count("pk"))
+    ):
+        row(territory_id, "").client_count = count
+    for territory_id, category, policy_count, client_count, premium in (
+        policies.order_by()
+        .values_list("client__territory", "product__category")
+        .annotate(Count("pk"), Count("client", distinct=True), Sum("premium_amount"))
+    ):
+        total = row(territory_id, "")
+        total.active_policies += policy_count
+        total.premium += premium or 0
+        rollup = row(territory_id, category)
+        rollup.client_count = client_count
+        rollup.active_policies = policy_count
+        rollup.premium = premium or 0
+
+    with transaction.atomic():
+        rollups.delete()
+        TerritoryRollup.objects.bulk_create(rows.values(), batch_size=1000)
+    return len(rows)
+
+
+def _territories_of_policies(policy_ids) -> set:
+    return set(
+        Policy.objects.filter(pk__in=policy_ids, client__territory__isnull=False)
+        .values_list("client__territory", flat=True)
+        .distinct()
+    )
+
+
+def _deleted_territories(events):
+    """Territories deleted clients and policies counted in (``None`` if unknown)."""
+
+    territories, client_ids = set(), set()
+    for event in events:
+        if event.context is None:
+            return None
+        if event.model == "crm.client":
+            territories.add(event.context["territory_id"])
+        else:
+            client_ids.add(event.context["client_id"])
+    # A policy whose client is gone too is covered by the client's own event.
+    territories.update(
+        Client.objects.filter(pk__in=client_ids, territory__isnull=False).values_list(
+            "territory", flat=True
+        )
+    )
+    territories.discard(None)
+    return territories
+
+
+def handle_territory_events(events) -> None:
+    by_model = defaultdict(set)
+    deleted = []
+    for event in events:
+        if event.operation == ChangeEvent.Operation.DELETE:
+            deleted.append(event)
+        else:
+            by_model[event.model].add(event.object_id)
+
+    touched = set()
+    if by_model["crm.client"]:
+        touched |= assign_territories(by_model["crm.client"])
+    if by_model["crm.policy"]:
+        touched |= _territories_of_policies(by_model["crm.policy"])
+    if deleted:
+        territories = _deleted_territories(deleted)
+        if territories is None:
+            # Logged before delete events carried a context.
+            refresh_rollups()
+            return
+        touched |= territories
+    if touched:
+        refresh_rollups(touched)
+
+
+def refresh_territories(batch_size: int = 5000) -> int:
+    feed = ChangeFeed(TERRITORY_FEED, models=["crm.client", "crm.policy"])
+    return feed.consume(handle_territory_events, batch_size=batch_size)
+
+
+def rebuild_territories(batch_size: int = 5000) -> int:
+    """Assign every client and recompute all rollups (first run or repair)."""
+
+    last_pk = 0
+    while ids := list(
+        Client.objects.filter(pk__gt=last_pk)
+        .order_by("pk")
+        .values_list("pk", flat=True)[:batch_size]
+    ):
+        last_pk = ids[-1]
+        with transaction.atomic():
+            assign_territories(ids)
+    Territory.objects.filter(clients=None).delete()
+    return refresh_rollups()
+
+
+def territory_report(category="", country="", state="") -> dict:
+    rollups = TerritoryRollup.objects.filter(category=category).select_related(
+        "territory"
+    )
+    if country:
+        rollups = rollups.filter(territory__country=country.upper())
+    if state:
+        rollups = rollups.filter(territory__state=state.upper())
+    rollups = rollups.order_by("-premium", "territory__key")
+    return {
+        "category": category or None,
+        "refreshed_at": rollups.aggregate(latest=Max("refreshed_at"))["latest"],
+        "territories": [
+            {
+                "id": rollup.territory_id,
+                "name": str(rollup.territory),
+                "country": rollup.territory.country,
+                "state": rollup.territory.state,
+                "municipality": rollup.territory.municipality,
+                "client_count": rollup.client_count,
+                "active_policies": rollup.active_policies,
+                "premium": str(rollup.premium),
+            }
+            for rollup in rollups
+        ],
+    }
+
+
+def cohort_week(value):
+    day = timezone.localtime(value).date() if timezone.is_aware(value) else value.date()
+    return day - timedelta(days=day.weekday())
+
+
+def _bucket(seconds: float) -> str:
+    days = seconds / 86400
+    for limit, label in TIME_TO_CONVERT_BUCKETS:
+        if limit is None or days < limit:
+            return label
+
+
+def first_open_week():
+    """Monday of the oldest week lead retention has not reached (``None`` if off)."""
+
+    days = getattr(settings, "CRM_RETENTION_DAYS", {}).get("leads")
+    if not days:
+        return None
+    return cohort_week(timezone.now() - timedelta(days=days)) + timedelta(days=7)
+
+
+def refresh_cohorts(weeks=None) -> int:
+    """Recompute the cohorts of ``weeks`` (Mondays; all open weeks for ``None``)."""
+
+    leads = Lead.objects.order_by()
+    cohorts = LeadCohort.objects.all()
+    first_open = first_open_week()
+    if first_open is not None:
+        leads = leads.filter(
+            created_at__gte=timezone.make_aware(datetime.combine(first_open, time.min))
+        )
+        cohorts = cohorts.filter(week__gte=first_open)
+    if weeks is not None:
+        weeks = sorted(week for week in weeks if first_open is None or week >= first_open)
+        if not weeks:
+            return 0
+        ranges = Q()
+        for week in weeks:
+            start = timezone.make_aware(datetime.combine(week, time.min))
+            ranges |= Q(created_at__gte=start, created_at__lt=start + timedelta(days=7))
+        leads = leads.filter(ranges)
+        cohorts = cohorts.filter(week__in=weeks)
+
+    now = timezone.now()
+    rows = {}
+    for created_at, source, insurance_type, converted_at, policy_id in leads.values_list(
+        "created_at", "source", "insurance_type", "converted_at", "converted_policy"
+    ).iterator(chunk_size=5000):
+        key = (cohort_week(created_at), source, insurance_type)
+        cohort = rows.get(key)
+        if cohort is None:
+            cohort = rows[key] = LeadCohort(
+                week=key[0],
+                source=source,
+                insurance_type=insurance_type,
+                time_to_convert={},
+                refreshed_at=now,
+            )
+        cohort.leads += 1
+        if converted_at is None:
+            continue
+        seconds = max((converted_at - created_at).total_seconds(), 0)
+        cohort.converted += 1
+        cohort.with_policy += policy_id is not None
+        cohort.convert_seconds += int(seconds)
+        label = _bucket(seconds)
+        cohort.time_to_convert[label] = cohort.time_to_convert.get(label, 0) + 1
+
+    with transaction.atomic():
+        cohorts.delete()
+        LeadCohort.objects.bulk_create(rows.values(), batch_size=1000)
+    return len(rows)
+
+
+def handle_lead_events(events) -> None:
+    weeks, changed = set(), set()
+    for event in events:
+        if event.operation != ChangeEvent.Operation.DELETE:
+            changed.add(event.object_id)
+        elif event.context is None:
+            # Logged before delete events carried a context.
+            refresh_cohorts()
+            return
+        else:
+            weeks.add(cohort_week(parse_datetime(event.context["created_at"])))
+    created = Lead.objects.filter(pk__in=changed).values_list("created_at", flat=True)
+    weeks.update(cohort_week(value) for value in created)
+    if weeks:
+        refresh_cohorts(weeks)
+
+
+def refresh_lead_cohorts(batch_size: int = 5000) -> int:
+    feed = ChangeFeed(LEAD_COHORT_FEED, models=["crm.lead"])
+    return feed.consume(handle_lead_events, batch_size=batch_size)
+
+
+def rebuild_lead_cohorts() -> int:
+    return refresh_cohorts()
+
+
+def _rates(totals: dict) -> dict:
+    leads, converted = totals["leads"], totals["converted"]
+    seconds = totals["convert_seconds"]
+    return {
+        **{name: value for name, value in totals.items() if name != "convert_seconds"},
+        "conversion_rate": round(100 * converted / leads, 1) if leads else 0.0,
+        "policy_rate": round(100 * totals["with_policy"] / leads, 1) if leads else 0.0,
+        "avg_days_to_convert": (
+            round(seconds / converted / 86400, 1) if converted else None
+        ),
+    }
+
+
+def funnel_report(start=None, end=None, source="", insurance_type="") -> dict:
+    cohorts = LeadCohort.objects.all()
+    if start:
+        cohorts = cohorts.filter(week__gte=start - timedelta(days=start.weekday()))
+    if end:
+        cohorts = cohorts.filter(week__lte=end)
+    if source:
+        cohorts = cohorts.filter(source=source)
+    if insurance_type:
+        cohorts = cohorts.filter(insurance_type=insurance_type)
+
+    def empty():
+        return {
+            "leads": 0,
+            "converted": 0,
+            "with_policy": 0,
+            "convert_seconds": 0,
+            "time_to_convert": {label: 0 for _, label in TIME_TO_CONVERT_BUCKETS},
+        }
+
+    weeks, by_source, by_type = defaultdict(empty), defaultdict(empty), defaultdict(empty)
+    totals = empty()
+    refreshed_at = None
+    for cohort in cohorts.order_by("week", "source", "insurance_type"):
+        for group in (
+            weeks[cohort.week],
+            by_source[cohort.source],
+            by_type[cohort.insurance_type],
+            totals,
+        ):
+            group["leads"] += cohort.leads
+            group["converted"] += cohort.converted
+            group["with_policy"] += cohort.with_policy
+            group["convert_seconds"] += cohort.convert_seconds
+            for label, count in cohort.time_to_convert.items():
+                group["time_to_convert"][label] += count
+        refreshed_at = max(refreshed_at or cohort.refreshed_at, cohort.refreshed_at)
+    return {
+        "refreshed_at": refreshed_at,
+        "totals": _rates(totals),
+        "by_source": [
+            {"source": name, **_rates(group)} for name, group in sorted(by_source.items())
+        ],
+        "by_insurance_type": [
+            {"insurance_type": name, **_rates(group)}
+            for name, group in sorted(by_type.items())
+        ],
+        "cohorts": [{"week": week, **_rates(group)} for week, group in weeks.items()],
+    }
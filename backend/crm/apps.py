@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class CrmConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "crm"
+
+    def ready(self):
+        # purge defines @task functions the worker must find in the registry.
+        from . import filters, purge, signals  # noqa: F401
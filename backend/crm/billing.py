@@ -0,0 +1,227 @@
+"""Premium installment schedules.
+
+A policy with a ``payment_plan`` is billed in equal installments over its term
+(``start_date`` to ``end_date``, or one year when there is no end date). Each
+installment is an ``Invoice`` with ``installment_number`` set, issued on the
+day its period starts and due ``CRM_INSTALLMENT_DUE_DAYS`` later. Installments
+not issued yet are ``draft``; ``issue_due_installments()`` turns them into
+``pending`` on their issue date.
+
+Regenerating a schedule never touches installments that were already issued
+(or paid, cancelled, edited to another status): only future ``draft``
+installments are updated, created or removed, and the premium left after the
+issued ones is spread over them. When the issued installments already exceed
+the premium (it was cut), no drafts are left and the excess is issued as a
+credit note: a negative ``pending`` installment without a due date.
+"""
+import calendar
+import logging
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Invoice, Policy
+from .numbering import allocate_numbers
+from .tasks import task
+
+logger = logging.getLogger(__name__)
+
+INSTALLMENTS_PER_YEAR = {
+    Policy.PaymentPlan.ANNUAL: 1,
+    Policy.PaymentPlan.SEMIANNUAL: 2,
+    Policy.PaymentPlan.QUARTERLY: 4,
+    Policy.PaymentPlan.MONTHLY: 12,
+}
+BILLABLE_STATUSES = (Policy.PolicyStatus.ACTIVE, Policy.PolicyStatus.PENDING)
+SCHEDULE_FIELDS = ("issue_date", "due_date", "amount", "status")
+BILLING_FIELDS = ("premium_amount", "start_date", "end_date", "payment_plan", "status")
+CREDIT_DESCRIPTION = "Nota de crédito: lo facturado supera la prima de la póliza."
+
+
+def add_months(day, months: int):
+    month_index = day.month - 1 + months
+    year, month = day.year + month_index // 12, month_index % 12 + 1
+    return day.replace(
+        year=year, month=month, day=min(day.day, calendar.monthrange(year, month)[1])
+    )
+
+
+def installment_dates(start, end, plan) -> list:
+    """Issue dates of the installments of a term ``[start, end)``."""
+
+    step = 12 // INSTALLMENTS_PER_YEAR[plan]
+    end = end or add_months(start, 12)
+    dates, index = [], 0
+    while (day := add_months(start, step * index)) < end or index == 0:
+        dates.append(day)
+        index += 1
+    return dates
+
+
+def split_cents(total_cents: int, count: int) -> list:
+    """Split evenly; the first installments absorb the leftover cents."""
+
+    base, remainder = divmod(max(total_cents, 0), count)
+    return [base + (1 if index < remainder else 0) for index in range(count)]
+
+
+def _cents(amount) -> int:
+    return int(Decimal(amount).scaleb(2))
+
+
+def _plan_policy(policy, installments, today, due_days):
+    """Return ``(desired, future, credit)`` for one policy.
+
+    ``desired`` maps installment number -> ``(issue_date, due_date, cents)``;
+    ``future`` maps number -> the existing drafts that may be rewritten;
+    ``credit`` is the cents issued above the premium.
+    """
+
+    future = {
+        invoice.installment_number: invoice
+        for invoice in installments
+        if invoice.status == Invoice.InvoiceStatus.DRAFT and invoice.issue_date > today
+    }
+    locked = [
+        invoice for invoice in installments if invoice.installment_number not in future
+    ]
+    if (
+        policy.status not in BILLABLE_STATUSES
+        or not policy.payment_plan
+        or not policy.start_date
+    ):
+        return {}, future, 0
+
+    remaining = _cents(policy.premium_amount) - sum(
+        _cents(invoice.amount) for invoice in locked
+    )
+    if remaining <= 0:
+        return {}, future, -remaining
+    dates = installment_dates(policy.start_date, policy.end_date, policy.payment_plan)
+    if locked:
+        cutoff = max(invoice.issue_date for invoice in locked)
+        dates = [day for day in dates if day > cutoff]
+        first_number = max(invoice.installment_number for invoice in locked) + 1
+    else:
+        first_number = 1
+    if not dates:
+        return {}, future, 0
+    desired = {
+        first_number + index: (day, day + timedelta(days=due_days), cents)
+        for index, (day, cents) in enumerate(
+            zip(dates, split_cents(remaining, len(dates)))
+        )
+    }
+    return desired, future, 0
+
+
+def generate_schedules(policies, today=None, batch_size: int = 1000) -> dict:
+    """Create or refresh the installment invoices of ``policies`` (a queryset)."""
+
+    today = today or timezone.localdate()
+    due_days = getattr(settings, "CRM_INSTALLMENT_DUE_DAYS", 30)
+    stats = {"policies": 0, "created": 0, "updated": 0, "deleted": 0, "credited": 0}
+    last_pk = 0
+    queryset = policies.order_by("pk").only("pk", *BILLING_FIELDS)
+    while batch := list(queryset.filter(pk__gt=last_pk)[:batch_size]):
+        last_pk = batch[-1].pk
+        with transaction.atomic():
+            _generate_batch(batch, today, due_days, stats)
+    return stats
+
+
+def _generate_batch(policies, today, due_days, stats) -> None:
+    installments = defaultdict(list)
+    for invoice in (
+        Invoice.objects.select_for_update()
+        .filter(policy__in=policies, installment_number__isnull=False)
+        .order_by()
+    ):
+        installments[invoice.policy_id].append(invoice)
+
+    new, changed, stale = [], [], []
+    for policy in policies:
+        desired, future, credit = _plan_policy(
+            policy, installments[policy.pk], today, due_days
+        )
+        stats["policies"] += 1
+        if credit:
+            amount = Decimal(credit).scaleb(-2)
+            logger.warning(
+                "Policy %s is billed %s above its premium; issuing a credit note.",
+                policy.pk,
+                amount,
+            )
+            last_number = max(
+                (invoice.installment_number for invoice in installments[policy.pk]),
+                default=0,
+            )
+            new.append(
+                Invoice(
+                    policy_id=policy.pk,
+                    installment_number=last_number + 1,
+                    issue_date=today,
+                    amount=-amount,
+                    status=Invoice.InvoiceStatus.PENDING,
+                    description=CREDIT_DESCRIPTION,
+                )
+            )
+            stats["credited"] += 1
+        for number, invoice in future.items():
+            if number not in desired:
+                stale.append(invoice.pk)
+        for number, (issue_date, due_date, cents) in desired.items():
+            values = {
+                "issue_date": issue_date,
+                "due_date": due_date,
+                "amount": Decimal(cents).scaleb(-2),
+                "status": (
+                    Invoice.InvoiceStatus.DRAFT
+                    if issue_date > today
+                    else Invoice.InvoiceStatus.PENDING
+                ),
+            }
+            invoice = future.get(number)
+            if invoice is None:
+                new.append(
+                    Invoice(policy_id=policy.pk, installment_number=number, **values)
+                )
+            elif any(getattr(invoice, name) != value for name, value in values.items()):
+                for name, value in values.items():
+                    setattr(invoice, name, value)
+                changed.append(invoice)
+
+    if stale:
+        stats["deleted"] += Invoice.objects.filter(pk__in=stale).delete()[0]
+    if changed:
+        now = timezone.now()
+        for invoice in changed:
+            invoice.updated_at = now
+        Invoice.objects.bulk_update(
+            changed, [*SCHEDULE_FIELDS, "updated_at"], batch_size=1000
+        )
+        stats["updated"] += len(changed)
+    if new:
+        for invoice, number in zip(new, allocate_numbers("invoice", len(new))):
+            invoice.invoice_number = number
+        Invoice.objects.bulk_create(new, batch_size=1000)
+        stats["created"] += len(new)
+
+
+def issue_due_installments(today=None) -> int:
+    """Mark draft installments whose issue date has arrived as ``pending``."""
+
+    return Invoice.objects.filter(
+        installment_number__isnull=False,
+        status=Invoice.InvoiceStatus.DRAFT,
+        issue_date__lte=today or timezone.localdate(),
+    ).update(status=Invoice.InvoiceStatus.PENDING, updated_at=timezone.now())
+
+
+@task(queue="default")
+def regenerate_policy_schedule(policy_id: int) -> None:
+    generate_schedules(Policy.objects.filter(pk=policy_id))
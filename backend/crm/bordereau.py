@@ -0,0 +1,710 @@
+"""Streaming import of carrier bordereaux (monthly policy and premium files).
+
+Files are read one record at a time: CSV through a line reader that counts
+bytes, XLSX through openpyxl's read-only mode. Chunks of rows are validated in
+a process pool while the parent writes earlier chunks with bulk queries. Each
+chunk commits together with its ``ImportRun`` checkpoint (byte offset, rows
+read and size of the rejects file), so an interrupted import resumes after the
+last committed chunk without duplicating rows or rejects.
+"""
+import codecs
+import csv
+import hashlib
+import io
+import multiprocessing
+import os
+import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from functools import lru_cache
+
+import django
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import connections, transaction
+from django.utils import timezone
+
+from .dedup import (
+    normalize_document_id,
+    normalize_email,
+    normalize_name,
+    normalize_phone,
+    strip_accents,
+)
+from .models import Client, ImportRun, InsuranceProduct, Invoice, Policy
+from .numbering import allocate_numbers
+
+try:
+    import openpyxl
+except ImportError:  # XLSX support is optional.
+    openpyxl = None
+
+XLSX_UNSUPPORTED = (
+    "Instala openpyxl para importar archivos XLSX o exporta el archivo a CSV."
+)
+DATE_FORMATS = ("%Y-%m-%d", "%m/%d/%Y", "%m/%d/%y", "%Y%m%d")
+CENT = Decimal("0.01")
+MAX_AMOUNT = Decimal("100000000")
+
+# Header (normalized: no accents, lower case, "_" separators) -> field.
+FIELD_ALIASES = {
+    "first_name": ("first_name", "nombre", "insured_first_name"),
+    "last_name": ("last_name", "apellido", "apellidos", "insured_last_name"),
+    "full_name": ("name", "full_name", "insured", "insured_name", "asegurado"),
+    "email": ("email", "e_mail", "correo", "correo_electronico"),
+    "phone": ("phone", "phone_primary", "telefono", "tel"),
+    "document_id": ("document_id", "ssn", "seguro_social", "identificacion"),
+    "address_line1": ("address", "address_line1", "direccion"),
+    "city": ("city", "ciudad", "pueblo"),
+    "state": ("state", "estado_residencia"),
+    "postal_code": ("postal_code", "zip", "zip_code", "codigo_postal"),
+    "policy_number": ("policy_number", "policy", "policy_no", "poliza", "numero_poliza"),
+    "product": ("product", "producto", "plan"),
+    "status": ("status", "policy_status", "estado", "estado_poliza"),
+    "start_date": ("start_date", "effective_date", "fecha_inicio", "vigencia_desde"),
+    "end_date": ("end_date", "expiration_date", "fecha_fin", "vigencia_hasta"),
+    "renewal_date": ("renewal_date", "fecha_renovacion"),
+    "premium_amount": ("premium", "premium_amount", "annual_premium", "prima"),
+    "invoice_number": ("invoice_number", "invoice", "invoice_no", "factura"),
+    "invoice_status": ("invoice_status", "payment_status", "estado_factura"),
+    "issue_date": ("issue_date", "billing_date", "fecha_factura"),
+    "due_date": ("due_date", "fecha_vencimiento"),
+    "paid_on": ("paid_on", "payment_date", "paid_date", "fecha_pago"),
+    "amount": ("amount", "premium_due", "installment_amount", "monto"),
+    "currency": ("currency", "moneda"),
+}
+CLIENT_FIELDS = (
+    "first_name",
+    "last_name",
+    "email",
+    "document_id",
+    "address_line1",
+    "city",
+    "state",
+    "postal_code",
+)
+INVOICE_FIELDS = ("issue_date", "due_date", "amount", "currency", "status")
+
+_NON_WORD = re.compile(r"[^0-9a-z]+")
+
+
+def header_key(value) -> str:
+    return _NON_WORD.sub("_", strip_accents(str(value or "")).casefold()).strip("_")
+
+
+def resolve_columns(header, overrides=None) -> dict:
+    """Map each known field to its column index in ``header``.
+
+    ``overrides`` maps file column names to field names and wins over the
+    built-in aliases.
+    """
+
+    keys = [header_key(value) for value in header]
+    aliases = {alias: name for name, names in FIELD_ALIASES.items() for alias in names}
+    aliases.update(
+        {header_key(column): name for column, name in (overrides or {}).items()}
+    )
+    columns = {}
+    for index, key in enumerate(keys):
+        name = aliases.get(key)
+        if name in FIELD_ALIASES and name not in columns:
+            columns[name] = index
+    if "policy_number" not in columns:
+        raise ValueError("El archivo no tiene una columna de número de póliza.")
+    return columns
+
+
+def _choices(choices) -> dict:
+    return {
+        key: value for value, label in choices for key in (value, normalize_name(label))
+    }
+
+
+POLICY_STATUSES = _choices(Policy.PolicyStatus.choices)
+INVOICE_STATUSES = _choices(Invoice.InvoiceStatus.choices)
+
+
+def _text(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+@lru_cache(maxsize=4096)
+def _parse_date(text: str, formats: tuple):
+    # Bordereaux repeat the same few dates on every row, so results are cached.
+    for date_format in formats:
+        try:
+            return datetime.strptime(text, date_format).date()
+        except ValueError:
+            continue
+    raise ValueError(f"Fecha inválida: {text}")
+
+
+def _date(value, formats):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    text = _text(value)
+    return _parse_date(text, formats) if text else None
+
+
+def _money(value):
+    text = _text(value).replace("$", "").replace(",", "").replace(" ", "")
+    if not text:
+        return None
+    if text.startswith("(") and text.endswith(")"):
+        text = f"-{text[1:-1]}"
+    try:
+        amount = Decimal(text).quantize(CENT)
+    except InvalidOperation:
+        raise ValueError(f"Monto inválido: {value}") from None
+    if abs(amount) >= MAX_AMOUNT:
+        raise ValueError(f"Monto fuera de rango: {value}")
+    return amount
+
+
+def _choice(value, statuses, label):
+    text = normalize_name(_text(value))
+    if not text:
+        return None
+    if text not in statuses:
+        raise ValueError(f"{label} desconocido: {value}")
+    return statuses[text]
+
+
+def invoice_import_key(policy_number, issue_date, amount, row) -> str:
+    """Identity of an invoice row without an invoice number.
+
+    Importing the file again (or resuming it) finds the invoice by this key
+    instead of billing the row twice. Identical rows are one invoice.
+    """
+
+    digest = hashlib.sha256()
+    for part in (policy_number, issue_date.isoformat(), str(amount), *map(_text, row)):
+        digest.update(part.encode("utf-8") + b"\x1f")
+    return digest.hexdigest()
+
+
+def client_key(client: dict) -> tuple:
+    if document_id := normalize_document_id(client["document_id"]):
+        return ("document", document_id)
+    if email := normalize_email(client["email"]):
+        return ("email", email)
+    name = normalize_name(f"{client['first_name']} {client['last_name']}")
+    return ("name", name, normalize_phone(client["phone_primary"]))
+
+
+def validate_row(row, columns: dict, date_formats=DATE_FORMATS) -> dict:
+    """Turn one raw row into a record for ``BordereauImporter``; raises ``ValueError``."""
+
+    def value(name):
+        index = columns.get(name)
+        return row[index] if index is not None and index < len(row) else None
+
+    policy_number = _text(value("policy_number"))
+    if not policy_number:
+        raise ValueError("Falta el número de póliza.")
+    if len(policy_number) > 64:
+        raise ValueError("Número de póliza demasiado largo.")
+
+    client = {name: _text(value(name)) for name in CLIENT_FIELDS}
+    client["phone_primary"] = _text(value("phone"))
+    if not client["first_name"] and not client["last_name"]:
+        first, _, last = _text(value("full_name")).partition(" ")
+        client["first_name"], client["last_name"] = first, last.strip()
+    if client["email"]:
+        try:
+            validate_email(client["email"])
+        except ValidationError:
+            raise ValueError(f"Email inválido: {client['email']}") from None
+    for name, field_value in client.items():
+        limit = Client._meta.get_field(name).max_length
+        client[name] = field_value[:limit]
+
+    policy = {
+        "status": _choice(value("status"), POLICY_STATUSES, "Estado de póliza"),
+        "start_date": _date(value("start_date"), date_formats),
+        "end_date": _date(value("end_date"), date_formats),
+        "renewal_date": _date(value("renewal_date"), date_formats),
+        "premium_amount": _money(value("premium_amount")),
+    }
+    invoice = None
+    amount = _money(value("amount"))
+    if amount is not None:
+        invoice_number = _text(value("invoice_number"))
+        if len(invoice_number) > 64:
+            raise ValueError("Número de factura demasiado largo.")
+        due_date = _date(value("due_date"), date_formats)
+        issue_date = (
+            _date(value("issue_date"), date_formats) or due_date or policy["start_date"]
+        )
+        if issue_date is None:
+            raise ValueError("Falta la fecha de la factura.")
+        invoice = {
+            "invoice_number": invoice_number,
+            "import_key": (
+                None
+                if invoice_number
+                else invoice_import_key(policy_number, issue_date, amount, row)
+            ),
+            "issue_date": issue_date,
+            "due_date": due_date,
+            "amount": amount,
+            "currency": _text(value("currency"))[:10] or None,
+            "status": _choice(
+                value("invoice_status"), INVOICE_STATUSES, "Estado de factura"
+            )
+            or Invoice.InvoiceStatus.PENDING,
+            "paid_on": _date(value("paid_on"), date_formats),
+        }
+    return {
+        "policy_number": policy_number,
+        "product": normalize_name(_text(value("product"))),
+        "client": client,
+        "client_key": client_key(client),
+        # Only columns present in the row update an existing policy.
+        "policy": {name: item for name, item in policy.items() if item is not None},
+        "invoice": invoice,
+    }
+
+
+def validate_rows(rows, columns: dict, date_formats=DATE_FORMATS) -> list:
+    """Validate one chunk; returns ``(record, None)`` or ``(None, error)`` per row."""
+
+    results = []
+    for row in rows:
+        try:
+            results.append((validate_row(row, columns, date_formats), None))
+        except ValueError as exc:
+            results.append((None, str(exc)))
+    return results
+
+
+def fingerprint(path) -> str:
+    """Identify a file by its size and first megabyte, independent of its name."""
+
+    digest = hashlib.sha256(str(os.path.getsize(path)).encode())
+    with open(path, "rb") as handle:
+        digest.update(handle.read(1024 * 1024))
+    return digest.hexdigest()
+
+
+def read_csv(path, start=0, encoding="utf-8-sig", delimiter=","):
+    """Yield ``(row, end_offset)`` for every CSV record from byte ``start`` on.
+
+    ``end_offset`` is the byte position right after the record, which is where
+    a resumed import seeks to.
+    """
+
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    position = start
+
+    def lines():
+        nonlocal position
+        with open(path, "rb") as handle:
+            handle.seek(start)
+            for raw in handle:
+                position += len(raw)
+                yield decoder.decode(raw)
+
+    for row in csv.reader(lines(), delimiter=delimiter):
+        yield row, position
+
+
+def read_xlsx(path, start_row=1, sheet=None):
+    """Yield ``(row, None)`` for every worksheet row from ``start_row`` (1-based) on."""
+
+    if openpyxl is None:
+        raise ValueError(XLSX_UNSUPPORTED)
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        worksheet = workbook[sheet] if sheet else workbook.active
+        for row in worksheet.iter_rows(min_row=start_row, values_only=True):
+            yield list(row), None
+    finally:
+        workbook.close()
+
+
+def _invoice_ref(invoice) -> tuple:
+    if invoice["invoice_number"]:
+        return ("invoice_number", invoice["invoice_number"])
+    return ("import_key", invoice["import_key"])
+
+
+def _paid_on(invoice, current=None):
+    """Payment date of an imported invoice: the row's, the known one or the issue date."""
+
+    if invoice["status"] != Invoice.InvoiceStatus.PAID:
+        return None
+    return invoice["paid_on"] or current or invoice["issue_date"]
+
+
+class BordereauImporter:
+    """Imports one bordereau file into ``Client``, ``Policy`` and ``Invoice``.
+
+    Clients are matched by normalized document id, then email, then name and
+    phone; policies by ``policy_number`` and invoices by ``invoice_number``.
+    Rows without an invoice number are matched by ``import_key`` and get a
+    generated number when they create an invoice.
+    """
+
+    def __init__(
+        self,
+        path,
+        column_map=None,
+        chunk_size=5000,
+        workers=None,
+        rejects_path=None,
+        encoding="utf-8-sig",
+        delimiter=",",
+        sheet=None,
+        date_formats=DATE_FORMATS,
+    ):
+        self.path = os.fspath(path)
+        self.column_map = column_map or {}
+        self.chunk_size = chunk_size
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.rejects_path = rejects_path or f"{self.path}.rejects.csv"
+        self.encoding = encoding
+        self.delimiter = delimiter
+        self.sheet = sheet
+        self.date_formats = tuple(date_formats)
+        self.is_xlsx = self.path.lower().endswith((".xlsx", ".xlsm"))
+
+    def start(self, restart=False) -> ImportRun:
+        run, created = ImportRun.objects.get_or_create(
+            fingerprint=fingerprint(self.path),
+            defaults={
+                "source": os.path.basename(self.path)[:255],
+                "file_size": os.path.getsize(self.path),
+                "rejects_path": self.rejects_path,
+            },
+        )
+        if restart and not created:
+            run.status = ImportRun.RunStatus.RUNNING
+            run.rows_read = run.byte_offset = run.rejects_offset = 0
+            run.rows_imported = run.rows_rejected = 0
+            run.stats, run.last_error, run.finished_at = {}, "", None
+            run.rejects_path = self.rejects_path
+            run.save()
+        self.rejects_path = run.rejects_path or self.rejects_path
+        return run
+
+    def run(self, restart=False, progress=None) -> ImportRun:
+        """Import the file, resuming a previous run of the same file if there is one.
+
+        ``progress`` is called with the ``ImportRun`` after every committed chunk.
+        """
+
+        if self.is_xlsx and openpyxl is None:
+            raise ValueError(XLSX_UNSUPPORTED)
+        run = self.start(restart=restart)
+        if run.status == ImportRun.RunStatus.COMPLETED:
+            return run
+        ImportRun.objects.filter(pk=run.pk).update(
+            status=ImportRun.RunStatus.RUNNING, last_error=""
+        )
+        try:
+            self._import(run, progress)
+        except BaseException as exc:
+            ImportRun.objects.filter(pk=run.pk).update(
+                status=ImportRun.RunStatus.FAILED,
+                last_error=repr(exc),
+                updated_at=timezone.now(),
+            )
+            raise
+        run.status = ImportRun.RunStatus.COMPLETED
+        run.finished_at = timezone.now()
+        run.save(update_fields=["status", "finished_at", "updated_at"])
+        return run
+
+    def _records(self, run):
+        if self.is_xlsx:
+            rows = read_xlsx(self.path, sheet=self.sheet)
+            header, _ = next(rows, ([], None))
+            rows.close()
+            return header, read_xlsx(
+                self.path, start_row=2 + run.rows_read, sheet=self.sheet
+            )
+        rows = read_csv(self.path, encoding=self.encoding, delimiter=self.delimiter)
+        header, header_end = next(rows, ([], 0))
+        rows.close()
+        start = max(run.byte_offset, header_end)
+        return header, read_csv(
+            self.path, start=start, encoding=self.encoding, delimiter=self.delimiter
+        )
+
+    def _chunks(self, records):
+        chunk, offset = [], 0
+        for row, offset in records:
+            chunk.append(row)
+            if len(chunk) >= self.chunk_size:
+                yield chunk, offset
+                chunk = []
+        if chunk:
+            yield chunk, offset
+
+    def _executor(self):
+        connections.close_all()
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=django.setup,
+        )
+
+    def _import(self, run, progress):
+        header, records = self._records(run)
+        columns = resolve_columns(header, self.column_map)
+        self._load_lookups()
+        with open(self.rejects_path, "a+b") as rejects:
+            rejects.truncate(run.rejects_offset)
+            rejects.seek(run.rejects_offset)
+            if not run.rejects_offset:
+                rejects.write(self._encode_rows([[*header, "error"]]))
+            chunks = self._chunks(records)
+            if not self.workers:
+                for rows, offset in chunks:
+                    results = validate_rows(rows, columns, self.date_formats)
+                    self._commit(run, rows, offset, results, rejects, progress)
+                return
+            with self._executor() as executor:
+                pending = deque()
+                for rows, offset in chunks:
+                    future = executor.submit(
+                        validate_rows, rows, columns, self.date_formats
+                    )
+                    pending.append((rows, offset, future))
+                    if len(pending) >= 2 * self.workers:
+                        rows, offset, future = pending.popleft()
+                        self._commit(
+                            run, rows, offset, future.result(), rejects, progress
+                        )
+                while pending:
+                    rows, offset, future = pending.popleft()
+                    self._commit(run, rows, offset, future.result(), rejects, progress)
+
+    def _load_lookups(self):
+        self.products = {
+            normalize_name(name): pk
+            for pk, name in InsuranceProduct.objects.values_list("pk", "name")
+        }
+        self.clients = {}
+        fields = (
+            "pk",
+            "first_name",
+            "last_name",
+            "email",
+            "phone_primary",
+            "document_id",
+        )
+        for pk, *values in Client.objects.values_list(*fields).iterator(chunk_size=5000):
+            client = dict(zip(fields[1:], values))
+            self.clients.setdefault(client_key(client), pk)
+
+    @staticmethod
+    def _encode_rows(rows) -> bytes:
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(
+            [
+                [value.isoformat() if isinstance(value, date) else value for value in row]
+                for row in rows
+            ]
+        )
+        return buffer.getvalue().encode("utf-8")
+
+    def _commit(self, run, rows, offset, results, rejects, progress):
+        stats = dict.fromkeys(
+            (
+                "clients_created",
+                "policies_created",
+                "policies_updated",
+                "invoices_created",
+                "invoices_updated",
+            ),
+            0,
+        )
+        with transaction.atomic():
+            records = [
+                (index, record) for index, (record, _) in enumerate(results) if record
+            ]
+            errors = {index: error for index, (_, error) in enumerate(results) if error}
+            refused = self._apply(records, stats)
+            errors.update(refused)
+            rejected = [[*rows[index], error] for index, error in sorted(errors.items())]
+            if rejected:
+                rejects.write(self._encode_rows(rejected))
+            rejects.flush()
+            os.fsync(rejects.fileno())
+
+            run.rows_read += len(rows)
+            run.byte_offset = offset or 0
+            run.rows_imported += len(records) - len(refused)
+            run.rows_rejected += len(rejected)
+            run.rejects_offset = rejects.tell()
+            run.stats = {
+                key: run.stats.get(key, 0) + value for key, value in stats.items()
+            }
+            run.save(
+                update_fields=[
+                    "rows_read",
+                    "byte_offset",
+                    "rows_imported",
+                    "rows_rejected",
+                    "rejects_offset",
+                    "stats",
+                    "updated_at",
+                ]
+            )
+        if progress:
+            progress(run)
+
+    def _apply(self, records, stats) -> dict:
+        """Write one chunk of valid records; returns ``{index: error}`` for refused rows."""
+
+        errors = {}
+        policies = Policy.objects.in_bulk(
+            {record["policy_number"] for _, record in records}, field_name="policy_number"
+        )
+        wanted = [record["invoice"] for _, record in records if record["invoice"]]
+        invoices = {}
+        for field_name in ("invoice_number", "import_key"):
+            found = Invoice.objects.in_bulk(
+                {invoice[field_name] for invoice in wanted if invoice[field_name]},
+                field_name=field_name,
+            )
+            invoices.update(
+                ((field_name, value), invoice) for value, invoice in found.items()
+            )
+        accepted, new_policies = [], {}
+        for index, record in records:
+            number, invoice = record["policy_number"], record["invoice"]
+            existing_invoice = invoice and invoices.get(_invoice_ref(invoice))
+            policy_id = policies[number].pk if number in policies else None
+            if existing_invoice and existing_invoice.policy_id != policy_id:
+                errors[index] = (
+                    f"La factura {existing_invoice.invoice_number} es de otra póliza."
+                )
+                continue
+            if number not in policies and number not in new_policies:
+                product_id = self.products.get(record["product"])
+                if product_id is None:
+                    errors[index] = (
+                        f"Producto desconocido: {record['product'] or '(vacío)'}"
+                    )
+                    continue
+                if record["client_key"] == ("name", "", ""):
+                    errors[index] = "Faltan los datos del asegurado."
+                    continue
+                new_policies[number] = (product_id, record)
+            accepted.append(record)
+
+        client_ids = self._client_ids(
+            [record for _, record in new_policies.values()], stats
+        )
+        created = Policy.objects.bulk_create(
+            [
+                Policy(
+                    policy_number=number,
+                    client_id=client_ids[record["client_key"]],
+                    product_id=product_id,
+                    **record["policy"],
+                )
+                for number, (product_id, record) in new_policies.items()
+            ],
+            batch_size=1000,
+        )
+        stats["policies_created"] += len(created)
+        policies.update({policy.policy_number: policy for policy in created})
+
+        creators = {id(record) for _, record in new_policies.values()}
+        self._update_policies(
+            [record for record in accepted if id(record) not in creators], policies, stats
+        )
+        self._write_invoices(accepted, policies, invoices, stats)
+        return errors
+
+    def _client_ids(self, records, stats) -> dict:
+        missing = {}
+        for record in records:
+            key = record["client_key"]
+            if key not in self.clients and key not in missing:
+                missing[key] = Client(**record["client"])
+        created = Client.objects.bulk_create(list(missing.values()), batch_size=1000)
+        self.clients.update(zip(missing, (client.pk for client in created)))
+        stats["clients_created"] += len(created)
+        return self.clients
+
+    @staticmethod
+    def _update_policies(records, policies, stats):
+        changed, fields = {}, set()
+        for record in records:
+            policy = policies[record["policy_number"]]
+            for name, value in record["policy"].items():
+                if getattr(policy, name) != value:
+                    setattr(policy, name, value)
+                    fields.add(name)
+                    changed[policy.pk] = policy
+        if changed:
+            now = timezone.now()
+            for policy in changed.values():
+                policy.updated_at = now
+            Policy.objects.bulk_update(
+                list(changed.values()), [*fields, "updated_at"], batch_size=1000
+            )
+        stats["policies_updated"] += len(changed)
+
+    @staticmethod
+    def _write_invoices(records, policies, invoices, stats):
+        new, changed, fields = [], {}, set()
+        for record in records:
+            invoice = record["invoice"]
+            if not invoice:
+                continue
+            values = {
+                name: invoice[name]
+                for name in INVOICE_FIELDS
+                if invoice[name] is not None
+            }
+            existing = invoices.get(_invoice_ref(invoice))
+            if existing is None:
+                existing = Invoice(
+                    policy=policies[record["policy_number"]],
+                    invoice_number=invoice["invoice_number"],
+                    import_key=invoice["import_key"],
+                    paid_on=_paid_on(invoice),
+                    **values,
+                )
+                new.append(existing)
+                invoices[_invoice_ref(invoice)] = existing
+                continue
+            values["paid_on"] = _paid_on(invoice, existing.paid_on)
+            for name, value in values.items():
+                if getattr(existing, name) != value:
+                    setattr(existing, name, value)
+                    if existing.pk:
+                        fields.add(name)
+                        changed[existing.pk] = existing
+
+        unnumbered = [invoice for invoice in new if not invoice.invoice_number]
+        if unnumbered:
+            # Reserved outside the chunk transaction (see crm.numbering), so the
+            # sequence row is not locked while the chunk is written.
+            numbers = allocate_numbers("invoice", len(unnumbered))
+            for invoice, number in zip(unnumbered, numbers):
+                invoice.invoice_number = number
+        Invoice.objects.bulk_create(new, batch_size=1000)
+        stats["invoices_created"] += len(new)
+        if changed:
+            now = timezone.now()
+            for invoice in changed.values():
+                invoice.updated_at = now
+            Invoice.objects.bulk_update(
+                list(changed.values()), [*fields, "updated_at"], batch_size=1000
+            )
+        stats["invoices_updated"] += len(changed)
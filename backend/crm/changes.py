@@ -0,0 +1,134 @@
+"""Change-data-capture log for the main crm models.
+
+``save()``/``delete()`` (through signals) and bulk ``QuerySet`` writes (through
+``ChangeTrackingQuerySet``) buffer events per transaction; the buffer is
+written with one ``bulk_create`` when the transaction commits. Events are
+hints that an object changed, not a copy of its data: consumers re-read the
+current rows, so an event whose savepoint was later rolled back is harmless.
+A deleted row can no longer be read, so delete events keep the few columns
+in ``DELETE_CONTEXT`` that consumers need to find what the row counted in.
+
+Consumers keep their own position in ``ChangeConsumer`` and only read events
+older than ``CRM_CHANGE_LOG_SETTLE_SECONDS``, which leaves concurrent commits
+time to land before an id range is considered complete.
+"""
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+
+from .models import ChangeConsumer, ChangeEvent
+
+TRACKED_MODELS = ("crm.client", "crm.policy", "crm.invoice", "crm.renewal", "crm.lead")
+DELETE_CONTEXT = {
+    "crm.client": ("territory_id",),
+    "crm.policy": ("client_id",),
+    "crm.lead": ("created_at",),
+}
+
+_local = threading.local()
+
+
+def _flush(using: str, buffer: list) -> None:
+    if getattr(_local, "buffers", {}).get(using) is buffer:
+        del _local.buffers[using]
+    if buffer:
+        ChangeEvent.objects.using(using).bulk_create(buffer, batch_size=1000)
+
+
+def delete_context(instance):
+    names = DELETE_CONTEXT.get(instance._meta.label_lower)
+    if not names:
+        return None
+    return {name: getattr(instance, name) for name in names}
+
+
+def record_changes(
+    model, object_ids, operation: str, fields=(), using="default", context=None
+) -> None:
+    label = model._meta.label_lower
+    if label not in TRACKED_MODELS or not object_ids:
+        return
+    events = [
+        ChangeEvent(
+            model=label,
+            object_id=pk,
+            operation=operation,
+            fields=list(fields),
+            context=context,
+        )
+        for pk in object_ids
+    ]
+    connection = connections[using]
+    if not connection.in_atomic_block:
+        ChangeEvent.objects.using(using).bulk_create(events, batch_size=1000)
+        return
+
+    buffers = _local.__dict__.setdefault("buffers", {})
+    buffer = buffers.get(using)
+    registered = buffer is not None and any(
+        getattr(callback, "buffer", None) is buffer
+        for _, callback, *_ in connection.run_on_commit
+    )
+    if not registered:
+        buffer = buffers[using] = []
+
+        def callback():
+            _flush(using, buffer)
+
+        callback.buffer = buffer
+        transaction.on_commit(callback, using=using)
+    buffer.extend(events)
+
+
+class ChangeFeed:
+    """Reads the change log on behalf of one named consumer."""
+
+    def __init__(self, name: str, models=None):
+        self.name = name
+        self.models = models
+
+    @property
+    def position(self) -> int:
+        consumer, _ = ChangeConsumer.objects.get_or_create(name=self.name)
+        return consumer.position
+
+    def read(self, limit=1000, after=None) -> list:
+        settle = getattr(settings, "CRM_CHANGE_LOG_SETTLE_SECONDS", 2)
+        events = ChangeEvent.objects.filter(
+            pk__gt=self.position if after is None else after,
+            created_at__lte=timezone.now() - timedelta(seconds=settle),
+        )
+        if self.models:
+            events = events.filter(model__in=self.models)
+        return list(events.order_by("pk")[:limit])
+
+    def ack(self, position: int) -> None:
+        ChangeConsumer.objects.filter(name=self.name, position__lt=position).update(
+            position=position
+        )
+
+    def consume(self, handler, batch_size=1000) -> int:
+        """Feed pending events to ``handler`` in batches and advance the position.
+
+        ``handler`` runs in the same transaction as the position update, so a
+        failure leaves the batch to be delivered again.
+        """
+
+        processed = 0
+        position = self.position
+        while True:
+            events = self.read(limit=batch_size, after=position)
+            if not events:
+                return processed
+            with transaction.atomic():
+                handler(events)
+                position = events[-1].pk
+                self.ack(position)
+            processed += len(events)
+
+
+def changed_ids(events, model: str) -> set:
+    return {event.object_id for event in events if event.model == model}
@@ -0,0 +1,185 @@
+"""Negotiated gzip/brotli/zstd compression for API responses.
+
+Responses under ``CRM_COMPRESSION_PATHS`` are compressed with the best
+encoding the client accepts (zstd, then br, then gzip; brotli and zstd are
+used when their packages are installed). Bodies smaller than
+``CRM_COMPRESSION_MIN_SIZE`` are sent as is. Streaming responses are
+compressed chunk by chunk, with a flush after each chunk so nothing waits in
+the compressor. Server-sent events are never compressed.
+"""
+import gzip
+import zlib
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+try:
+    import brotli
+except ImportError:  # brotli support is optional.
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # zstd support is optional.
+    zstandard = None
+
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+    "text/",
+)
+EXCLUDED_TYPES = ("text/event-stream",)
+
+
+class GzipCodec:
+    name = "gzip"
+    level = 6
+
+    def compress(self, data: bytes, level: int) -> bytes:
+        return gzip.compress(data, compresslevel=level, mtime=0)
+
+    def stream(self):
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        return (
+            lambda chunk: compressor.compress(chunk)
+            + compressor.flush(zlib.Z_SYNC_FLUSH),
+            compressor.flush,
+        )
+
+
+class BrotliCodec:
+    name = "br"
+    level = 4
+
+    def compress(self, data: bytes, level: int) -> bytes:
+        return brotli.compress(data, mode=brotli.MODE_TEXT, quality=level)
+
+    def stream(self):
+        compressor = brotli.Compressor(mode=brotli.MODE_TEXT, quality=self.level)
+        return (
+            lambda chunk: compressor.process(chunk) + compressor.flush(),
+            compressor.finish,
+        )
+
+
+class ZstdCodec:
+    name = "zstd"
+    level = 3
+
+    def compress(self, data: bytes, level: int) -> bytes:
+        return zstandard.ZstdCompressor(level=level).compress(data)
+
+    def stream(self):
+        compressor = zstandard.ZstdCompressor(level=self.level).compressobj()
+        return (
+            lambda chunk: compressor.compress(chunk)
+            + compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK),
+            compressor.flush,
+        )
+
+
+# In order of preference when the client accepts several with the same q-value.
+CODECS = {
+    codec.name: codec
+    for codec, available in (
+        (ZstdCodec(), zstandard is not None),
+        (BrotliCodec(), brotli is not None),
+        (GzipCodec(), True),
+    )
+    if available
+}
+
+
+def negotiate(accept_encoding: str):
+    """Pick the codec for an ``Accept-Encoding`` header, or ``None`` for identity."""
+
+    weights = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        weight = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[name.strip().lower()] = weight
+    best, best_weight = None, 0.0
+    for name, codec in CODECS.items():
+        weight = weights.get(name, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = codec, weight
+    return best
+
+
+def _compressible(response) -> bool:
+    content_type = response.get("Content-Type", "").split(";")[0].strip().lower()
+    return content_type.startswith(COMPRESSIBLE_TYPES) and not content_type.startswith(
+        EXCLUDED_TYPES
+    )
+
+
+def compress_stream(codec, chunks):
+    compress, finish = codec.stream()
+    for chunk in chunks:
+        if data := compress(chunk):
+            yield data
+    yield finish()
+
+
+async def acompress_stream(codec, chunks):
+    compress, finish = codec.stream()
+    async for chunk in chunks:
+        if data := compress(chunk):
+            yield data
+    yield finish()
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """Compress API responses with the encoding negotiated from ``Accept-Encoding``.
+
+    Place it right after ``SecurityMiddleware`` so it sees the final body.
+    """
+
+    def process_response(self, request, response):
+        paths = tuple(getattr(settings, "CRM_COMPRESSION_PATHS", ("/api/",)))
+        if not request.path.startswith(paths):
+            return response
+        if response.has_header("Content-Encoding") or not _compressible(response):
+            return response
+        min_size = getattr(settings, "CRM_COMPRESSION_MIN_SIZE", 1024)
+        if not response.streaming and len(response.content) < min_size:
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        codec = negotiate(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        if codec is None:
+            return response
+
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = acompress_stream(
+                    codec, response.streaming_content
+                )
+            else:
+                response.streaming_content = compress_stream(
+                    codec, response.streaming_content
+                )
+            del response.headers["Content-Length"]
+        else:
+            compressed = codec.compress(response.content, codec.level)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers["Content-Length"] = str(len(compressed))
+
+        # The body no longer matches a strong ETag computed on the original.
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        response.headers["Content-Encoding"] = codec.name
+        return response
@@ -0,0 +1,35 @@
+import json
+
+from django.conf import settings
+from django.db import connections
+
+
+def _postgres_estimate(queryset):
+    connection = connections[queryset.db]
+    if not queryset.query.where:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        return row[0] if row else None
+    plan = json.loads(queryset.order_by().explain(format="json"))
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def estimated_count(queryset, threshold=None):
+    """Return ``(count, is_estimate)`` for ``queryset``.
+
+    On PostgreSQL the planner's row estimate is used when it is above
+    ``threshold`` (``CRM_ESTIMATED_COUNT_THRESHOLD`` by default); smaller
+    results, and other databases, get an exact ``COUNT(*)``.
+    """
+
+    if threshold is None:
+        threshold = getattr(settings, "CRM_ESTIMATED_COUNT_THRESHOLD", 100_000)
+    if connections[queryset.db].vendor == "postgresql":
+        estimate = _postgres_estimate(queryset)
+        if estimate is not None and estimate >= threshold:
+            return estimate, True
+    return queryset.count(), False
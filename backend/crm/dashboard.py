@@ -0,0 +1,207 @@
+"""Staff dashboard metrics and the live stream that pushes their changes."""
+import asyncio
+import json
+import logging
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import ChangeEvent, Client, Invoice, Lead, Policy
+
+logger = logging.getLogger(__name__)
+
+
+def build_dashboard_metrics() -> dict:
+    """Summary counts and alert lists shown on the staff dashboard."""
+
+    today = timezone.now().date()
+    next_30_days = today + timedelta(days=30)
+    last_seven_days = timezone.now() - timedelta(days=7)
+    # Clients waiting for their background purge are already gone for the API.
+    clients = Client.objects.filter(purge_requested_at__isnull=True)
+    policies = Policy.objects.filter(client__purge_requested_at__isnull=True)
+    invoices = Invoice.objects.filter(policy__client__purge_requested_at__isnull=True)
+
+    summary = {
+        "total_clients": clients.count(),
+        "total_policies": policies.count(),
+        "active_policies": policies.filter(status=Policy.PolicyStatus.ACTIVE).count(),
+        "pending_policies": policies.filter(status=Policy.PolicyStatus.PENDING).count(),
+        "renewals_next_30_days": policies.filter(
+            renewal_date__range=(today, next_30_days)
+        ).count(),
+        "manual_invoices": invoices.filter(is_manual=True).count(),
+        "invoices_pending": invoices.exclude(status=Invoice.InvoiceStatus.PAID).count(),
+        "leads_last_7_days": Lead.objects.filter(created_at__gte=last_seven_days).count(),
+    }
+
+    renewal_alert_qs = (
+        policies.select_related("client", "product")
+        .filter(renewal_date__range=(today, next_30_days))
+        .order_by("renewal_date")[:5]
+    )
+    invoice_alert_qs = (
+        invoices.select_related("policy", "policy__client")
+        .filter(
+            status__in=[
+                Invoice.InvoiceStatus.DRAFT,
+                Invoice.InvoiceStatus.PENDING,
+                Invoice.InvoiceStatus.OVERDUE,
+            ]
+        )
+        .order_by("-issue_date")[:5]
+    )
+    lead_alert_qs = Lead.objects.filter(created_at__gte=last_seven_days).order_by(
+        "-created_at"
+    )[:5]
+
+    alerts = {
+        "renewals": [
+            {
+                "policy_number": policy.policy_number,
+                "client": str(policy.client),
+                "product": policy.product.name,
+                "renewal_date": (
+                    policy.renewal_date.isoformat() if policy.renewal_date else None
+                ),
+                "status": policy.status,
+            }
+            for policy in renewal_alert_qs
+        ],
+        "invoices": [
+            {
+                "invoice_number": invoice.invoice_number,
+                "policy_number": invoice.policy.policy_number,
+                "client": str(invoice.policy.client),
+                "status": invoice.status,
+                "amount": str(invoice.amount),
+                "due_date": invoice.due_date.isoformat() if invoice.due_date else None,
+                "is_manual": invoice.is_manual,
+            }
+            for invoice in invoice_alert_qs
+        ],
+        "leads": [
+            {
+                "name": lead.name,
+                "insurance_type": lead.insurance_type,
+                "created_at": lead.created_at.isoformat(),
+                "phone": lead.phone,
+            }
+            for lead in lead_alert_qs
+        ],
+    }
+
+    return {"summary": summary, "alerts": alerts}
+
+
+def _latest_change_id():
+    return ChangeEvent.objects.aggregate(latest=Max("pk"))["latest"] or 0
+
+
+class DashboardBroadcaster:
+    """Computes dashboard metrics once per change and fans them out.
+
+    One polling task per process watches the change log (a single ``MAX(id)``
+    query per tick). The metrics are recomputed when something was committed,
+    and also every ``CRM_DASHBOARD_REFRESH_SECONDS`` and when the date rolls
+    over, since windows such as "renewals in the next 30 days" move without
+    any write. The resulting delta is queued for every connected dashboard,
+    so database load does not grow with the number of viewers.
+    """
+
+    def __init__(self):
+        self.subscribers = set()
+        self.snapshot = None
+        self._last_change = None
+        self._computed_at = None
+        self._task = None
+
+    async def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=10)
+        self.subscribers.add(queue)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        if self.snapshot is None:
+            await self._refresh()
+        return queue
+
+    def unsubscribe(self, queue) -> None:
+        self.subscribers.discard(queue)
+
+    def _publish(self, message: dict) -> None:
+        for queue in list(self.subscribers):
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(message)
+
+    def _is_current(self, latest, now) -> bool:
+        if self.snapshot is None or latest != self._last_change:
+            return False
+        period = timedelta(seconds=getattr(settings, "CRM_DASHBOARD_REFRESH_SECONDS", 60))
+        return now.date() == self._computed_at.date() and now - self._computed_at < period
+
+    async def _refresh(self) -> None:
+        latest = await sync_to_async(_latest_change_id)()
+        now = timezone.now()
+        if self._is_current(latest, now):
+            return
+        metrics = await sync_to_async(build_dashboard_metrics)()
+        previous, self.snapshot, self._last_change = self.snapshot, metrics, latest
+        self._computed_at = now
+        if previous is None:
+            return
+        delta = {
+            key: value
+            for key, value in metrics["summary"].items()
+            if previous["summary"].get(key) != value
+        }
+        message = {}
+        if delta:
+            message["summary"] = delta
+        if metrics["alerts"] != previous["alerts"]:
+            message["alerts"] = metrics["alerts"]
+        if message:
+            self._publish(message)
+
+    async def _run(self) -> None:
+        interval = getattr(settings, "CRM_DASHBOARD_PUSH_INTERVAL", 2)
+        while self.subscribers:
+            try:
+                await self._refresh()
+            except Exception:
+                logger.exception("Dashboard metrics refresh failed")
+            await asyncio.sleep(interval)
+        self._task = None
+
+
+broadcaster = DashboardBroadcaster()
+
+
+def sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+async def dashboard_events(queue, max_seconds: int):
+    """Server-sent event stream for one subscriber.
+
+    Streams end after ``max_seconds``; browsers reconnect on their own, which
+    also releases subscribers whose client went away unnoticed.
+    """
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + max_seconds
+    try:
+        yield "retry: 3000\n\n"
+        yield sse("snapshot", broadcaster.snapshot)
+        while (remaining := deadline - loop.time()) > 0:
+            try:
+                message = await asyncio.wait_for(queue.get(), timeout=min(remaining, 15))
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            yield sse("metrics", message)
+    finally:
+        broadcaster.unsubscribe(queue)
@@ -0,0 +1,314 @@
+"""Duplicate client detection and merging.
+
+Clients are read once in a streaming pass and grouped into blocks that share a
+normalized contact key (phone, email, document id or name phonetics). Pairs are
+only scored inside a block, so the run stays near linear in the number of
+clients instead of comparing every pair.
+"""
+import re
+import unicodedata
+from collections import defaultdict
+from dataclasses import dataclass, field
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Client, Document, Lead, Policy
+
+MAX_BLOCK_SIZE = 200
+DEFAULT_MIN_SCORE = 0.6
+# Unattended merges (``dedupe_clients --merge --no-input``) need every pair in the
+# cluster to share at least a document id and surname, or an email and full name.
+AUTO_MERGE_MIN_SCORE = 0.7
+
+MERGEABLE_FIELDS = (
+    "email",
+    "phone_primary",
+    "phone_secondary",
+    "document_id",
+    "address_line1",
+    "address_line2",
+    "city",
+    "state",
+    "postal_code",
+    "country",
+)
+
+_NON_DIGITS = re.compile(r"\D+")
+_NON_ALNUM = re.compile(r"[^0-9A-Z]+")
+_SOUNDEX_CODES = {
+    **dict.fromkeys("BFPV", "1"),
+    **dict.fromkeys("CGJKQSXZ", "2"),
+    **dict.fromkeys("DT", "3"),
+    "L": "4",
+    **dict.fromkeys("MN", "5"),
+    "R": "6",
+}
+
+
+def strip_accents(value: str) -> str:
+    normalized = unicodedata.normalize("NFKD", value)
+    return "".join(char for char in normalized if not unicodedata.combining(char))
+
+
+def normalize_phone(value: str) -> str:
+    digits = _NON_DIGITS.sub("", value or "")
+    if len(digits) == 11 and digits.startswith("1"):
+        digits = digits[1:]
+    return digits if len(digits) >= 7 else ""
+
+
+def normalize_email(value: str) -> str:
+    return (value or "").strip().lower()
+
+
+def normalize_document_id(value: str) -> str:
+    cleaned = _NON_ALNUM.sub("", strip_accents(value or "").upper())
+    return cleaned if len(cleaned) >= 4 else ""
+
+
+def normalize_name(value: str) -> str:
+    return " ".join(strip_accents(value or "").casefold().split())
+
+
+def soundex(value: str) -> str:
+    letters = [char for char in strip_accents(value or "").upper() if "A" <= char <= "Z"]
+    if not letters:
+        return ""
+    first = letters[0]
+    code = first
+    previous = _SOUNDEX_CODES.get(first, "")
+    for char in letters[1:]:
+        digit = _SOUNDEX_CODES.get(char, "")
+        if digit and digit != previous:
+            code += digit
+            if len(code) == 4:
+                break
+        if char not in "HW":
+            previous = digit
+    return code.ljust(4, "0")
+
+
+@dataclass(frozen=True)
+class ClientFingerprint:
+    id: int
+    email: str
+    phones: frozenset
+    document_id: str
+    first_name: str
+    last_name: str
+    first_sound: str
+    last_sound: str
+
+    @classmethod
+    def from_row(cls, row) -> "ClientFingerprint":
+        pk, first, last, email, phone_primary, phone_secondary, document_id = row
+        phones = {normalize_phone(phone_primary), normalize_phone(phone_secondary)}
+        phones.discard("")
+        return cls(
+            id=pk,
+            email=normalize_email(email),
+            phones=frozenset(phones),
+            document_id=normalize_document_id(document_id),
+            first_name=normalize_name(first),
+            last_name=normalize_name(last),
+            first_sound=soundex(first),
+            last_sound=soundex(last),
+        )
+
+    def blocking_keys(self):
+        if self.email:
+            yield f"e:{self.email}"
+        for phone in self.phones:
+            yield f"p:{phone}"
+        if self.document_id:
+            yield f"d:{self.document_id}"
+        if self.last_sound:
+            yield f"n:{self.last_sound}:{self.first_sound}"
+
+
+@dataclass
+class MergeProposal:
+    primary_id: int
+    duplicate_ids: list
+    score: float
+    reasons: set = field(default_factory=set)
+
+
+def score_pair(left: ClientFingerprint, right: ClientFingerprint):
+    score = 0.0
+    reasons = set()
+    if left.document_id and left.document_id == right.document_id:
+        score += 0.6
+        reasons.add("document_id")
+    if left.email and left.email == right.email:
+        score += 0.45
+        reasons.add("email")
+    if left.phones & right.phones:
+        score += 0.35
+        reasons.add("phone")
+    if left.last_name and left.last_name == right.last_name:
+        score += 0.15
+        reasons.add("last_name")
+    elif left.last_sound and left.last_sound == right.last_sound:
+        score += 0.1
+        reasons.add("last_name_phonetic")
+    if left.first_name and left.first_name == right.first_name:
+        score += 0.1
+        reasons.add("first_name")
+    elif left.first_sound and left.first_sound == right.first_sound:
+        score += 0.05
+        reasons.add("first_name_phonetic")
+    return min(score, 1.0), reasons
+
+
+def build_blocks(queryset=None, chunk_size: int = 5000):
+    """Stream clients once, returning fingerprints and the blocks they fall in.
+
+    Clients waiting for their purge are left out unless ``queryset`` is given.
+    """
+
+    if queryset is None:
+        queryset = Client.objects.filter(purge_requested_at__isnull=True)
+    rows = queryset.order_by().values_list(
+        "id",
+        "first_name",
+        "last_name",
+        "email",
+        "phone_primary",
+        "phone_secondary",
+        "document_id",
+    )
+    fingerprints = {}
+    blocks = defaultdict(list)
+    for row in rows.iterator(chunk_size=chunk_size):
+        fingerprint = ClientFingerprint.from_row(row)
+        fingerprints[fingerprint.id] = fingerprint
+        for key in fingerprint.blocking_keys():
+            blocks[key].append(fingerprint.id)
+    return fingerprints, blocks
+
+
+def _pair(left_id, right_id):
+    return (left_id, right_id) if left_id < right_id else (right_id, left_id)
+
+
+def find_duplicates(
+    queryset=None,
+    min_score: float = DEFAULT_MIN_SCORE,
+    max_block_size: int = MAX_BLOCK_SIZE,
+):
+    """Return merge proposals for clusters of clients that look like duplicates.
+
+    Blocks larger than ``max_block_size`` are skipped: a key shared by that many
+    clients (a placeholder phone, a very common surname) carries no signal and
+    would make the comparison quadratic again.
+
+    Clusters are complete-linkage: two groups are joined only if every pair
+    across them scored at least ``min_score``. A~B and B~C do not put A and C
+    together unless A~C as well, so one shared phone cannot chain a household
+    into a single client.
+    """
+
+    fingerprints, blocks = build_blocks(queryset)
+    edge_scores = {}
+    edge_reasons = {}
+    compared = set()
+
+    for members in blocks.values():
+        if len(members) < 2 or len(members) > max_block_size:
+            continue
+        for index, left_id in enumerate(members):
+            for right_id in members[index + 1 :]:
+                pair = _pair(left_id, right_id)
+                if pair in compared:
+                    continue
+                compared.add(pair)
+                score, reasons = score_pair(fingerprints[left_id], fingerprints[right_id])
+                if score >= min_score:
+                    edge_scores[pair] = score
+                    edge_reasons[pair] = reasons
+
+    clusters = {}
+    for (left_id, right_id), _score in sorted(
+        edge_scores.items(), key=lambda item: (-item[1], item[0])
+    ):
+        left = clusters.get(left_id, frozenset([left_id]))
+        right = clusters.get(right_id, frozenset([right_id]))
+        if left is right or not all(
+            _pair(a, b) in edge_scores for a in left for b in right
+        ):
+            continue
+        merged = left | right
+        for member in merged:
+            clusters[member] = merged
+
+    proposals = []
+    for members in {id(cluster): cluster for cluster in clusters.values()}.values():
+        members = sorted(members)
+        pairs = [
+            _pair(left_id, right_id)
+            for index, left_id in enumerate(members)
+            for right_id in members[index + 1 :]
+        ]
+        proposals.append(
+            MergeProposal(
+                primary_id=members[0],
+                duplicate_ids=members[1:],
+                score=min(edge_scores[pair] for pair in pairs),
+                reasons=set().union(*(edge_reasons[pair] for pair in pairs)),
+            )
+        )
+    proposals.sort(key=lambda proposal: (-proposal.score, proposal.primary_id))
+    return proposals
+
+
+@transaction.atomic
+def merge_clients(primary_id: int, duplicate_ids) -> Client:
+    """Fold ``duplicate_ids`` into ``primary_id`` and delete the duplicates.
+
+    Policies and documents are re-pointed with one bulk ``UPDATE`` each, and
+    blank contact fields on the primary are filled from the duplicates.
+    """
+
+    duplicate_ids = [pk for pk in duplicate_ids if pk != primary_id]
+    primary = Client.objects.select_for_update().get(pk=primary_id)
+    duplicates = list(
+        Client.objects.select_for_update().filter(pk__in=duplicate_ids).order_by("pk")
+    )
+    if not duplicates:
+        return primary
+
+    ids = [duplicate.pk for duplicate in duplicates]
+    # updated_at moves too, so snapshot partitions see the re-pointed rows.
+    now = timezone.now()
+    Policy.objects.filter(client_id__in=ids).update(client_id=primary.pk, updated_at=now)
+    Document.objects.filter(client_id__in=ids).update(
+        client_id=primary.pk, updated_at=now
+    )
+    Lead.objects.filter(matched_client_id__in=ids).update(
+        matched_client_id=primary.pk, updated_at=now
+    )
+    Lead.objects.filter(converted_client_id__in=ids).update(
+        converted_client_id=primary.pk, updated_at=now
+    )
+
+    updated_fields = []
+    for field_name in MERGEABLE_FIELDS:
+        if getattr(primary, field_name):
+            continue
+        for duplicate in duplicates:
+            value = getattr(duplicate, field_name)
+            if value:
+                setattr(primary, field_name, value)
+                updated_fields.append(field_name)
+                break
+    extra_notes = [duplicate.notes for duplicate in duplicates if duplicate.notes]
+    if extra_notes:
+        primary.notes = "\n\n".join(filter(None, [primary.notes, *extra_notes]))
+        updated_fields.append("notes")
+    if updated_fields:
+        primary.save(update_fields=[*updated_fields, "updated_at"])
+
+    Client.objects.filter(pk__in=ids).delete()
+    return primary
@@ -0,0 +1,285 @@
+"""Bulk PDF generation for invoices and policy declarations.
+
+The parent process loads each batch with one joined query and turns it into
+plain dictionaries; template rendering and PDF encoding run in a process pool,
+and the parent stores the results as ``Document`` rows with ``bulk_create``.
+
+Each generated document is keyed by kind and object (``invoice:123``) and
+records a hash of the template and data it was rendered from. Re-running
+skips objects whose hash is unchanged and replaces the file of the others,
+so there is never more than one generated document per object.
+"""
+import hashlib
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from django.template.loader import get_template, render_to_string
+
+from .models import Document, Invoice, Policy
+from .pdf import build_pdf
+
+KINDS = ("invoice", "policy")
+
+
+def _address(client) -> str:
+    parts = [
+        client.address_line1,
+        client.address_line2,
+        " ".join(filter(None, [client.city, client.state, client.postal_code])),
+        client.country,
+    ]
+    return "\n".join(part for part in parts if part)
+
+
+def _policy_context(policy) -> dict:
+    client = policy.client
+    return {
+        "policy_number": policy.policy_number,
+        "status": policy.get_status_display(),
+        "start_date": policy.start_date,
+        "end_date": policy.end_date,
+        "renewal_date": policy.renewal_date,
+        "premium_amount": policy.premium_amount,
+        "coverage_summary": policy.coverage_summary,
+        "product": policy.product.name,
+        "category": policy.product.get_category_display(),
+        "client": str(client),
+        "document_id": client.document_id,
+        "address": _address(client),
+    }
+
+
+def build_contexts(kind: str, ids) -> list:
+    """Load one batch and return ``(object_id, client_id, policy_id, context)`` rows."""
+
+    if kind == "invoice":
+        invoices = Invoice.objects.select_related(
+            "policy", "policy__client", "policy__product"
+        ).filter(pk__in=ids)
+        return [
+            (
+                invoice.pk,
+                invoice.policy.client_id,
+                invoice.policy_id,
+                {
+                    **_policy_context(invoice.policy),
+                    "invoice_number": invoice.invoice_number,
+                    "issue_date": invoice.issue_date,
+                    "due_date": invoice.due_date,
+                    "amount": invoice.amount,
+                    "currency": invoice.currency,
+                    "invoice_status": invoice.get_status_display(),
+                    "description": invoice.description,
+                },
+            )
+            for invoice in invoices
+        ]
+    policies = Policy.objects.select_related("client", "product").filter(pk__in=ids)
+    return [
+        (policy.pk, policy.client_id, policy.pk, _policy_context(policy))
+        for policy in policies
+    ]
+
+
+def render_batch(kind: str, rows) -> list:
+    """Render one batch to PDF bytes; runs inside a pool worker."""
+
+    template = f"crm/pdf/{kind}.txt"
+    rendered = []
+    for object_id, client_id, policy_id, context in rows:
+        title = (
+            f"Factura {context['invoice_number']}"
+            if kind == "invoice"
+            else f"Póliza {context['policy_number']}"
+        )
+        text = render_to_string(template, context)
+        rendered.append((object_id, client_id, policy_id, title, build_pdf(text, title)))
+    return rendered
+
+
+def generated_key(kind: str, object_id: int) -> str:
+    return f"{kind}:{object_id}"
+
+
+def _versions(kind: str, rows) -> dict:
+    """Hash of the template source and context of every row, by generated key."""
+
+    template = get_template(f"crm/pdf/{kind}.txt").template.source
+    versions = {}
+    for object_id, _client_id, _policy_id, context in rows:
+        payload = json.dumps(context, sort_keys=True, default=str)
+        digest = hashlib.sha256(f"{template}\0{payload}".encode())
+        versions[generated_key(kind, object_id)] = digest.hexdigest()
+    return versions
+
+
+def _outdated(kind: str, rows, stats) -> tuple:
+    """Drop rows whose stored document is current; return ``(rows, versions)``."""
+
+    versions = _versions(kind, rows)
+    current = set(
+        Document.objects.filter(generated_key__in=versions)
+        .values_list("generated_key", "generated_version")
+        .iterator()
+    )
+    rows = [
+        row
+        for row in rows
+        if (key := generated_key(kind, row[0]), versions[key]) not in current
+    ]
+    stats["unchanged"] += len(versions) - len(rows)
+    return rows, versions
+
+
+def _store(kind: str, rendered, versions, stats) -> None:
+    document_type = (
+        Document.DocumentType.INVOICE
+        if kind == "invoice"
+        else Document.DocumentType.POLICY
+    )
+    existing = Document.objects.in_bulk(
+        [generated_key(kind, row[0]) for row in rendered], field_name="generated_key"
+    )
+    new, changed, replaced_files = [], [], []
+    for object_id, client_id, policy_id, title, content in rendered:
+        key = generated_key(kind, object_id)
+        filename = f"{title.split()[-1]}.pdf"
+        name = default_storage.save(
+            f"documents/{kind}s/{filename}", ContentFile(content, name=filename)
+        )
+        values = {
+            "client_id": client_id,
+            "policy_id": policy_id,
+            "title": title,
+            "file": name,
+            "generated_version": versions[key],
+        }
+        document = existing.get(key)
+        if document is None:
+            new.append(Document(document_type=document_type, generated_key=key, **values))
+            continue
+        replaced_files.append(document.file.name)
+        for field_name, value in values.items():
+            setattr(document, field_name, value)
+        changed.append(document)
+    with transaction.atomic():
+        Document.objects.bulk_create(new)
+        if changed:
+            Document.objects.bulk_update(
+                changed, ["client", "policy", "title", "file", "generated_version"]
+            )
+        transaction.on_commit(
+            lambda: [default_storage.delete(name) for name in replaced_files if name]
+        )
+    stats["created"] += len(new)
+    stats["replaced"] += len(changed)
+
+
+def _executor(workers: int) -> ProcessPoolExecutor:
+    connections.close_all()
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=django.setup,
+    )
+
+
+def _batches(ids, batch_size):
+    for start in range(0, len(ids), batch_size):
+        yield ids[start : start + batch_size]
+
+
+def generate_documents(
+    kind: str, ids, workers=None, batch_size=100, progress=None
+) -> dict:
+    """Render and store PDFs for ``ids`` of ``kind`` (``invoice`` or ``policy``).
+
+    Returns ``{"created", "replaced", "unchanged"}`` counts. ``progress`` is
+    called as ``progress(done, total)`` after each batch. At most
+    ``2 * workers`` batches are in flight, so memory stays bounded.
+    """
+
+    ids = list(ids)
+    workers = workers or os.cpu_count() or 1
+    stats = {"created": 0, "replaced": 0, "unchanged": 0}
+    total = len(ids)
+    batches = _batches(ids, batch_size)
+
+    def done():
+        return sum(stats.values())
+
+    with _executor(workers) as executor:
+        pending = {}
+
+        def submit():
+            for batch in batches:
+                rows, versions = _outdated(kind, build_contexts(kind, batch), stats)
+                if rows:
+                    pending[executor.submit(render_batch, kind, rows)] = versions
+                    return
+                if progress:
+                    progress(done(), total)
+
+        for _ in range(2 * workers):
+            submit()
+        while pending:
+            future = next(as_completed(pending))
+            _store(kind, future.result(), pending.pop(future), stats)
+            if progress:
+                progress(done(), total)
+            submit()
+    return stats
+
+
+def _sample_context(index: int) -> dict:
+    return {
+        "policy_number": f"POL-BENCH-{index:06d}",
+        "status": "Activa",
+        "start_date": None,
+        "end_date": None,
+        "renewal_date": None,
+        "premium_amount": "1250.00",
+        "coverage_summary": "Cobertura completa de responsabilidad y daños. " * 20,
+        "product": "Auto Plus",
+        "category": "Autos",
+        "client": "Cliente de prueba",
+        "document_id": "000-00-0000",
+        "address": "Calle 1\nSan Juan PR 00901\nPuerto Rico",
+        "invoice_number": f"INV-BENCH-{index:07d}",
+        "issue_date": None,
+        "due_date": None,
+        "amount": "104.17",
+        "currency": "USD",
+        "invoice_status": "Pendiente",
+        "description": "Prima mensual",
+    }
+
+
+def benchmark(kind: str, count: int, worker_counts, batch_size=50) -> list:
+    """Render ``count`` synthetic documents per worker count; returns docs/second.
+
+    Nothing is written to the database or storage, so the figures measure the
+    rendering pipeline alone.
+    """
+
+    rows = [(index, 0, 0, _sample_context(index)) for index in range(count)]
+    results = []
+    for workers in worker_counts:
+        with _executor(workers) as executor:
+            list(executor.map(render_batch, [kind] * workers, [rows[:1]] * workers))
+            started = time.perf_counter()
+            futures = [
+                executor.submit(render_batch, kind, rows[start : start + batch_size])
+                for start in range(0, count, batch_size)
+            ]
+            rendered = sum(len(future.result()) for future in futures)
+            elapsed = time.perf_counter() - started
+        results.append((workers, rendered / elapsed))
+    return results
@@ -0,0 +1,307 @@
+"""Read-only fast path for list and detail responses.
+
+``compile_serializer()`` turns a ``ModelSerializer`` class into a row builder:
+each readable field is resolved once to a ``values_list()`` column plus a
+converter that reproduces the field's ``to_representation()``. GET requests
+then build plain dicts straight from tuples, without model instances, nested
+serializer instances or per-field attribute lookups. Serializers with fields
+the compiler does not understand keep the regular DRF path.
+"""
+import decimal
+from functools import lru_cache
+from typing import NamedTuple
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.generics import get_object_or_404
+from rest_framework.pagination import CursorPagination
+from rest_framework.permissions import BasePermission
+from rest_framework.relations import PrimaryKeyRelatedField, RelatedField
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from .renderers import FLOAT_SAFE_RANGE, FastJSONRenderer
+
+
+class Unsupported(Exception):
+    """A serializer field has no compiled equivalent."""
+
+
+class BuildContext(NamedTuple):
+    request: object
+    timezone: object
+
+
+def _decimal_converter(field):
+    coerce = getattr(field, "coerce_to_string", api_settings.COERCE_DECIMAL_TO_STRING)
+    if (
+        not coerce
+        or field.localize
+        or field.normalize_output
+        or field.decimal_places is None
+    ):
+        return field.to_representation
+    exponent = decimal.Decimal(".1") ** field.decimal_places
+    context = decimal.getcontext().copy()
+    if field.max_digits is not None:
+        context.prec = field.max_digits
+    rounding = field.rounding
+
+    def convert(value):
+        if not isinstance(value, decimal.Decimal):
+            value = decimal.Decimal(str(value).strip())
+        return f"{value.quantize(exponent, rounding=rounding, context=context):f}"
+
+    return convert
+
+
+def _datetime_getter(index, field):
+    output_format = getattr(field, "format", api_settings.DATETIME_FORMAT)
+    if output_format is None:
+        return _getter(index, None)
+    iso = output_format.lower() == ISO_8601
+    own_timezone = hasattr(field, "timezone")
+
+    def get(row, context):
+        value = row[index]
+        if value is None:
+            return None
+        # Same as field.enforce_timezone() for aware values, with the current
+        # timezone looked up once per build instead of once per value.
+        if own_timezone or context.timezone is None or value.utcoffset() is None:
+            value = field.enforce_timezone(value)
+        else:
+            value = value.astimezone(context.timezone)
+        if not iso:
+            return value.strftime(output_format)
+        text = value.isoformat()
+        return text[:-6] + "Z" if text.endswith("+00:00") else text
+
+    return get
+
+
+def _date_converter(field):
+    output_format = getattr(field, "format", api_settings.DATE_FORMAT)
+    if output_format is None:
+        return None
+    if output_format.lower() != ISO_8601:
+        return lambda value: value.strftime(output_format)
+    return lambda value: value.isoformat()
+
+
+def _converter(field):
+    """Plain function equivalent to ``field.to_representation`` (``None`` = as is)."""
+
+    if isinstance(field, serializers.DecimalField):
+        return _decimal_converter(field)
+    if isinstance(field, serializers.DateField):
+        return _date_converter(field)
+    if isinstance(field, serializers.ChoiceField):
+        mapping = field.choice_strings_to_values
+        if all(key == value for key, value in mapping.items()):
+            return None
+        return lambda value: mapping.get(str(value), value)
+    if isinstance(field, serializers.CharField):
+        return str
+    if isinstance(field, serializers.BooleanField):
+        return bool
+    if isinstance(field, serializers.IntegerField):
+        return int
+    if isinstance(field, serializers.FloatField):
+        return float
+    if isinstance(field, serializers.ReadOnlyField):
+        return None
+    return field.to_representation
+
+
+def _file_getter(index, field):
+    if not getattr(field, "use_url", api_settings.UPLOADED_FILES_USE_URL):
+        return lambda row, context: row[index] or None
+
+    def get(row, context):
+        name = row[index]
+        if not name:
+            return None
+        url = default_storage.url(name)
+        request = context.request
+        return request.build_absolute_uri(url) if request is not None else url
+
+    return get
+
+
+def _getter(index, convert):
+    if convert is None:
+        return lambda row, context: row[index]
+
+    def get(row, context):
+        value = row[index]
+        return None if value is None else convert(value)
+
+    return get
+
+
+class RowBuilder:
+    """Compiled form of one serializer class, see ``compile_serializer()``."""
+
+    def __init__(self, serializer_class):
+        self.columns = []
+        self.float_columns = []
+        serializer = serializer_class()
+        self.plan = self._compile(serializer, serializer.Meta.model, "")
+
+    def _index(self, path) -> int:
+        if path not in self.columns:
+            self.columns.append(path)
+        return self.columns.index(path)
+
+    def _resolve(self, model, attrs):
+        path, current, model_field = [], model, None
+        for position, attr in enumerate(attrs):
+            try:
+                model_field = current._meta.get_field(attr)
+            except FieldDoesNotExist:
+                raise Unsupported(attr) from None
+            if not model_field.concrete or model_field.many_to_many:
+                raise Unsupported(attr)
+            path.append(model_field.name)
+            if position < len(attrs) - 1:
+                if not model_field.is_relation or model_field.null:
+                    raise Unsupported(attr)
+                current = model_field.related_model
+        return "__".join(path), model_field
+
+    def _compile(self, serializer, model, prefix) -> list:
+        plan = []
+        for field in serializer._readable_fields:
+            if field.source == "*" or isinstance(field, serializers.ListSerializer):
+                raise Unsupported(field.field_name)
+            path, model_field = self._resolve(model, field.source_attrs)
+            path = prefix + path
+            if isinstance(field, serializers.ModelSerializer):
+                if not (model_field.many_to_one or model_field.one_to_one):
+                    raise Unsupported(field.field_name)
+                nested = self._compile(field, model_field.related_model, f"{path}__")
+                null_index = self._index(path) if model_field.null else None
+                plan.append((field.field_name, self._nested_getter(nested, null_index)))
+                continue
+            if isinstance(field, RelatedField):
+                if not isinstance(field, PrimaryKeyRelatedField) or field.pk_field:
+                    raise Unsupported(field.field_name)
+                plan.append((field.field_name, _getter(self._index(path), None)))
+                continue
+            if isinstance(field, serializers.BaseSerializer) or model_field.is_relation:
+                raise Unsupported(field.field_name)
+            index = self._index(path)
+            if isinstance(field, serializers.FileField):
+                plan.append((field.field_name, _file_getter(index, field)))
+                continue
+            if isinstance(field, serializers.DateTimeField):
+                plan.append((field.field_name, _datetime_getter(index, field)))
+                continue
+            if isinstance(field, serializers.FloatField):
+                self.float_columns.append(index)
+            plan.append((field.field_name, _getter(index, _converter(field))))
+        return plan
+
+    @staticmethod
+    def _nested_getter(plan, null_index):
+        def get(row, context):
+            if null_index is not None and row[null_index] is None:
+                return None
+            return {name: getter(row, context) for name, getter in plan}
+
+        return get
+
+    def values(self, queryset):
+        return queryset.prefetch_related(None).values_list(*self.columns)
+
+    def build(self, rows, request=None) -> list:
+        plan = self.plan
+        context = BuildContext(
+            request, timezone.get_current_timezone() if settings.USE_TZ else None
+        )
+        return [{name: getter(row, context) for name, getter in plan} for row in rows]
+
+    def floats_safe(self, rows) -> bool:
+        """Whether every float prints the same with orjson (see ``FastJSONRenderer``)."""
+
+        low, high = FLOAT_SAFE_RANGE
+        for index in self.float_columns:
+            for row in rows:
+                value = row[index]
+                if value and not low <= abs(value) < high:
+                    return False
+        return True
+
+
+@lru_cache(maxsize=None)
+def compile_serializer(serializer_class):
+    """Return a ``RowBuilder`` for ``serializer_class``, or ``None`` if unsupported."""
+
+    try:
+        return RowBuilder(serializer_class)
+    except Unsupported:
+        return None
+
+
+class FastReadMixin:
+    """Serve GET ``list``/``retrieve`` from compiled ``values_list()`` rows.
+
+    Opt-in: only used when ``CRM_FAST_SERIALIZATION`` is on (or the view sets
+    ``fast_serialization = True``) and the client negotiated JSON; the
+    browsable API, write actions and serializers that cannot be compiled go
+    through DRF as usual.
+    """
+
+    # ``None`` follows CRM_FAST_SERIALIZATION; True or False overrides it.
+    fast_serialization = None
+
+    def get_row_builder(self):
+        enabled = self.fast_serialization
+        if enabled is None:
+            enabled = getattr(settings, "CRM_FAST_SERIALIZATION", False)
+        if not enabled:
+            return None
+        if not isinstance(self.request.accepted_renderer, JSONRenderer):
+            return None
+        if isinstance(self.paginator, CursorPagination):
+            return None
+        return compile_serializer(self.get_serializer_class())
+
+    def _fast_data(self, builder, rows) -> list:
+        data = builder.build(rows, self.request)
+        if type(self.request.accepted_renderer) is JSONRenderer and builder.floats_safe(
+            rows
+        ):
+            self.request.accepted_renderer = FastJSONRenderer()
+        return data
+
+    def list(self, request, *args, **kwargs):
+        builder = self.get_row_builder()
+        if builder is None:
+            return super().list(request, *args, **kwargs)
+        rows = builder.values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(self._fast_data(builder, page))
+        return Response(self._fast_data(builder, list(rows)))
+
+    def retrieve(self, request, *args, **kwargs):
+        builder = self.get_row_builder()
+        # Object permissions need the instance, so views with any keep DRF's path.
+        if builder is None or any(
+            type(permission).has_object_permission
+            is not BasePermission.has_object_permission
+            for permission in self.get_permissions()
+        ):
+            return super().retrieve(request, *args, **kwargs)
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        rows = builder.values(self.filter_queryset(self.get_queryset()))
+        row = get_object_or_404(
+            rows, **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+        )
+        return Response(self._fast_data(builder, [row])[0])
@@ -0,0 +1,218 @@
+"""Declarative, index-aware filtering and ordering for the crm viewsets.
+
+A viewset lists its filters in ``query_filters`` (query parameter -> filter)
+and the orderings it allows in ``ordering_fields``. A filter counts as indexed
+when the first model field of its lookup is the leading column of an index
+(``db_index``, ``unique``, a foreign key or the first field of a
+``Meta.indexes`` entry). Requests whose filters are all unindexed are
+refused, because they would scan the whole table; the ``crm.W002`` check
+reports filters that have no supporting index.
+"""
+from datetime import datetime, time
+
+from django.core import checks
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+TRUE_VALUES = {"1", "true", "t", "yes", "si", "sí"}
+FALSE_VALUES = {"0", "false", "f", "no"}
+
+
+def leading_index_columns(model) -> set:
+    columns = {
+        field.name
+        for field in model._meta.concrete_fields
+        if field.db_index or field.unique or field.primary_key
+    }
+    columns.update(
+        index.fields[0].lstrip("-") for index in model._meta.indexes if index.fields
+    )
+    return columns
+
+
+class Filter:
+    """Maps one query parameter onto ``lookup``; ``indexed`` may override detection."""
+
+    def __init__(self, lookup: str, indexed=None):
+        self.lookup = lookup
+        self.indexed = indexed
+
+    def is_indexed(self, model) -> bool:
+        if self.indexed is not None:
+            return self.indexed
+        return self.lookup.split("__")[0] in leading_index_columns(model)
+
+    def params(self, name) -> tuple:
+        return (name,)
+
+    def parse(self, name, value):
+        return value
+
+    def filter(self, queryset, name, query_params):
+        value = query_params.get(name, "").strip()
+        if not value:
+            return queryset, False
+        return queryset.filter(**{self.lookup: self.parse(name, value)}), True
+
+
+class ChoiceFilter(Filter):
+    """``?status=pending`` or ``?status=pending,overdue``."""
+
+    def __init__(self, lookup: str, choices, indexed=None):
+        super().__init__(lookup, indexed)
+        self.choices = {value for value, _ in choices}
+
+    def filter(self, queryset, name, query_params):
+        values = [item.strip() for item in query_params.get(name, "").split(",")]
+        values = [item for item in values if item]
+        if not values:
+            return queryset, False
+        invalid = ", ".join(sorted(set(values) - self.choices))
+        if invalid:
+            choices = ", ".join(sorted(self.choices))
+            raise ValidationError(
+                {name: [f"Valor no válido: {invalid}. Opciones: {choices}."]}
+            )
+        if len(values) == 1:
+            return queryset.filter(**{self.lookup: values[0]}), True
+        return queryset.filter(**{f"{self.lookup}__in": values}), True
+
+
+class IdFilter(Filter):
+    """``?client=12`` or ``?client=12,15``."""
+
+    def filter(self, queryset, name, query_params):
+        values = [item.strip() for item in query_params.get(name, "").split(",")]
+        values = [item for item in values if item]
+        if not values:
+            return queryset, False
+        if not all(item.isdigit() for item in values):
+            raise ValidationError(
+                {name: ["Debe ser un id numérico o una lista separada por comas."]}
+            )
+        ids = [int(item) for item in values]
+        if len(ids) == 1:
+            return queryset.filter(**{self.lookup: ids[0]}), True
+        return queryset.filter(**{f"{self.lookup}__in": ids}), True
+
+
+class BooleanFilter(Filter):
+    def parse(self, name, value):
+        value = value.lower()
+        if value in TRUE_VALUES:
+            return True
+        if value in FALSE_VALUES:
+            return False
+        raise ValidationError({name: ["Debe ser true o false."]})
+
+
+class DateRangeFilter(Filter):
+    """``?<name>_after=AAAA-MM-DD`` and/or ``?<name>_before=AAAA-MM-DD`` (inclusive)."""
+
+    def params(self, name) -> tuple:
+        return (f"{name}_after", f"{name}_before")
+
+    def __init__(self, lookup: str, indexed=None, is_datetime=False):
+        super().__init__(lookup, indexed)
+        self.is_datetime = is_datetime
+
+    def _bound(self, param, value, end):
+        parsed = parse_date(value)
+        if parsed is None:
+            raise ValidationError({param: ["Debe tener formato AAAA-MM-DD."]})
+        if not self.is_datetime:
+            return parsed
+        return timezone.make_aware(
+            datetime.combine(parsed, time.max if end else time.min)
+        )
+
+    def filter(self, queryset, name, query_params):
+        after_param, before_param = self.params(name)
+        conditions = {}
+        if after := query_params.get(after_param, "").strip():
+            conditions[f"{self.lookup}__gte"] = self._bound(after_param, after, end=False)
+        if before := query_params.get(before_param, "").strip():
+            conditions[f"{self.lookup}__lte"] = self._bound(
+                before_param, before, end=True
+            )
+        if not conditions:
+            return queryset, False
+        return queryset.filter(**conditions), True
+
+
+class IndexedFilterBackend(BaseFilterBackend):
+    """Applies ``view.query_filters`` and ``?ordering=`` from ``view.ordering_fields``."""
+
+    ordering_param = "ordering"
+
+    def filter_queryset(self, request, queryset, view):
+        model = queryset.model
+        applied = []
+        for name, query_filter in getattr(view, "query_filters", {}).items():
+            queryset, used = query_filter.filter(queryset, name, request.query_params)
+            if used:
+                applied.append((name, query_filter))
+        if applied and not any(item.is_indexed(model) for _, item in applied):
+            indexed = [
+                name
+                for name, item in view.query_filters.items()
+                if item.is_indexed(model)
+            ]
+            raise ValidationError(
+                {
+                    "detail": (
+                        f"Los filtros {', '.join(name for name, _ in applied)} no usan "
+                        f"un índice; combínalos con alguno de: {', '.join(indexed)}."
+                    )
+                }
+            )
+        return self._order(request, queryset, view)
+
+    def _order(self, request, queryset, view):
+        ordering = request.query_params.get(self.ordering_param, "").strip()
+        if not ordering:
+            return queryset
+        allowed = getattr(view, "ordering_fields", ())
+        if ordering.lstrip("-") not in allowed:
+            raise ValidationError(
+                {
+                    self.ordering_param: [
+                        f"Orden no permitido. Opciones: {', '.join(allowed)} (con - para descendente)."
+                    ]
+                }
+            )
+        # The primary key breaks ties so pages stay stable.
+        return queryset.order_by(ordering, "-pk" if ordering.startswith("-") else "pk")
+
+
+@checks.register()
+def check_indexed_filters(app_configs, **kwargs):
+    from .urls import router
+
+    errors = []
+    for _, viewset, _ in router.registry:
+        model = viewset.queryset.model
+        for name, query_filter in getattr(viewset, "query_filters", {}).items():
+            if query_filter.indexed is None and not query_filter.is_indexed(model):
+                errors.append(
+                    checks.Warning(
+                        f"Filter '{name}' ({query_filter.lookup}) is not backed by an index.",
+                        hint="Index the field or declare the filter with indexed=False.",
+                        obj=viewset,
+                        id="crm.W002",
+                    )
+                )
+        leading = leading_index_columns(model)
+        for field in getattr(viewset, "ordering_fields", ()):
+            if field not in leading:
+                errors.append(
+                    checks.Warning(
+                        f"Ordering '{field}' is not backed by an index.",
+                        hint="Index the field or remove it from ordering_fields.",
+                        obj=viewset,
+                        id="crm.W002",
+                    )
+                )
+    return errors
@@ -0,0 +1,236 @@
+"""Write-behind buffer for public lead submissions.
+
+During campaign bursts, one INSERT transaction per request competes with staff
+writes, and on SQLite it hits lock timeouts. With ``CRM_LEAD_BUFFER`` on (it is
+off by default, since clients then get ``202`` instead of the created lead), the
+lead endpoint validates a submission, appends it to a spool file and answers
+``202`` right away. A background thread then writes the buffered leads with
+one ``bulk_create``, either once ``CRM_LEAD_BUFFER_SIZE`` are waiting or
+``CRM_LEAD_BUFFER_SECONDS`` after the first one arrived.
+
+Each process appends JSON lines to its own spool segment in
+``CRM_LEAD_SPOOL_DIR`` and syncs the file before answering. A new segment is
+started at every flush, and a segment is deleted once its leads are committed.
+``manage.py flush_lead_spool`` replays the segments a crashed process left
+behind. Every submission carries a ``submission_id`` (unique on ``Lead``), so a
+lead is inserted only once even when a segment is replayed after a partial
+write.
+"""
+import atexit
+import contextlib
+import glob
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from .changes import record_changes
+from .matching import contact_index
+from .models import Client, Lead
+
+logger = logging.getLogger(__name__)
+
+
+def spool_dir() -> str:
+    return str(getattr(settings, "CRM_LEAD_SPOOL_DIR", "spool/leads"))
+
+
+def store_attachment(upload) -> str:
+    """Save an uploaded attachment the way ``Lead.attachment`` would; return its name."""
+
+    field = Lead._meta.get_field("attachment")
+    name = field.generate_filename(None, upload.name)
+    return field.storage.save(name, upload, max_length=field.max_length)
+
+
+def write_leads(records) -> int:
+    """Insert spooled submissions, skipping ones already written; return rows added."""
+
+    client_ids = {record["matched_client"] for record in records} - {None}
+    existing = set(Client.objects.filter(pk__in=client_ids).values_list("pk", flat=True))
+    leads = []
+    for record in records:
+        fields = dict(record)
+        client_id = fields.pop("matched_client")
+        if client_id not in existing:
+            client_id, fields["match_confidence"] = None, None
+        leads.append(
+            Lead(
+                matched_client_id=client_id,
+                submission_id=uuid.UUID(fields.pop("submission_id")),
+                attachment=fields.pop("attachment") or None,
+                **fields,
+            )
+        )
+    submission_ids = [lead.submission_id for lead in leads]
+    with transaction.atomic():
+        written = Lead._base_manager.filter(submission_id__in=submission_ids)
+        # A replayed segment may hold leads written before; only new ones get a
+        # "create" event. ``ignore_conflicts`` does not return primary keys, so
+        # the new rows are found afterwards.
+        seen = list(written.values_list("submission_id", flat=True))
+        Lead._base_manager.bulk_create(leads, batch_size=500, ignore_conflicts=True)
+        ids = list(written.exclude(submission_id__in=seen).values_list("pk", flat=True))
+        record_changes(Lead, ids, "create")
+    return len(ids)
+
+
+def read_segment(path) -> list:
+    records = []
+    with open(path, encoding="utf-8") as handle:
+        for number, line in enumerate(handle, 1):
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                # A crash mid-write leaves at most a truncated last line.
+                logger.warning("Skipping unreadable line %s of %s", number, path)
+    return records
+
+
+def replay_spool(min_age: float = 60, batch_size: int = 500) -> tuple:
+    """Write the leads of spool segments untouched for ``min_age`` seconds.
+
+    Live processes seal their segment at every flush, so an old segment
+    belongs to a process that died (or whose flushes keep failing). Returns
+    ``(segments, leads)``.
+    """
+
+    segments = leads = 0
+    for path in sorted(glob.glob(os.path.join(spool_dir(), "*.jsonl"))):
+        with contextlib.suppress(FileNotFoundError):
+            if time.time() - os.path.getmtime(path) < min_age:
+                continue
+            records = read_segment(path)
+            for start in range(0, len(records), batch_size):
+                leads += write_leads(records[start : start + batch_size])
+            os.unlink(path)
+            segments += 1
+    return segments, leads
+
+
+class LeadBuffer:
+    """Per-process queue of validated submissions with its spool segment."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._pid = None
+
+    def _reset(self) -> None:
+        # Also runs in a forked child: the parent's queue and files stay its own.
+        self._pid = os.getpid()
+        self._pending: list = []
+        self._sealed: list = []
+        self._spool = None
+        self._spool_path = None
+        self._first_at = None
+        threading.Thread(target=self._run, name="crm-lead-buffer", daemon=True).start()
+
+    def submit(self, data: dict) -> str:
+        """Queue a validated submission (``LeadSerializer.validated_data``)."""
+
+        data = dict(data)
+        upload = data.pop("attachment", None)
+        client_id, confidence = contact_index.match(
+            phone=data.get("phone", ""), email=data.get("email", "")
+        )
+        record = {
+            **data,
+            "submission_id": str(uuid.uuid4()),
+            "source": "web_form",
+            "attachment": store_attachment(upload) if upload else "",
+            "matched_client": client_id,
+            "match_confidence": confidence,
+        }
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            if self._pid != os.getpid():
+                self._reset()
+            if self._spool is None:
+                os.makedirs(spool_dir(), exist_ok=True)
+                self._spool_path = os.path.join(
+                    spool_dir(),
+                    f"{socket.gethostname()}-{self._pid}-{time.time_ns()}.jsonl",
+                )
+                self._spool = open(self._spool_path, "a", encoding="utf-8")
+            self._spool.write(line)
+            self._spool.flush()
+            if getattr(settings, "CRM_LEAD_SPOOL_FSYNC", True):
+                os.fsync(self._spool.fileno())
+            self._pending.append(record)
+            if self._first_at is None:
+                self._first_at = time.monotonic()
+            full = len(self._pending) >= settings.CRM_LEAD_BUFFER_SIZE
+        if full:
+            self._wakeup.set()
+        return record["submission_id"]
+
+    def flush(self) -> int:
+        """Write everything queued so far; return the number of leads written."""
+
+        with self._flush_lock:
+            with self._lock:
+                if self._pid != os.getpid():
+                    return 0
+                records, self._pending = self._pending, []
+                if self._spool is not None:
+                    self._spool.close()
+                    self._sealed.append(self._spool_path)
+                    self._spool = self._spool_path = None
+                sealed, self._sealed = self._sealed, []
+                first_at, self._first_at = self._first_at, None
+            try:
+                written = write_leads(records) if records else 0
+            except Exception:
+                with self._lock:
+                    self._pending[:0] = records
+                    self._sealed[:0] = sealed
+                    self._first_at = first_at or self._first_at
+                raise
+            for path in sealed:
+                with contextlib.suppress(FileNotFoundError):
+                    os.unlink(path)
+            return written
+
+    def _due(self):
+        """Seconds until the next flush is due (``0`` = now, ``None`` = idle)."""
+
+        with self._lock:
+            if not self._pending:
+                return None
+            if len(self._pending) >= settings.CRM_LEAD_BUFFER_SIZE:
+                return 0
+            elapsed = time.monotonic() - self._first_at
+            return max(settings.CRM_LEAD_BUFFER_SECONDS - elapsed, 0)
+
+    def _run(self) -> None:
+        while True:
+            wait = self._due()
+            if wait != 0:
+                self._wakeup.wait(wait)
+                self._wakeup.clear()
+                continue
+            try:
+                close_old_connections()
+                self.flush()
+            except Exception:
+                logger.exception("Could not write buffered leads; retrying")
+                time.sleep(settings.CRM_LEAD_BUFFER_SECONDS)
+
+
+lead_buffer = LeadBuffer()
+
+
+@atexit.register
+def _flush_on_exit() -> None:
+    try:
+        lead_buffer.flush()
+    except Exception:
+        logger.exception("Buffered leads left in the spool for flush_lead_spool")
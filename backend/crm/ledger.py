@@ -0,0 +1,166 @@
+"""Client account ledgers: charges, payments and running balances.
+
+Every issued invoice (``pending``, ``overdue`` or ``paid``) is a charge on its
+issue date, and every paid invoice is also a payment on ``paid_on``. One SQL
+query unions both kinds of entries for a set of clients and computes the
+running balance with ``SUM(...) OVER (PARTITION BY client ORDER BY date)``,
+in integer cents so SQLite and PostgreSQL agree to the cent. Aging buckets
+are derived from the same rows: the unpaid charges, by days past due.
+"""
+import itertools
+from datetime import date
+from decimal import Decimal
+
+from django.db import connection
+from django.utils import timezone
+
+from .models import Client, Invoice, Policy
+
+CHARGED_STATUSES = (
+    Invoice.InvoiceStatus.PENDING,
+    Invoice.InvoiceStatus.OVERDUE,
+    Invoice.InvoiceStatus.PAID,
+)
+OUTSTANDING_STATUSES = (Invoice.InvoiceStatus.PENDING, Invoice.InvoiceStatus.OVERDUE)
+# (bucket, first day past due, last day past due)
+AGING_BUCKETS = (
+    ("current", None, 0),
+    ("1-30", 1, 30),
+    ("31-60", 31, 60),
+    ("61-90", 61, 90),
+    ("90+", 91, None),
+)
+CHARGE, PAYMENT = 0, 1
+
+
+def _ledger_sql(client_count: int) -> str:
+    quote = connection.ops.quote_name
+    invoices, policies = quote(Invoice._meta.db_table), quote(Policy._meta.db_table)
+    clients = ", ".join(["%s"] * client_count)
+    columns = (
+        "p.client_id, i.id AS invoice_id, i.invoice_number, p.policy_number, "
+        "i.due_date, i.status"
+    )
+    cents = "CAST(ROUND(i.amount * 100) AS BIGINT)"
+    return f"""
+        WITH entries AS (
+            SELECT {columns}, i.issue_date AS entry_date, {CHARGE} AS kind,
+                {cents} AS cents
+            FROM {invoices} i JOIN {policies} p ON p.id = i.policy_id
+            WHERE p.client_id IN ({clients}) AND i.status IN (%s, %s, %s)
+            UNION ALL
+            SELECT {columns}, COALESCE(i.paid_on, i.issue_date), {PAYMENT},
+                -{cents}
+            FROM {invoices} i JOIN {policies} p ON p.id = i.policy_id
+            WHERE p.client_id IN ({clients}) AND i.status = %s
+        )
+        SELECT client_id, invoice_id, invoice_number, policy_number, due_date, status,
+            entry_date, kind, cents,
+            SUM(cents) OVER (
+                PARTITION BY client_id ORDER BY entry_date, kind, invoice_id
+                ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW
+            ) AS balance
+        FROM entries
+        ORDER BY client_id, entry_date, kind, invoice_id
+    """
+
+
+def ledger_rows(client_ids, chunk_size: int = 2000):
+    """Yield the ledger rows of ``client_ids``, grouped by client, in date order."""
+
+    client_ids = list(client_ids)
+    if not client_ids:
+        return
+    params = [*client_ids, *CHARGED_STATUSES, *client_ids, Invoice.InvoiceStatus.PAID]
+    with connection.cursor() as cursor:
+        cursor.execute(_ledger_sql(len(client_ids)), params)
+        while rows := cursor.fetchmany(chunk_size):
+            yield from rows
+
+
+def _date(value):
+    # SQLite returns the dates of a compound SELECT as text.
+    if value is None or isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def _money(cents) -> str:
+    return str(Decimal(int(cents)).scaleb(-2))
+
+
+def aging_bucket(days_past_due: int) -> str:
+    for name, first, last in AGING_BUCKETS:
+        if (first is None or days_past_due >= first) and (
+            last is None or days_past_due <= last
+        ):
+            return name
+    return AGING_BUCKETS[-1][0]
+
+
+def build_statement(client_id, rows, as_of=None) -> dict:
+    """Ledger document for one client from its ``ledger_rows()``."""
+
+    as_of = as_of or timezone.localdate()
+    aging = {name: 0 for name, _, _ in AGING_BUCKETS}
+    entries, balance = [], 0
+    for (
+        _,
+        invoice_id,
+        invoice_number,
+        policy_number,
+        due_date,
+        status,
+        entry_date,
+        kind,
+        cents,
+        balance,
+    ) in rows:
+        entry_date, due_date = _date(entry_date), _date(due_date)
+        if kind == CHARGE and status in OUTSTANDING_STATUSES:
+            aging[aging_bucket((as_of - (due_date or entry_date)).days)] += cents
+        entries.append(
+            {
+                "date": entry_date.isoformat(),
+                "type": "charge" if kind == CHARGE else "payment",
+                "invoice": invoice_id,
+                "invoice_number": invoice_number,
+                "policy_number": policy_number,
+                "due_date": due_date.isoformat() if due_date else None,
+                "amount": _money(cents),
+                "balance": _money(balance),
+            }
+        )
+    return {
+        "client": client_id,
+        "as_of": as_of.isoformat(),
+        "balance": _money(balance),
+        "aging": {name: _money(cents) for name, cents in aging.items()},
+        "entries": entries,
+    }
+
+
+def client_ledger(client_id, as_of=None) -> dict:
+    return build_statement(client_id, ledger_rows([client_id]), as_of)
+
+
+def outstanding_statements(as_of=None, batch_size: int = 500):
+    """Yield ``(client, statement)`` for every client with a balance due.
+
+    Clients are read in primary key batches (keyset pagination) and the
+    ledgers of a batch come from one query, so memory stays bounded and each
+    batch costs the same. Clients are not pre-filtered with an ``EXISTS`` on
+    unpaid invoices: without column statistics SQLite drives that subquery
+    from the invoice status index, once per client.
+    """
+
+    clients = Client.objects.order_by("pk")
+    last_pk = 0
+    while batch := list(clients.filter(pk__gt=last_pk)[:batch_size]):
+        last_pk = batch[-1].pk
+        by_pk = {client.pk: client for client in batch}
+        grouped = itertools.groupby(ledger_rows(by_pk), key=lambda row: row[0])
+        for client_id, rows in grouped:
+            statement = build_statement(client_id, rows, as_of)
+            if Decimal(statement["balance"]) > 0:
+                yield by_pk[client_id], statement
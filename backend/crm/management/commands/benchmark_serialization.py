@@ -0,0 +1,114 @@
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory
+
+from crm import views
+from crm.models import Client, InsuranceProduct, Invoice, Policy, Renewal
+
+ENDPOINTS = {
+    "clients": views.ClientViewSet,
+    "policies": views.PolicyViewSet,
+    "renewals": views.RenewalViewSet,
+    "invoices": views.InvoiceViewSet,
+}
+
+
+def _seed(count: int) -> None:
+    today = timezone.localdate()
+    product = InsuranceProduct.objects.create(name="Benchmark", category="auto")
+    clients = Client.objects.bulk_create(
+        Client(
+            first_name=f"Cliente {index}",
+            last_name="Pérez Ñuñez",
+            email=f"bench{index}@example.com",
+            phone_primary="787-555-0100",
+            city="San Juan",
+            notes="Línea 1\nLínea 2",
+        )
+        for index in range(count)
+    )
+    policies = Policy.objects.bulk_create(
+        Policy(
+            policy_number=f"BENCH-{index:07d}",
+            client=client,
+            product=product,
+            status=Policy.PolicyStatus.ACTIVE,
+            start_date=today,
+            renewal_date=today + timedelta(days=index % 365),
+            premium_amount=Decimal("1234.50") + index,
+            coverage_summary="Cobertura completa",
+        )
+        for index, client in enumerate(clients)
+    )
+    Renewal.objects.bulk_create(
+        Renewal(policy=policy, renewal_date=policy.renewal_date) for policy in policies
+    )
+    Invoice.objects.bulk_create(
+        Invoice(
+            policy=policy,
+            invoice_number=f"BENCH-INV-{index:07d}",
+            issue_date=today,
+            due_date=today + timedelta(days=30),
+            amount=Decimal("102.88"),
+        )
+        for index, policy in enumerate(policies)
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the DRF serializer path with the compiled fast path on list endpoints."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rows",
+            type=int,
+            default=2000,
+            help="Synthetic rows to add (in a rolled back transaction) when fewer exist.",
+        )
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--endpoint", choices=sorted(ENDPOINTS), action="append")
+
+    def handle(self, *args, **options):
+        hosts = [host for host in settings.ALLOWED_HOSTS if host not in ("*", "")]
+        host = hosts[0].lstrip(".") if hosts else "localhost"
+        factory = APIRequestFactory()
+        with transaction.atomic():
+            if Policy.objects.count() < options["rows"]:
+                _seed(options["rows"] - Policy.objects.count())
+            for name in options["endpoint"] or sorted(ENDPOINTS):
+                viewset = ENDPOINTS[name]
+                timings, bodies = {}, {}
+                for fast in (False, True):
+                    view = viewset.as_view({"get": "list"}, fast_serialization=fast)
+                    best = None
+                    for _ in range(options["repeat"]):
+                        request = factory.get(
+                            f"/api/{name}/",
+                            HTTP_ACCEPT="application/json",
+                            HTTP_HOST=host,
+                        )
+                        started = time.perf_counter()
+                        response = view(request)
+                        response.render()
+                        elapsed = time.perf_counter() - started
+                        best = elapsed if best is None else min(best, elapsed)
+                    timings[fast], bodies[fast] = best, response.content
+                if bodies[False] != bodies[True]:
+                    raise CommandError(
+                        f"{name}: fast path output differs from DRF output."
+                    )
+                rows = viewset.queryset.count()
+                self.stdout.write(
+                    f"{name:<10} {rows} rows  drf {timings[False] * 1000:8.1f} ms  "
+                    f"fast {timings[True] * 1000:8.1f} ms  "
+                    f"x{timings[False] / timings[True]:.1f}  (identical output)"
+                )
+            transaction.set_rollback(True)
@@ -0,0 +1,41 @@
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from crm.ledger import outstanding_statements
+
+
+class Command(BaseCommand):
+    help = (
+        "Write the account statement (ledger, balance and aging) of every client "
+        "with unpaid invoices as JSON lines, streamed in client id order."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--output", help="File to write (default: stdout).")
+        parser.add_argument("--as-of", help="Aging date, AAAA-MM-DD (default: today).")
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        as_of = None
+        if options["as_of"]:
+            as_of = parse_date(options["as_of"])
+            if as_of is None:
+                raise CommandError("--as-of must be AAAA-MM-DD.")
+        output = (
+            open(options["output"], "w", encoding="utf-8") if options["output"] else None
+        )
+        stream = output or sys.stdout
+        count = 0
+        try:
+            for client, statement in outstanding_statements(as_of, options["batch_size"]):
+                statement["name"] = str(client)
+                statement["email"] = client.email
+                stream.write(json.dumps(statement, ensure_ascii=False) + "\n")
+                count += 1
+        finally:
+            if output:
+                output.close()
+        self.stderr.write(self.style.SUCCESS(f"{count} statements written."))
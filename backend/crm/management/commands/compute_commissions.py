@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from crm.commissions import compute_statements, month_periods, quarter_periods
+
+
+class Command(BaseCommand):
+    help = "Compute (or recompute) the commission statements of a year."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--year", type=int, default=timezone.localdate().year)
+        parser.add_argument(
+            "--period", choices=("month", "quarter", "year"), default="month"
+        )
+
+    def handle(self, *args, **options):
+        year = options["year"]
+        if options["period"] == "month":
+            periods = month_periods(year)
+        elif options["period"] == "quarter":
+            periods = quarter_periods(year)
+        else:
+            periods = [(month_periods(year)[0][0], month_periods(year)[-1][1])]
+
+        started = time.perf_counter()
+        statements = compute_statements(periods)
+        elapsed = time.perf_counter() - started
+        for statement in statements:
+            self.stdout.write(
+                f"{statement.period_start} – {statement.period_end}: "
+                f"{statement.line_count} lines, commission {statement.commission_total} "
+                f"(written {statement.written_premium}, collected "
+                f"{statement.collected_premium}, {statement.unmatched_count} without schedule)"
+            )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{len(statements)} statements computed in {elapsed:.2f}s."
+            )
+        )
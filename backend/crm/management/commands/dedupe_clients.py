@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand
+
+from crm.dedup import (
+    AUTO_MERGE_MIN_SCORE,
+    DEFAULT_MIN_SCORE,
+    MAX_BLOCK_SIZE,
+    find_duplicates,
+    merge_clients,
+)
+
+
+class Command(BaseCommand):
+    help = "Detect duplicate clients and optionally merge them."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--min-score", type=float, default=DEFAULT_MIN_SCORE)
+        parser.add_argument("--max-block-size", type=int, default=MAX_BLOCK_SIZE)
+        parser.add_argument(
+            "--merge",
+            action="store_true",
+            help="Merge proposals, confirming each one, instead of only listing them.",
+        )
+        parser.add_argument(
+            "--noinput",
+            "--no-input",
+            action="store_false",
+            dest="interactive",
+            help=(
+                "With --merge, do not prompt; merge only groups whose weakest pair "
+                "scores at least --auto-merge-score."
+            ),
+        )
+        parser.add_argument(
+            "--auto-merge-score", type=float, default=AUTO_MERGE_MIN_SCORE
+        )
+
+    def handle(self, *args, **options):
+        proposals = find_duplicates(
+            min_score=options["min_score"],
+            max_block_size=options["max_block_size"],
+        )
+        merged = 0
+        for proposal in proposals:
+            duplicates = ",".join(str(pk) for pk in proposal.duplicate_ids)
+            reasons = ",".join(sorted(proposal.reasons))
+            self.stdout.write(
+                f"{proposal.primary_id}\t{duplicates}\t{proposal.score:.2f}\t{reasons}"
+            )
+            if options["merge"] and self.confirm(proposal, options):
+                merge_clients(proposal.primary_id, proposal.duplicate_ids)
+                merged += 1
+
+        if options["merge"]:
+            message = f"Merged {merged} of {len(proposals)} duplicate group(s)."
+        else:
+            message = f"Found {len(proposals)} duplicate group(s)."
+        self.stdout.write(self.style.SUCCESS(message))
+
+    def confirm(self, proposal, options) -> bool:
+        if not options["interactive"]:
+            return proposal.score >= options["auto_merge_score"]
+        answer = input(f"Merge into client {proposal.primary_id}? [y/N] ")
+        return answer.strip().lower() in ("y", "yes", "s", "si", "sí")
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from crm.lead_buffer import replay_spool
+
+
+class Command(BaseCommand):
+    help = (
+        "Write the buffered leads left in spool segments by stopped or crashed processes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--min-age",
+            type=float,
+            default=60,
+            help="Only segments not written to for this many seconds (live ones are newer).",
+        )
+
+    def handle(self, *args, **options):
+        segments, leads = replay_spool(min_age=options["min_age"])
+        self.stdout.write(
+            self.style.SUCCESS(f"{segments} spool segments replayed ({leads} leads).")
+        )
@@ -0,0 +1,81 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from crm.document_generation import KINDS, benchmark, generate_documents
+from crm.models import Invoice, Policy
+
+
+class Command(BaseCommand):
+    help = "Render invoice or policy declaration PDFs in parallel and store them as documents."
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=KINDS)
+        parser.add_argument("--status", help="Only objects with this status.")
+        parser.add_argument(
+            "--from", dest="date_from", help="Issue/start date from (YYYY-MM-DD)."
+        )
+        parser.add_argument(
+            "--to", dest="date_to", help="Issue/start date to (YYYY-MM-DD)."
+        )
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument(
+            "--benchmark",
+            type=int,
+            metavar="COUNT",
+            help="Render COUNT synthetic documents with 1..--workers processes and report throughput.",
+        )
+
+    def handle(self, *args, **options):
+        kind = options["kind"]
+        if options["benchmark"]:
+            counts = sorted(
+                {
+                    1,
+                    *[2**n for n in range(1, 8) if 2**n < options["workers"]],
+                    options["workers"],
+                }
+            )
+            baseline = None
+            for workers, rate in benchmark(kind, options["benchmark"], counts):
+                baseline = baseline or rate
+                self.stdout.write(
+                    f"{workers:>3} worker(s): {rate:8.1f} docs/s  x{rate / baseline:.2f}"
+                )
+            return
+
+        if kind == "invoice":
+            queryset, date_field = Invoice.objects.all(), "issue_date"
+        else:
+            queryset, date_field = Policy.objects.all(), "start_date"
+        if options["status"]:
+            queryset = queryset.filter(status=options["status"])
+        for option, lookup in (("date_from", "gte"), ("date_to", "lte")):
+            if options[option]:
+                value = parse_date(options[option])
+                if value is None:
+                    raise CommandError(f"Invalid date: {options[option]}")
+                queryset = queryset.filter(**{f"{date_field}__{lookup}": value})
+
+        ids = list(queryset.order_by("pk").values_list("pk", flat=True))
+
+        def progress(done, total):
+            self.stdout.write(f"{done}/{total}", ending="\r")
+            self.stdout.flush()
+
+        stats = generate_documents(
+            kind,
+            ids,
+            workers=options["workers"],
+            batch_size=options["batch_size"],
+            progress=progress,
+        )
+        self.stdout.write("")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Stored {stats['created']} new and {stats['replaced']} updated "
+                f"{kind} document(s); {stats['unchanged']} unchanged."
+            )
+        )
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from crm.billing import generate_schedules, issue_due_installments
+from crm.models import Policy
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate or refresh installment invoices for policies with a payment plan "
+        "and issue the draft installments that are due."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--policy",
+            action="append",
+            dest="policy_numbers",
+            help="Only this policy number (repeatable).",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        policies = Policy.objects.exclude(payment_plan="")
+        if options["policy_numbers"]:
+            policies = Policy.objects.filter(policy_number__in=options["policy_numbers"])
+        stats = generate_schedules(policies, batch_size=options["batch_size"])
+        issued = issue_due_installments()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{stats['policies']} policies: {stats['created']} installments created, "
+                f"{stats['updated']} updated, {stats['deleted']} removed, "
+                f"{stats['credited']} credit notes; "
+                f"{issued} drafts issued."
+            )
+        )
@@ -0,0 +1,91 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from crm.bordereau import BordereauImporter
+
+
+class Command(BaseCommand):
+    help = (
+        "Import a carrier bordereau (CSV or XLSX) into clients, policies and invoices; "
+        "an interrupted import of the same file resumes where it stopped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument(
+            "--map",
+            action="append",
+            default=[],
+            metavar="COLUMN=FIELD",
+            help="Map a file column to a field, e.g. --map 'Pol Nbr=policy_number'.",
+        )
+        parser.add_argument("--chunk-size", type=int, default=5000)
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Validation processes (0 validates in this process).",
+        )
+        parser.add_argument(
+            "--rejects", help="Rejects CSV (default: <path>.rejects.csv)."
+        )
+        parser.add_argument("--encoding", default="utf-8-sig")
+        parser.add_argument("--delimiter", default=",")
+        parser.add_argument("--sheet", help="XLSX worksheet (default: the active one).")
+        parser.add_argument(
+            "--date-format",
+            action="append",
+            dest="date_formats",
+            help="strptime format for dates; repeat to try several.",
+        )
+        parser.add_argument(
+            "--restart", action="store_true", help="Ignore the checkpoint and start over."
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        if not os.path.isfile(path):
+            raise CommandError(f"File not found: {path}")
+        column_map = {}
+        for mapping in options["map"]:
+            column, separator, field = mapping.rpartition("=")
+            if not separator or not column:
+                raise CommandError(f"Invalid --map value: {mapping}")
+            column_map[column] = field.strip()
+
+        extra = (
+            {"date_formats": options["date_formats"]} if options["date_formats"] else {}
+        )
+        importer = BordereauImporter(
+            path,
+            column_map=column_map,
+            chunk_size=options["chunk_size"],
+            workers=options["workers"],
+            rejects_path=options["rejects"],
+            encoding=options["encoding"],
+            delimiter=options["delimiter"],
+            sheet=options["sheet"],
+            **extra,
+        )
+
+        def progress(run):
+            self.stdout.write(
+                f"{run.rows_read} rows read, {run.rows_rejected} rejected", ending="\r"
+            )
+            self.stdout.flush()
+
+        try:
+            run = importer.run(restart=options["restart"], progress=progress)
+        except ValueError as exc:
+            raise CommandError(str(exc)) from exc
+        self.stdout.write("")
+        stats = ", ".join(f"{key}={value}" for key, value in sorted(run.stats.items()))
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{run.source}: {run.rows_imported} row(s) imported, "
+                f"{run.rows_rejected} rejected ({stats})."
+            )
+        )
+        if run.rows_rejected:
+            self.stdout.write(f"Rejected rows written to {run.rejects_path}")
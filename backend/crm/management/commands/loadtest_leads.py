@@ -0,0 +1,146 @@
+import statistics
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory
+
+from crm.lead_buffer import lead_buffer
+from crm.models import Client, Lead
+from crm.views import LeadViewSet
+
+NAME_PREFIX = "loadtest "
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies: list = []
+        self.errors = 0
+        self.staff_writes = 0
+        self.staff_errors = 0
+
+
+def _submitter(view, host, stop, stats, worker) -> None:
+    factory = APIRequestFactory()
+    sequence = 0
+    try:
+        while not stop.is_set():
+            sequence += 1
+            request = factory.post(
+                "/api/leads/",
+                {
+                    "name": f"{NAME_PREFIX}{worker}-{sequence}",
+                    "phone": f"787-555-{sequence % 10000:04d}",
+                    "email": f"loadtest{worker}.{sequence}@example.com",
+                    "insurance_type": Lead.InsuranceType.AUTO,
+                    "notes": "Generado por loadtest_leads",
+                },
+                HTTP_HOST=host,
+            )
+            started = time.perf_counter()
+            try:
+                response = view(request)
+                ok = response.status_code in (201, 202)
+            except Exception:
+                ok = False
+            elapsed = time.perf_counter() - started
+            with stats.lock:
+                if ok:
+                    stats.latencies.append(elapsed)
+                else:
+                    stats.errors += 1
+    finally:
+        connection.close()
+
+
+def _staff_writer(client_ids, stop, stats) -> None:
+    """Short update transactions standing in for staff editing clients."""
+
+    index = 0
+    try:
+        while not stop.is_set() and client_ids:
+            index += 1
+            try:
+                with transaction.atomic():
+                    Client.objects.filter(pk=client_ids[index % len(client_ids)]).update(
+                        updated_at=timezone.now()
+                    )
+                with stats.lock:
+                    stats.staff_writes += 1
+            except Exception:
+                with stats.lock:
+                    stats.staff_errors += 1
+            time.sleep(0.01)
+    finally:
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure sustained public lead submissions per second with and without the "
+        "write-behind buffer, under concurrent staff writes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seconds", type=float, default=10)
+        parser.add_argument("--concurrency", type=int, default=8)
+        parser.add_argument("--staff-writers", type=int, default=2)
+        parser.add_argument(
+            "--mode", choices=("both", "direct", "buffered"), default="both"
+        )
+        parser.add_argument(
+            "--keep", action="store_true", help="Keep the generated leads."
+        )
+
+    def handle(self, *args, **options):
+        hosts = [host for host in settings.ALLOWED_HOSTS if host not in ("*", "")]
+        host = hosts[0].lstrip(".") if hosts else "localhost"
+        client_ids = list(Client.objects.values_list("pk", flat=True)[:500])
+        modes = (
+            ("direct", "buffered") if options["mode"] == "both" else (options["mode"],)
+        )
+        try:
+            for mode in modes:
+                self._run(mode, host, client_ids, options)
+        finally:
+            if not options["keep"]:
+                Lead.objects.filter(name__startswith=NAME_PREFIX).delete()
+
+    def _run(self, mode, host, client_ids, options) -> None:
+        view = LeadViewSet.as_view({"post": "create"}, write_behind=mode == "buffered")
+        stats, stop = Stats(), threading.Event()
+        before = Lead.objects.filter(name__startswith=NAME_PREFIX).count()
+        threads = [
+            threading.Thread(target=_submitter, args=(view, host, stop, stats, worker))
+            for worker in range(options["concurrency"])
+        ] + [
+            threading.Thread(target=_staff_writer, args=(client_ids, stop, stats))
+            for _ in range(options["staff_writers"])
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        time.sleep(options["seconds"])
+        stop.set()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        drain = time.perf_counter()
+        lead_buffer.flush()
+        drain = time.perf_counter() - drain
+        written = Lead.objects.filter(name__startswith=NAME_PREFIX).count() - before
+
+        latencies = sorted(stats.latencies) or [0.0]
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        self.stdout.write(
+            f"{mode:<9} {len(stats.latencies) / elapsed:8.1f} submissions/s  "
+            f"p50 {statistics.median(latencies) * 1000:6.1f} ms  "
+            f"p99 {p99 * 1000:6.1f} ms  errors {stats.errors}  "
+            f"staff writes {stats.staff_writes / elapsed:.1f}/s "
+            f"({stats.staff_errors} failed)  "
+            f"rows written {written} (drain {drain * 1000:.0f} ms)"
+        )
@@ -0,0 +1,99 @@
+import json
+import os
+import shutil
+import statistics
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from crm.profiling import REQUEST_LOG, categorize
+
+
+def _read_folded(path):
+    with open(path, encoding="utf-8") as handle:
+        for line in handle:
+            stack, _, count = line.rstrip("\n").rpartition(" ")
+            if stack and count.isdigit():
+                yield stack.split(";"), int(count)
+
+
+class Command(BaseCommand):
+    help = "Summarize the profiled requests: time per layer and top frames per endpoint."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dir", default=str(settings.CRM_PROFILING_DIR))
+        parser.add_argument(
+            "--endpoint", help="Only endpoints containing this text (e.g. policies)."
+        )
+        parser.add_argument("--top", type=int, default=15)
+        parser.add_argument(
+            "--clear", action="store_true", help="Delete the collected profiles."
+        )
+
+    def handle(self, *args, **options):
+        directory = options["dir"]
+        if options["clear"]:
+            shutil.rmtree(directory, ignore_errors=True)
+            self.stdout.write(f"Profiles in {directory} deleted.")
+            return
+        if not os.path.isdir(directory):
+            self.stdout.write("No profiles collected yet.")
+            return
+
+        durations = defaultdict(list)
+        log_path = os.path.join(directory, REQUEST_LOG)
+        if os.path.exists(log_path):
+            with open(log_path, encoding="utf-8") as handle:
+                for line in handle:
+                    entry = json.loads(line)
+                    durations[entry["endpoint"]].append(entry["duration_ms"])
+
+        for name in sorted(os.listdir(directory)):
+            if not name.endswith(".folded"):
+                continue
+            own, total, layers = Counter(), Counter(), Counter()
+            endpoint, samples = None, 0
+            for stack, count in _read_folded(os.path.join(directory, name)):
+                endpoint, frames = stack[0], stack[1:]
+                samples += count
+                layers[categorize(frames)] += count
+                if frames:
+                    own[frames[-1]] += count
+                for frame in set(frames):
+                    total[frame] += count
+            if not samples or (
+                options["endpoint"] and options["endpoint"] not in endpoint
+            ):
+                continue
+            self._report(
+                endpoint,
+                name,
+                samples,
+                durations[endpoint],
+                layers,
+                own,
+                total,
+                options["top"],
+            )
+
+    def _report(self, endpoint, name, samples, durations, layers, own, total, top):
+        self.stdout.write(self.style.MIGRATE_HEADING(f"{endpoint}  ({name})"))
+        if durations:
+            self.stdout.write(
+                f"  {len(durations)} requests, median {statistics.median(durations):.1f} ms, "
+                f"max {max(durations):.1f} ms, {samples} samples"
+            )
+        self.stdout.write(
+            "  by layer: "
+            + ", ".join(
+                f"{layer} {count * 100 / samples:.0f}%"
+                for layer, count in layers.most_common()
+            )
+        )
+        self.stdout.write("  top frames (self / total):")
+        for frame, count in own.most_common(top):
+            self.stdout.write(
+                f"    {count * 100 / samples:5.1f}% {total[frame] * 100 / samples:5.1f}%  {frame}"
+            )
+        self.stdout.write("")
@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from crm.models import Client
+from crm.purge import RETENTION_POLICIES, apply_retention, purge_client
+
+
+class Command(BaseCommand):
+    help = (
+        "Apply the data retention policies (run daily) or purge clients in chunks "
+        "with everything that belongs to them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--client",
+            type=int,
+            action="append",
+            dest="client_ids",
+            help="Purge this client id now instead of applying retention (repeatable).",
+        )
+        parser.add_argument(
+            "--pending",
+            action="store_true",
+            help="Purge the clients deleted through the API that are still waiting.",
+        )
+        parser.add_argument(
+            "--policy",
+            action="append",
+            choices=sorted(RETENTION_POLICIES),
+            help="Only this retention policy (repeatable).",
+        )
+        parser.add_argument("--chunk-size", type=int)
+        parser.add_argument("--throttle", type=float, help="Seconds between chunks.")
+
+    def handle(self, *args, **options):
+        chunking = {"chunk_size": options["chunk_size"], "throttle": options["throttle"]}
+        client_ids = list(options["client_ids"] or [])
+        if options["pending"]:
+            client_ids += Client.objects.filter(
+                purge_requested_at__isnull=False
+            ).values_list("pk", flat=True)
+        if client_ids:
+            for client_id in client_ids:
+                if not Client.objects.filter(pk=client_id).exists():
+                    raise CommandError(f"Client {client_id} does not exist.")
+                stats = purge_client(client_id, max_seconds=float("inf"), **chunking)
+                self.stdout.write(f"Client {client_id}: {self._format(stats)}")
+            return
+        if options["pending"]:
+            self.stdout.write("No clients waiting to be purged.")
+            return
+        for name, stats in apply_retention(options["policy"], **chunking).items():
+            self.stdout.write(f"{name}: {self._format(stats)}")
+
+    @staticmethod
+    def _format(stats) -> str:
+        return ", ".join(
+            f"{count} {label}" for label, count in sorted(stats.items())
+        ) or ("nothing to delete")
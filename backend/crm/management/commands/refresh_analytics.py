@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from crm.analytics import (
+    rebuild_lead_cohorts,
+    rebuild_territories,
+    refresh_lead_cohorts,
+    refresh_territories,
+)
+
+
+class Command(BaseCommand):
+    help = "Update the analytics tables from the change log (run it every minute or so)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rebuild",
+            action="store_true",
+            help="Recompute everything from the base tables instead of the change log.",
+        )
+
+    def handle(self, *args, **options):
+        if options["rebuild"]:
+            rows = rebuild_territories()
+            self.stdout.write(f"Territories rebuilt: {rows} rollup rows.")
+            rows = rebuild_lead_cohorts()
+            self.stdout.write(f"Lead cohorts rebuilt: {rows} rows.")
+        else:
+            events = refresh_territories()
+            self.stdout.write(f"Territories: {events} change events applied.")
+            events = refresh_lead_cohorts()
+            self.stdout.write(f"Lead cohorts: {events} change events applied.")
@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from crm.tasks import Worker
+
+
+class Command(BaseCommand):
+    help = "Run background crm tasks from the database queue."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--queue",
+            action="append",
+            dest="queues",
+            metavar="NAME[:CONCURRENCY]",
+            help="Queue to process (repeatable). Defaults to CRM_TASK_QUEUES.",
+        )
+        parser.add_argument("--pool", choices=("thread", "process"), default="thread")
+        parser.add_argument("--poll-interval", type=float, default=1.0)
+        parser.add_argument(
+            "--burst",
+            action="store_true",
+            help="Exit once there is nothing left to run.",
+        )
+
+    def handle(self, *args, **options):
+        queues = dict(getattr(settings, "CRM_TASK_QUEUES", {"default": 4}))
+        if options["queues"]:
+            queues = {}
+            for value in options["queues"]:
+                name, _, concurrency = value.partition(":")
+                try:
+                    queues[name] = int(concurrency or 1)
+                except ValueError:
+                    raise CommandError(f"Invalid concurrency in '{value}'.")
+
+        worker = Worker(
+            queues, pool=options["pool"], poll_interval=options["poll_interval"]
+        )
+        summary = ", ".join(f"{name}:{limit}" for name, limit in queues.items())
+        self.stdout.write(f"Worker {worker.worker_id} processing {summary}")
+        worker.run(burst=options["burst"])
+        self.stdout.write(self.style.SUCCESS("Worker stopped."))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from crm.reminders import dispatch_reminders
+
+
+class Command(BaseCommand):
+    help = "Email reminders for upcoming renewals and overdue invoices."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=200)
+        parser.add_argument("--workers", type=int, default=None)
+
+    def handle(self, *args, **options):
+        result = dispatch_reminders(
+            batch_size=options["batch_size"], workers=options["workers"]
+        )
+        for error in result.errors:
+            self.stderr.write(error)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{result.marked_overdue} invoice(s) marked overdue, "
+                f"{result.due} reminder(s) due, {result.sent} sent, "
+                f"{result.skipped} skipped, {result.failed} failed."
+            )
+        )
@@ -0,0 +1,220 @@
+"""In-memory contact index used to match incoming leads to existing clients."""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Max
+
+from .dedup import normalize_email, normalize_phone
+from .models import ChangeEvent, Client
+
+logger = logging.getLogger(__name__)
+
+EMAIL_WEIGHT = 0.7
+PHONE_WEIGHT = 0.5
+
+
+def _add(mapping: dict, key: str, client_id: int) -> None:
+    current = mapping.get(key)
+    if current is None:
+        mapping[key] = client_id
+    elif isinstance(current, tuple):
+        if client_id not in current:
+            mapping[key] = current + (client_id,)
+    elif current != client_id:
+        mapping[key] = (current, client_id)
+
+
+def _discard(mapping: dict, key: str, client_id: int) -> None:
+    current = mapping.get(key)
+    if current == client_id:
+        del mapping[key]
+    elif isinstance(current, tuple) and client_id in current:
+        remaining = tuple(pk for pk in current if pk != client_id)
+        mapping[key] = remaining[0] if len(remaining) == 1 else remaining
+
+
+def _ids(value) -> tuple:
+    if value is None:
+        return ()
+    return value if isinstance(value, tuple) else (value,)
+
+
+class ContactIndex:
+    """Maps normalized phones and emails to client ids.
+
+    The index is loaded once per process in a background thread and then kept
+    current by ``Client`` signals once their transaction commits. Changes
+    made by other processes, including bulk ``.update()`` writes and deletes,
+    are picked up by a periodic incremental refresh that replays the
+    ``crm.client`` change log. Clients awaiting a purge are never matched.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._emails: dict = {}
+        self._phones: dict = {}
+        self._keys: dict = {}
+        self._ready = False
+        self._warming = False
+        self._position = 0
+        self._refreshed = 0.0
+
+    @property
+    def is_ready(self) -> bool:
+        return self._ready
+
+    @property
+    def enabled(self) -> bool:
+        return getattr(settings, "CRM_CONTACT_INDEX", True)
+
+    @staticmethod
+    def _client_keys(email, phone_primary, phone_secondary):
+        phones = {normalize_phone(phone_primary), normalize_phone(phone_secondary)}
+        phones.discard("")
+        return normalize_email(email), tuple(sorted(phones))
+
+    @staticmethod
+    def _rows(queryset):
+        return (
+            queryset.filter(purge_requested_at__isnull=True)
+            .order_by()
+            .values_list("id", "email", "phone_primary", "phone_secondary")
+        )
+
+    @staticmethod
+    def _unindex(emails, phones, keys, client_id) -> None:
+        previous = keys.pop(client_id, None)
+        if previous:
+            _discard(emails, previous[0], client_id)
+            for phone in previous[1]:
+                _discard(phones, phone, client_id)
+
+    def _index(self, emails, phones, keys, row) -> None:
+        client_id, email, phone_primary, phone_secondary = row
+        self._unindex(emails, phones, keys, client_id)
+        email, client_phones = self._client_keys(email, phone_primary, phone_secondary)
+        if email:
+            _add(emails, email, client_id)
+        for phone in client_phones:
+            _add(phones, phone, client_id)
+        if email or client_phones:
+            keys[client_id] = (email, client_phones)
+
+    def warm(self) -> None:
+        # Read the log position first: changes committed while the rows load
+        # are replayed by the refresh below.
+        position = self._log().aggregate(position=Max("pk"))["position"] or 0
+        emails, phones, keys = {}, {}, {}
+        for row in self._rows(Client.objects.all()).iterator(chunk_size=5000):
+            self._index(emails, phones, keys, row)
+        with self._lock:
+            self._emails, self._phones, self._keys = emails, phones, keys
+            self._position = position
+            self._refreshed = time.monotonic()
+            self._ready = True
+            self._warming = False
+        self.refresh()
+
+    def warm_in_background(self) -> None:
+        with self._lock:
+            if self._ready or self._warming:
+                return
+            self._warming = True
+
+        def run():
+            try:
+                self.warm()
+            except Exception:
+                logger.exception("Could not warm the client contact index")
+                with self._lock:
+                    self._warming = False
+            finally:
+                connections.close_all()
+
+        threading.Thread(target=run, name="crm-contact-index", daemon=True).start()
+
+    def reset(self) -> None:
+        """Drop the index; the next match loads it again."""
+
+        with self._lock:
+            self._emails, self._phones, self._keys = {}, {}, {}
+            self._ready = self._warming = False
+            self._position = 0
+
+    @staticmethod
+    def _log():
+        return ChangeEvent.objects.filter(model="crm.client")
+
+    def refresh(self, batch_size: int = 5000) -> None:
+        with self._lock:
+            if not self._ready:
+                return
+            position = self._position
+        while True:
+            events = list(
+                self._log()
+                .filter(pk__gt=position)
+                .order_by("pk")
+                .values_list("pk", "object_id")[:batch_size]
+            )
+            if not events:
+                break
+            ids = {object_id for _, object_id in events}
+            rows = list(self._rows(Client.objects.filter(pk__in=ids)))
+            with self._lock:
+                for client_id in ids:
+                    self._unindex(self._emails, self._phones, self._keys, client_id)
+                for row in rows:
+                    self._index(self._emails, self._phones, self._keys, row)
+                position = self._position = max(position, events[-1][0])
+        self._refreshed = time.monotonic()
+
+    def update(self, client: Client) -> None:
+        with self._lock:
+            if not self._ready:
+                return
+            if client.purge_requested_at is not None:
+                self._unindex(self._emails, self._phones, self._keys, client.pk)
+                return
+            row = (client.pk, client.email, client.phone_primary, client.phone_secondary)
+            self._index(self._emails, self._phones, self._keys, row)
+
+    def remove(self, client_id: int) -> None:
+        with self._lock:
+            if self._ready:
+                self._unindex(self._emails, self._phones, self._keys, client_id)
+
+    def match(self, phone: str = "", email: str = ""):
+        """Return ``(client_id, confidence)`` for the best match, or ``(None, None)``.
+
+        While the index is still loading no match is attempted, so a cold
+        process never delays the request that triggered the load.
+        """
+
+        if not self.enabled:
+            return None, None
+        if not self._ready:
+            self.warm_in_background()
+            return None, None
+        interval = getattr(settings, "CRM_CONTACT_INDEX_REFRESH_SECONDS", 30)
+        if time.monotonic() - self._refreshed > interval:
+            self.refresh()
+
+        scores: dict = {}
+        with self._lock:
+            email_ids = _ids(self._emails.get(normalize_email(email)))
+            phone_ids = _ids(self._phones.get(normalize_phone(phone)))
+        for client_id in email_ids:
+            scores[client_id] = scores.get(client_id, 0.0) + EMAIL_WEIGHT
+        for client_id in phone_ids:
+            scores[client_id] = scores.get(client_id, 0.0) + PHONE_WEIGHT
+        if not scores:
+            return None, None
+        client_id = min(scores, key=lambda pk: (-scores[pk], pk))
+        return client_id, round(min(scores[client_id], 1.0), 2)
+
+
+contact_index = ContactIndex()
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.24 on 2026-10-19 19:01
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("crm", "0002_lead"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="lead",
+            name="match_confidence",
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="lead",
+            name="matched_client",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="matched_leads",
+                to="crm.client",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="client",
+            index=models.Index(
+                fields=["updated_at"], name="crm_client_updated_d51cf2_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.24 on 2026-10-19 19:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("crm", "0003_lead_matched_client"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="NumberSequence",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=64, unique=True)),
+                ("next_value", models.BigIntegerField(default=1)),
+            ],
+            options={
+                "ordering": ["name"],
+            },
+        ),
+        migrations.AlterField(
+            model_name="invoice",
+            name="invoice_number",
+            field=models.CharField(blank=True, max_length=64, unique=True),
+        ),
+        migrations.AlterField(
+            model_name="policy",
+            name="policy_number",
+            field=models.CharField(blank=True, max_length=64, unique=True),
+        ),
+    ]
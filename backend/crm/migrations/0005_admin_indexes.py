@@ -0,0 +1,51 @@
+# Generated by Django 4.2.24 on 2026-10-19 19:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("crm", "0004_number_sequence"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="invoice",
+            name="issue_date",
+            field=models.DateField(db_index=True),
+        ),
+        migrations.AlterField(
+            model_name="policy",
+            name="renewal_date",
+            field=models.DateField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name="renewal",
+            name="renewal_date",
+            field=models.DateField(db_index=True),
+        ),
+        migrations.AddIndex(
+            model_name="client",
+            index=models.Index(
+                fields=["last_name", "first_name"], name="crm_client_last_na_84f0b9_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="document",
+            index=models.Index(
+                fields=["-created_at"], name="crm_documen_created_728af2_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="lead",
+            index=models.Index(
+                fields=["-created_at"], name="crm_lead_created_deedb3_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="policy",
+            index=models.Index(
+                fields=["-created_at"], name="crm_policy_created_953b5d_idx"
+            ),
+        ),
+    ]
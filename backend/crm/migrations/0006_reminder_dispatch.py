@@ -0,0 +1,80 @@
+# Generated by Django 4.2.24 on 2026-10-19 19:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("crm", "0005_admin_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ReminderDispatch",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[("renewal", "Renovación"), ("invoice", "Factura")],
+                        max_length=20,
+                    ),
+                ),
+                ("object_id", models.BigIntegerField()),
+                ("cycle", models.CharField(max_length=32)),
+                ("recipient", models.EmailField(max_length=254)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Pendiente"),
+                            ("sent", "Enviado"),
+                            ("failed", "Fallido"),
+                        ],
+                        default="pending",
+                        max_length=20,
+                    ),
+                ),
+                ("attempts", models.PositiveSmallIntegerField(default=0)),
+                ("sent_at", models.DateTimeField(blank=True, null=True)),
+                ("last_error", models.TextField(blank=True)),
+            ],
+            options={
+                "ordering": ["-created_at"],
+            },
+        ),
+        migrations.AddIndex(
+            model_name="invoice",
+            index=models.Index(
+                fields=["status", "due_date"], name="crm_invoice_status_f00f1a_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="renewal",
+            index=models.Index(
+                fields=["status", "renewal_date"], name="crm_renewal_status_1b989a_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="reminderdispatch",
+            index=models.Index(
+                fields=["status", "id"], name="crm_reminde_status_bc4716_idx"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="reminderdispatch",
+            constraint=models.UniqueConstraint(
+                fields=("kind", "object_id", "cycle"), name="unique_reminder_cycle"
+            ),
+        ),
+    ]
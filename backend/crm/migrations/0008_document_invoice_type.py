@@ -0,0 +1,28 @@
+# Generated by Django 4.2.24 on 2026-10-19 19:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("crm", "0007_task"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="document",
+            name="document_type",
+            field=models.CharField(
+                choices=[
+                    ("license", "Licencia"),
+                    ("id", "Identificación"),
+                    ("policy", "Póliza"),
+                    ("invoice", "Factura"),
+                    ("claim", "Reclamo"),
+                    ("other", "Otro"),
+                ],
+                default="other",
+                max_length=20,
+            ),
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 4.2.24 on 2026-10-19 19:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("crm", "0008_document_invoice_type"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ChangeConsumer",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=100, unique=True)),
+                ("position", models.BigIntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "ordering": ["name"],
+            },
+        ),
+        migrations.CreateModel(
+            name="ChangeEvent",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("model", models.CharField(max_length=50)),
+                ("object_id", models.BigIntegerField()),
+                (
+                    "operation",
+                    models.CharField(
+                        choices=[
+                            ("create", "Creación"),
+                            ("update", "Actualización"),
+                            ("delete", "Eliminación"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                ("fields", models.JSONField(blank=True, default=list)),
+                ("created_at", models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                "ordering": ["id"],
+                "indexes": [
+                    models.Index(
+                        fields=["model", "id"], name="crm_changee_model_c57129_idx"
+                    )
+                ],
+            },
+        ),
+    ]
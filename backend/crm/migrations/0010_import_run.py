@@ -0,0 +1,55 @@
+# Generated by Django 4.2.24 on 2026-10-19 19:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("crm", "0009_change_log"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ImportRun",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("source", models.CharField(max_length=255)),
+                ("fingerprint", models.CharField(max_length=64, unique=True)),
+                ("file_size", models.BigIntegerField(default=0)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("running", "En curso"),
+                            ("completed", "Completada"),
+                            ("failed", "Fallida"),
+                        ],
+                        default="running",
+                        max_length=20,
+                    ),
+                ),
+                ("rows_read", models.BigIntegerField(default=0)),
+                ("byte_offset", models.BigIntegerField(default=0)),
+                ("rows_imported", models.BigIntegerField(default=0)),
+                ("rows_rejected", models.BigIntegerField(default=0)),
+                ("rejects_path", models.CharField(blank=True, max_length=500)),
+                ("rejects_offset", models.BigIntegerField(default=0)),
+                ("stats", models.JSONField(blank=True, default=dict)),
+                ("last_error", models.TextField(blank=True)),
+                ("finished_at", models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                "ordering": ["-created_at"],
+            },
+        ),
+    ]
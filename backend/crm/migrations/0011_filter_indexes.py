@@ -0,0 +1,24 @@
+# Generated by Django 4.2.24 on 2026-10-19 19:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("crm", "0010_import_run"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="lead",
+            index=models.Index(
+                fields=["source", "-created_at"], name="crm_lead_source_3ff666_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="policy",
+            index=models.Index(
+                fields=["status", "renewal_date"], name="crm_policy_status_de38f2_idx"
+            ),
+        ),
+    ]
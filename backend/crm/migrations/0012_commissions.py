@@ -0,0 +1,198 @@
+# Generated by Django 4.2.24 on 2026-10-19 19:27
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("crm", "0011_filter_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CommissionLine",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "basis",
+                    models.CharField(
+                        choices=[
+                            ("written", "Prima emitida"),
+                            ("collected", "Prima cobrada"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("category", models.CharField(max_length=20)),
+                ("policy_status", models.CharField(max_length=20)),
+                ("base_amount", models.DecimalField(decimal_places=2, max_digits=12)),
+                ("rate", models.DecimalField(decimal_places=4, max_digits=5)),
+                ("amount", models.DecimalField(decimal_places=2, max_digits=12)),
+            ],
+            options={
+                "ordering": ["id"],
+            },
+        ),
+        migrations.CreateModel(
+            name="CommissionSchedule",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "category",
+                    models.CharField(
+                        choices=[
+                            ("auto", "Autos"),
+                            ("life", "Vida"),
+                            ("property", "Propiedad"),
+                            ("commercial", "Comerciales"),
+                            ("annuity", "Anualidades"),
+                            ("other", "Otros"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "policy_status",
+                    models.CharField(
+                        blank=True,
+                        choices=[
+                            ("active", "Activa"),
+                            ("pending", "Pendiente"),
+                            ("lapsed", "Vencida"),
+                            ("cancelled", "Cancelada"),
+                            ("expired", "Expirada"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "basis",
+                    models.CharField(
+                        choices=[
+                            ("written", "Prima emitida"),
+                            ("collected", "Prima cobrada"),
+                        ],
+                        default="collected",
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "rate",
+                    models.DecimalField(
+                        decimal_places=4,
+                        help_text="Fracción: 0.1250 = 12.5 %.",
+                        max_digits=5,
+                    ),
+                ),
+                ("effective_from", models.DateField()),
+                ("effective_to", models.DateField(blank=True, null=True)),
+            ],
+            options={
+                "ordering": ["category", "basis", "-effective_from"],
+            },
+        ),
+        migrations.CreateModel(
+            name="CommissionStatement",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("period_start", models.DateField()),
+                ("period_end", models.DateField()),
+                (
+                    "written_premium",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                (
+                    "collected_premium",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                (
+                    "commission_total",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                ("line_count", models.PositiveIntegerField(default=0)),
+                ("unmatched_count", models.PositiveIntegerField(default=0)),
+                ("computed_at", models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                "ordering": ["-period_start"],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="commissionstatement",
+            constraint=models.UniqueConstraint(
+                fields=("period_start", "period_end"), name="unique_commission_period"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="commissionschedule",
+            constraint=models.UniqueConstraint(
+                fields=("category", "policy_status", "basis", "effective_from"),
+                name="unique_commission_schedule",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="commissionschedule",
+            constraint=models.CheckConstraint(
+                check=models.Q(("rate__gte", 0), ("rate__lte", 1)),
+                name="commission_rate_range",
+            ),
+        ),
+        migrations.AddField(
+            model_name="commissionline",
+            name="policy",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="commission_lines",
+                to="crm.policy",
+            ),
+        ),
+        migrations.AddField(
+            model_name="commissionline",
+            name="schedule",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="lines",
+                to="crm.commissionschedule",
+            ),
+        ),
+        migrations.AddField(
+            model_name="commissionline",
+            name="statement",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="lines",
+                to="crm.commissionstatement",
+            ),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.24 on 2026-10-19 19:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("crm", "0012_commissions"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="invoice",
+            name="installment_number",
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="policy",
+            name="payment_plan",
+            field=models.CharField(
+                blank=True,
+                choices=[
+                    ("", "Sin calendario"),
+                    ("annual", "Anual"),
+                    ("semiannual", "Semestral"),
+                    ("quarterly", "Trimestral"),
+                    ("monthly", "Mensual"),
+                ],
+                default="",
+                max_length=20,
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="invoice",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("installment_number__isnull", False)),
+                fields=("policy", "installment_number"),
+                name="unique_policy_installment",
+            ),
+        ),
+    ]
@@ -0,0 +1,97 @@
+# Generated by Django 4.2.24 on 2026-10-19 19:36
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("crm", "0013_installments"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Territory",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("key", models.CharField(max_length=255, unique=True)),
+                ("country", models.CharField(max_length=100)),
+                ("state", models.CharField(blank=True, max_length=100)),
+                ("municipality", models.CharField(blank=True, max_length=100)),
+            ],
+            options={
+                "ordering": ["country", "state", "municipality"],
+            },
+        ),
+        migrations.AddField(
+            model_name="client",
+            name="territory",
+            field=models.ForeignKey(
+                blank=True,
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="clients",
+                to="crm.territory",
+            ),
+        ),
+        migrations.CreateModel(
+            name="TerritoryRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("category", models.CharField(blank=True, max_length=20)),
+                ("client_count", models.PositiveIntegerField(default=0)),
+                ("active_policies", models.PositiveIntegerField(default=0)),
+                (
+                    "premium",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                (
+                    "refreshed_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                (
+                    "territory",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="rollups",
+                        to="crm.territory",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["territory", "category"],
+                "indexes": [
+                    models.Index(
+                        fields=["category", "-premium"],
+                        name="crm_territo_categor_d1213e_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="territoryrollup",
+            constraint=models.UniqueConstraint(
+                fields=("territory", "category"), name="unique_territory_rollup"
+            ),
+        ),
+    ]
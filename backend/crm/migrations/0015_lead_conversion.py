@@ -0,0 +1,76 @@
+# Generated by Django 4.2.24 on 2026-10-19 19:37
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("crm", "0014_territories"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LeadCohort",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("week", models.DateField()),
+                ("source", models.CharField(max_length=100)),
+                ("insurance_type", models.CharField(max_length=40)),
+                ("leads", models.PositiveIntegerField(default=0)),
+                ("converted", models.PositiveIntegerField(default=0)),
+                ("with_policy", models.PositiveIntegerField(default=0)),
+                ("convert_seconds", models.BigIntegerField(default=0)),
+                ("time_to_convert", models.JSONField(blank=True, default=dict)),
+                (
+                    "refreshed_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+            ],
+            options={
+                "ordering": ["-week", "source", "insurance_type"],
+            },
+        ),
+        migrations.AddField(
+            model_name="lead",
+            name="converted_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="lead",
+            name="converted_client",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="converted_leads",
+                to="crm.client",
+            ),
+        ),
+        migrations.AddField(
+            model_name="lead",
+            name="converted_policy",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="converted_leads",
+                to="crm.policy",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="leadcohort",
+            constraint=models.UniqueConstraint(
+                fields=("week", "source", "insurance_type"), name="unique_lead_cohort"
+            ),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.24 on 2026-10-19 19:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("crm", "0015_lead_conversion"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="lead",
+            name="submission_id",
+            field=models.UUIDField(blank=True, editable=False, null=True, unique=True),
+        ),
+    ]
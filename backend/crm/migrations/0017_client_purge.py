@@ -0,0 +1,17 @@
+# Generated by Django 4.2.24 on 2026-10-19 19:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("crm", "0016_lead_submission_id"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="client",
+            name="purge_requested_at",
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
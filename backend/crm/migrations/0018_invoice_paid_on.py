@@ -0,0 +1,25 @@
+# Generated by Django 4.2.24 on 2026-10-19 19:47
+
+from django.db import migrations, models
+from django.db.models.functions import TruncDate
+
+
+def backfill_paid_on(apps, schema_editor):
+    # Best available payment date for invoices paid before the field existed.
+    Invoice = apps.get_model("crm", "Invoice")
+    Invoice.objects.filter(status="paid").update(paid_on=TruncDate("updated_at"))
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("crm", "0017_client_purge"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="invoice",
+            name="paid_on",
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_paid_on, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.24 on 2026-10-19 20:00
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("crm", "0018_invoice_paid_on"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="changeevent",
+            name="context",
+            field=models.JSONField(
+                blank=True,
+                encoder=django.core.serializers.json.DjangoJSONEncoder,
+                null=True,
+            ),
+        ),
+    ]
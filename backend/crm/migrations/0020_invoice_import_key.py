@@ -0,0 +1,20 @@
+# Generated by Django 4.2.24 on 2026-10-19 20:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("crm", "0019_changeevent_context"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="invoice",
+            name="import_key",
+            field=models.CharField(
+                blank=True, editable=False, max_length=64, null=True, unique=True
+            ),
+        ),
+    ]
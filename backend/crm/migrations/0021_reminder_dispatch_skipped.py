@@ -0,0 +1,27 @@
+# Generated by Django 4.2.24 on 2026-10-19 20:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("crm", "0020_invoice_import_key"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="reminderdispatch",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("pending", "Pendiente"),
+                    ("sent", "Enviado"),
+                    ("failed", "Fallido"),
+                    ("skipped", "Omitido"),
+                ],
+                default="pending",
+                max_length=20,
+            ),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.24 on 2026-10-19 20:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("crm", "0021_reminder_dispatch_skipped"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="document",
+            name="generated_key",
+            field=models.CharField(
+                blank=True, editable=False, max_length=64, null=True, unique=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="document",
+            name="generated_version",
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+    ]
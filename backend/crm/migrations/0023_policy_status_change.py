@@ -0,0 +1,84 @@
+# Generated by Django 4.2.24 on 2026-10-19 20:28
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def seed_status_history(apps, schema_editor):
+    # The current status is the only one known, from the day each policy was created.
+    Policy = apps.get_model("crm", "Policy")
+    PolicyStatusChange = apps.get_model("crm", "PolicyStatusChange")
+    batch = []
+    for pk, status, created_at in Policy.objects.values_list(
+        "pk", "status", "created_at"
+    ).iterator(chunk_size=2000):
+        batch.append(
+            PolicyStatusChange(policy_id=pk, status=status, changed_on=created_at.date())
+        )
+        if len(batch) >= 2000:
+            PolicyStatusChange.objects.bulk_create(batch)
+            batch = []
+    PolicyStatusChange.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("crm", "0022_document_generated_key"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PolicyStatusChange",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("active", "Activa"),
+                            ("pending", "Pendiente"),
+                            ("lapsed", "Vencida"),
+                            ("cancelled", "Cancelada"),
+                            ("expired", "Expirada"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("changed_on", models.DateField()),
+            ],
+            options={
+                "ordering": ["policy", "changed_on"],
+            },
+        ),
+        migrations.AddIndex(
+            model_name="invoice",
+            index=models.Index(
+                fields=["status", "paid_on"], name="crm_invoice_status_d3ad58_idx"
+            ),
+        ),
+        migrations.AddField(
+            model_name="policystatuschange",
+            name="policy",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="status_changes",
+                to="crm.policy",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="policystatuschange",
+            constraint=models.UniqueConstraint(
+                fields=("policy", "changed_on"), name="unique_policy_status_day"
+            ),
+        ),
+        migrations.RunPython(seed_status_history, migrations.RunPython.noop),
+    ]
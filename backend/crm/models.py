@@ -1,4 +1,164 @@
-from django.db import models
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
+from django.utils import timezone
+
+
+class ChangeTrackingQuerySet(models.QuerySet):
+    """Records bulk writes in the change log, which ``save()`` signals miss.
+
+    ``update()`` walks the matching ids in pk order, ``update_chunk_size`` at a
+    time, updating and logging each chunk in one transaction; the ids of a
+    large update are never all in memory at once.
+    """
+
+    update_chunk_size = 5000
+
+    def update(self, **kwargs):
+        from .changes import TRACKED_MODELS
+
+        if self.model._meta.label_lower not in TRACKED_MODELS:
+            return super().update(**kwargs)
+        rows = 0
+        pks = self.order_by("pk").values_list("pk", flat=True)
+        with transaction.atomic(using=self.db, savepoint=False):
+            # Rows after the last chunk are not updated yet, so they still match.
+            while ids := list(pks[: self.update_chunk_size]):
+                rows += (
+                    models.QuerySet(self.model, using=self.db)
+                    .filter(pk__in=ids)
+                    .update(**kwargs)
+                )
+                self._updated(ids, list(kwargs))
+                pks = pks.filter(pk__gt=ids[-1])
+        return rows
+
+    def _updated(self, ids, fields):
+        """Called for each chunk of ids ``update()`` wrote, inside its transaction."""
+
+        from .changes import record_changes
+
+        record_changes(self.model, ids, "update", fields, using=self.db)
+
+    def bulk_update(self, objs, fields, batch_size=None):
+        from .changes import record_changes
+
+        objs = list(objs)
+        rows = super().bulk_update(objs, fields, batch_size=batch_size)
+        ids = [obj.pk for obj in objs]
+        record_changes(self.model, ids, "update", list(fields), using=self.db)
+        return rows
+
+    def bulk_create(self, objs, *args, **kwargs):
+        from .changes import record_changes
+
+        created = super().bulk_create(objs, *args, **kwargs)
+        ids = [obj.pk for obj in created if obj.pk is not None]
+        record_changes(self.model, ids, "create", using=self.db)
+        return created
+
+
+ChangeTrackingManager = models.Manager.from_queryset(ChangeTrackingQuerySet)
+
+
+class RenewalCalendarQuerySet(ChangeTrackingQuerySet):
+    """Also invalidates the cached renewal calendar for bulk writes.
+
+    ``save()``/``delete()`` invalidate it through signals; bulk writes do it
+    here, for the renewal dates of the rows before and after the write.
+    """
+
+    def update(self, **kwargs):
+        from .renewal_calendar import CALENDAR_FIELDS, invalidate_on_commit
+
+        if CALENDAR_FIELDS.isdisjoint(kwargs):
+            return super().update(**kwargs)
+        before = dict(self.values_list("pk", "renewal_date"))
+        rows = super().update(**kwargs)
+        dates = set(before.values())
+        if "renewal_date" in kwargs:
+            dates.update(
+                self.model._base_manager.filter(pk__in=before).values_list(
+                    "renewal_date", flat=True
+                )
+            )
+        invalidate_on_commit(dates, using=self.db)
+        return rows
+
+    def bulk_update(self, objs, fields, batch_size=None):
+        from .renewal_calendar import CALENDAR_FIELDS, invalidate_on_commit
+
+        objs = list(objs)
+        if CALENDAR_FIELDS.isdisjoint(fields):
+            return super().bulk_update(objs, fields, batch_size=batch_size)
+        dates = set(
+            self.model._base_manager.filter(pk__in=[obj.pk for obj in objs]).values_list(
+                "renewal_date", flat=True
+            )
+        )
+        rows = super().bulk_update(objs, fields, batch_size=batch_size)
+        dates.update(obj.renewal_date for obj in objs)
+        invalidate_on_commit(dates, using=self.db)
+        return rows
+
+    def bulk_create(self, objs, *args, **kwargs):
+        from .renewal_calendar import invalidate_on_commit
+
+        created = super().bulk_create(objs, *args, **kwargs)
+        invalidate_on_commit({obj.renewal_date for obj in created}, using=self.db)
+        return created
+
+
+RenewalCalendarManager = models.Manager.from_queryset(RenewalCalendarQuerySet)
+
+
+def record_policy_statuses(rows, using="default") -> None:
+    """Store today's status of each ``(policy_id, status)``; the last one of a day wins."""
+
+    today = timezone.localdate()
+    PolicyStatusChange.objects.using(using).bulk_create(
+        [
+            PolicyStatusChange(policy_id=pk, status=status, changed_on=today)
+            for pk, status in rows
+        ],
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=["policy", "changed_on"],
+        update_fields=["status"],
+    )
+
+
+class PolicyQuerySet(RenewalCalendarQuerySet):
+    """Also keeps ``PolicyStatusChange`` in step with bulk writes of ``status``.
+
+    ``save()`` records status changes through signals.
+    """
+
+    def _updated(self, ids, fields):
+        super()._updated(ids, fields)
+        if "status" in fields:
+            record_policy_statuses(
+                models.QuerySet(self.model, using=self.db)
+                .filter(pk__in=ids)
+                .values_list("pk", "status"),
+                using=self.db,
+            )
+
+    def bulk_update(self, objs, fields, batch_size=None):
+        objs = list(objs)
+        rows = super().bulk_update(objs, fields, batch_size=batch_size)
+        if "status" in fields:
+            record_policy_statuses([(obj.pk, obj.status) for obj in objs], self.db)
+        return rows
+
+    def bulk_create(self, objs, *args, **kwargs):
+        created = super().bulk_create(objs, *args, **kwargs)
+        record_policy_statuses(
+            [(obj.pk, obj.status) for obj in created if obj.pk is not None], self.db
+        )
+        return created
+
+
+PolicyManager = models.Manager.from_queryset(PolicyQuerySet)
 
 
 class TimeStampedModel(models.Model):
@@ -11,6 +171,35 @@ class TimeStampedModel(models.Model):
         abstract = True
 
 
+class NumberSequence(models.Model):
+    """Counter backing generated policy and invoice numbers."""
+
+    name = models.CharField(max_length=64, unique=True)
+    next_value = models.BigIntegerField(default=1)
+
+    class Meta:
+        ordering = ["name"]
+
+    def __str__(self) -> str:
+        return f"{self.name} (next {self.next_value})"
+
+
+class Territory(TimeStampedModel):
+    """Normalized municipality (``country``/``state``/``municipality``) of clients."""
+
+    key = models.CharField(max_length=255, unique=True)
+    country = models.CharField(max_length=100)
+    state = models.CharField(max_length=100, blank=True)
+    municipality = models.CharField(max_length=100, blank=True)
+
+    class Meta:
+        ordering = ["country", "state", "municipality"]
+
+    def __str__(self) -> str:
+        place = self.municipality or "Sin municipio"
+        return f"{place}, {self.state or self.country}"
+
+
 class Client(TimeStampedModel):
     first_name = models.CharField(max_length=100)
     last_name = models.CharField(max_length=100)
@@ -24,10 +213,26 @@ class Client(TimeStampedModel):
     state = models.CharField(max_length=100, blank=True)
     postal_code = models.CharField(max_length=20, blank=True)
     country = models.CharField(max_length=100, blank=True)
+    territory = models.ForeignKey(
+        Territory,
+        related_name="clients",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+    )
     notes = models.TextField(blank=True)
+    # Set when the client was deleted through the API; crm.purge removes it in chunks.
+    purge_requested_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    objects = ChangeTrackingManager()
 
     class Meta:
         ordering = ["last_name", "first_name"]
+        indexes = [
+            models.Index(fields=["last_name", "first_name"]),
+            models.Index(fields=["updated_at"]),
+        ]
 
     def __str__(self) -> str:
         return f"{self.first_name} {self.last_name}".strip()
@@ -68,7 +273,14 @@ class Policy(TimeStampedModel):
         CANCELLED = "cancelled", "Cancelada"
         EXPIRED = "expired", "Expirada"
 
-    policy_number = models.CharField(max_length=64, unique=True)
+    class PaymentPlan(models.TextChoices):
+        NONE = "", "Sin calendario"
+        ANNUAL = "annual", "Anual"
+        SEMIANNUAL = "semiannual", "Semestral"
+        QUARTERLY = "quarterly", "Trimestral"
+        MONTHLY = "monthly", "Mensual"
+
+    policy_number = models.CharField(max_length=64, unique=True, blank=True)
     client = models.ForeignKey(Client, related_name="policies", on_delete=models.CASCADE)
     product = models.ForeignKey(
         InsuranceProduct, related_name="policies", on_delete=models.PROTECT
@@ -78,16 +290,32 @@ class Policy(TimeStampedModel):
     )
     start_date = models.DateField(null=True, blank=True)
     end_date = models.DateField(null=True, blank=True)
-    renewal_date = models.DateField(null=True, blank=True)
+    renewal_date = models.DateField(null=True, blank=True, db_index=True)
     premium_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    payment_plan = models.CharField(
+        max_length=20, choices=PaymentPlan.choices, default=PaymentPlan.NONE, blank=True
+    )
     coverage_summary = models.TextField(blank=True)
 
+    objects = PolicyManager()
+
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["-created_at"]),
+            models.Index(fields=["status", "renewal_date"]),
+        ]
 
     def __str__(self) -> str:
         return f"{self.policy_number} - {self.client}"
 
+    def save(self, *args, **kwargs):
+        if not self.policy_number:
+            from .numbering import next_number
+
+            self.policy_number = next_number("policy")
+        super().save(*args, **kwargs)
+
 
 class Renewal(TimeStampedModel):
     class RenewalStatus(models.TextChoices):
@@ -98,14 +326,17 @@ class Renewal(TimeStampedModel):
         CANCELLED = "cancelled", "Cancelada"
 
     policy = models.ForeignKey(Policy, related_name="renewals", on_delete=models.CASCADE)
-    renewal_date = models.DateField()
+    renewal_date = models.DateField(db_index=True)
     status = models.CharField(
         max_length=20, choices=RenewalStatus.choices, default=RenewalStatus.DRAFT
     )
     notes = models.TextField(blank=True)
 
+    objects = RenewalCalendarManager()
+
     class Meta:
         ordering = ["-renewal_date"]
+        indexes = [models.Index(fields=["status", "renewal_date"])]
 
     def __str__(self) -> str:
         return f"Renewal for {self.policy.policy_number} on {self.renewal_date}"
@@ -120,8 +351,9 @@ class Invoice(TimeStampedModel):
         CANCELLED = "cancelled", "Cancelada"
 
     policy = models.ForeignKey(Policy, related_name="invoices", on_delete=models.CASCADE)
-    invoice_number = models.CharField(max_length=64, unique=True)
-    issue_date = models.DateField()
+    invoice_number = models.CharField(max_length=64, unique=True, blank=True)
+    installment_number = models.PositiveSmallIntegerField(null=True, blank=True)
+    issue_date = models.DateField(db_index=True)
     due_date = models.DateField(null=True, blank=True)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     currency = models.CharField(max_length=10, default="USD")
@@ -130,19 +362,53 @@ class Invoice(TimeStampedModel):
         max_length=20, choices=InvoiceStatus.choices, default=InvoiceStatus.DRAFT
     )
     description = models.TextField(blank=True)
+    # Filled when the invoice is saved as paid (crm.ledger uses it as the payment date).
+    paid_on = models.DateField(null=True, blank=True)
+    # Bordereau rows without an invoice number (crm.bordereau.invoice_import_key).
+    import_key = models.CharField(
+        max_length=64, unique=True, null=True, blank=True, editable=False
+    )
+
+    objects = ChangeTrackingManager()
 
     class Meta:
         ordering = ["-issue_date"]
+        indexes = [
+            models.Index(fields=["status", "due_date"]),
+            models.Index(fields=["status", "paid_on"]),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["policy", "installment_number"],
+                condition=models.Q(installment_number__isnull=False),
+                name="unique_policy_installment",
+            )
+        ]
 
     def __str__(self) -> str:
         return f"Invoice {self.invoice_number} ({self.status})"
 
+    def save(self, *args, **kwargs):
+        if not self.invoice_number:
+            from .numbering import next_number
+
+            self.invoice_number = next_number("invoice")
+        if self.status != self.InvoiceStatus.PAID:
+            self.paid_on = None
+        elif not self.paid_on:
+            self.paid_on = timezone.localdate()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "status" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "paid_on"}
+        super().save(*args, **kwargs)
+
 
 class Document(TimeStampedModel):
     class DocumentType(models.TextChoices):
         LICENSE = "license", "Licencia"
         ID = "id", "Identificación"
         POLICY = "policy", "Póliza"
+        INVOICE = "invoice", "Factura"
         CLAIM = "claim", "Reclamo"
         OTHER = "other", "Otro"
 
@@ -161,9 +427,16 @@ class Document(TimeStampedModel):
     description = models.TextField(blank=True)
     file = models.FileField(upload_to="documents/")
     is_shared_with_client = models.BooleanField(default=False)
+    # "<kind>:<object id>" of PDFs from crm.document_generation, and the hash of
+    # the template and data they were rendered from.
+    generated_key = models.CharField(
+        max_length=64, unique=True, null=True, blank=True, editable=False
+    )
+    generated_version = models.CharField(max_length=64, blank=True, editable=False)
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [models.Index(fields=["-created_at"])]
 
     def __str__(self) -> str:
         return self.title
@@ -187,9 +460,349 @@ class Lead(TimeStampedModel):
     notes = models.TextField(blank=True)
     attachment = models.FileField(upload_to="leads/", blank=True, null=True)
     source = models.CharField(max_length=100, default="web_form")
+    matched_client = models.ForeignKey(
+        Client,
+        related_name="matched_leads",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+    )
+    match_confidence = models.FloatField(null=True, blank=True)
+    converted_client = models.ForeignKey(
+        Client,
+        related_name="converted_leads",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+    )
+    converted_policy = models.ForeignKey(
+        Policy,
+        related_name="converted_leads",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+    )
+    converted_at = models.DateTimeField(null=True, blank=True)
+    # Set by the write-behind buffer (crm.lead_buffer) so replays insert once.
+    submission_id = models.UUIDField(null=True, blank=True, unique=True, editable=False)
+
+    objects = ChangeTrackingManager()
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["-created_at"]),
+            models.Index(fields=["source", "-created_at"]),
+        ]
 
     def __str__(self) -> str:
         return f"{self.name} ({self.insurance_type})"
+
+
+class ReminderDispatch(TimeStampedModel):
+    """One reminder for one renewal or invoice cycle, used to make sends idempotent."""
+
+    class Kind(models.TextChoices):
+        RENEWAL = "renewal", "Renovación"
+        INVOICE = "invoice", "Factura"
+
+    class DispatchStatus(models.TextChoices):
+        PENDING = "pending", "Pendiente"
+        SENT = "sent", "Enviado"
+        FAILED = "failed", "Fallido"
+        SKIPPED = "skipped", "Omitido"
+
+    kind = models.CharField(max_length=20, choices=Kind.choices)
+    object_id = models.BigIntegerField()
+    cycle = models.CharField(max_length=32)
+    recipient = models.EmailField()
+    status = models.CharField(
+        max_length=20, choices=DispatchStatus.choices, default=DispatchStatus.PENDING
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["kind", "object_id", "cycle"], name="unique_reminder_cycle"
+            )
+        ]
+        indexes = [models.Index(fields=["status", "id"])]
+
+    def __str__(self) -> str:
+        return f"{self.kind} {self.object_id} ({self.cycle})"
+
+
+class Task(TimeStampedModel):
+    """Background job stored in the database and run by ``manage.py run_crm_worker``."""
+
+    class TaskStatus(models.TextChoices):
+        QUEUED = "queued", "En cola"
+        RUNNING = "running", "En ejecución"
+        SUCCEEDED = "succeeded", "Completada"
+        FAILED = "failed", "Fallida"
+
+    queue = models.CharField(max_length=50, default="default")
+    name = models.CharField(max_length=200)
+    args = models.JSONField(default=list, blank=True)
+    kwargs = models.JSONField(default=dict, blank=True)
+    priority = models.SmallIntegerField(default=0)
+    status = models.CharField(
+        max_length=20, choices=TaskStatus.choices, default=TaskStatus.QUEUED
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["queue", "status", "-priority", "run_at"]),
+            models.Index(fields=["status", "locked_at"]),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.name} [{self.queue}] ({self.status})"
+
+
+class ChangeEvent(models.Model):
+    """Append-only log of writes to the tracked crm models (see ``crm.changes``)."""
+
+    class Operation(models.TextChoices):
+        CREATE = "create", "Creación"
+        UPDATE = "update", "Actualización"
+        DELETE = "delete", "Eliminación"
+
+    model = models.CharField(max_length=50)
+    object_id = models.BigIntegerField()
+    operation = models.CharField(max_length=10, choices=Operation.choices)
+    fields = models.JSONField(default=list, blank=True)
+    # Deletions only: the columns consumers group by (``DELETE_CONTEXT``).
+    context = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ["id"]
+        indexes = [models.Index(fields=["model", "id"])]
+
+    def __str__(self) -> str:
+        return f"{self.operation} {self.model}:{self.object_id}"
+
+
+class ChangeConsumer(models.Model):
+    """Last change log id processed by one consumer of ``ChangeEvent``."""
+
+    name = models.CharField(max_length=100, unique=True)
+    position = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["name"]
+
+    def __str__(self) -> str:
+        return f"{self.name} @ {self.position}"
+
+
+class ImportRun(TimeStampedModel):
+    """Checkpoint of one bordereau import, saved with every committed chunk."""
+
+    class RunStatus(models.TextChoices):
+        RUNNING = "running", "En curso"
+        COMPLETED = "completed", "Completada"
+        FAILED = "failed", "Fallida"
+
+    source = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64, unique=True)
+    file_size = models.BigIntegerField(default=0)
+    status = models.CharField(
+        max_length=20, choices=RunStatus.choices, default=RunStatus.RUNNING
+    )
+    rows_read = models.BigIntegerField(default=0)
+    byte_offset = models.BigIntegerField(default=0)
+    rows_imported = models.BigIntegerField(default=0)
+    rows_rejected = models.BigIntegerField(default=0)
+    rejects_path = models.CharField(max_length=500, blank=True)
+    rejects_offset = models.BigIntegerField(default=0)
+    stats = models.JSONField(default=dict, blank=True)
+    last_error = models.TextField(blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+
+    def __str__(self) -> str:
+        return f"{self.source} ({self.status}, {self.rows_read} rows)"
+
+
+class PolicyStatusChange(models.Model):
+    """Status a policy had from ``changed_on`` on (see ``crm.commissions``)."""
+
+    policy = models.ForeignKey(
+        Policy, related_name="status_changes", on_delete=models.CASCADE
+    )
+    status = models.CharField(max_length=20, choices=Policy.PolicyStatus.choices)
+    changed_on = models.DateField()
+
+    class Meta:
+        ordering = ["policy", "changed_on"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["policy", "changed_on"], name="unique_policy_status_day"
+            )
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.policy_id} {self.status} ({self.changed_on})"
+
+
+class CommissionSchedule(TimeStampedModel):
+    """Commission rate for a product category from ``effective_from`` on.
+
+    A schedule with a ``policy_status`` wins over the category-wide one (blank
+    status) for policies in that status.
+    """
+
+    class Basis(models.TextChoices):
+        WRITTEN = "written", "Prima emitida"
+        COLLECTED = "collected", "Prima cobrada"
+
+    category = models.CharField(
+        max_length=20, choices=InsuranceProduct.ProductCategory.choices
+    )
+    policy_status = models.CharField(
+        max_length=20, choices=Policy.PolicyStatus.choices, blank=True
+    )
+    basis = models.CharField(
+        max_length=20, choices=Basis.choices, default=Basis.COLLECTED
+    )
+    rate = models.DecimalField(
+        max_digits=5, decimal_places=4, help_text="Fracción: 0.1250 = 12.5 %."
+    )
+    effective_from = models.DateField()
+    effective_to = models.DateField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["category", "basis", "-effective_from"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["category", "policy_status", "basis", "effective_from"],
+                name="unique_commission_schedule",
+            ),
+            models.CheckConstraint(
+                check=models.Q(rate__gte=0, rate__lte=1), name="commission_rate_range"
+            ),
+        ]
+
+    def __str__(self) -> str:
+        status = f"/{self.policy_status}" if self.policy_status else ""
+        return f"{self.category}{status} {self.basis} {self.rate} ({self.effective_from})"
+
+
+class CommissionStatement(TimeStampedModel):
+    period_start = models.DateField()
+    period_end = models.DateField()
+    written_premium = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    collected_premium = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    commission_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    line_count = models.PositiveIntegerField(default=0)
+    unmatched_count = models.PositiveIntegerField(default=0)
+    computed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-period_start"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["period_start", "period_end"], name="unique_commission_period"
+            )
+        ]
+
+    def __str__(self) -> str:
+        return f"Commissions {self.period_start} – {self.period_end}"
+
+
+class CommissionLine(models.Model):
+    statement = models.ForeignKey(
+        CommissionStatement, related_name="lines", on_delete=models.CASCADE
+    )
+    policy = models.ForeignKey(
+        Policy, related_name="commission_lines", on_delete=models.CASCADE
+    )
+    schedule = models.ForeignKey(
+        CommissionSchedule,
+        related_name="lines",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+    )
+    basis = models.CharField(max_length=20, choices=CommissionSchedule.Basis.choices)
+    category = models.CharField(max_length=20)
+    policy_status = models.CharField(max_length=20)
+    base_amount = models.DecimalField(max_digits=12, decimal_places=2)
+    rate = models.DecimalField(max_digits=5, decimal_places=4)
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+
+    class Meta:
+        ordering = ["id"]
+
+    def __str__(self) -> str:
+        return f"{self.policy_id} {self.basis} {self.amount}"
+
+
+class TerritoryRollup(models.Model):
+    """Book of business per territory and product category (``""`` = all)."""
+
+    territory = models.ForeignKey(
+        Territory, related_name="rollups", on_delete=models.CASCADE
+    )
+    category = models.CharField(max_length=20, blank=True)
+    client_count = models.PositiveIntegerField(default=0)
+    active_policies = models.PositiveIntegerField(default=0)
+    premium = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    refreshed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ["territory", "category"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["territory", "category"], name="unique_territory_rollup"
+            )
+        ]
+        indexes = [models.Index(fields=["category", "-premium"])]
+
+    def __str__(self) -> str:
+        return f"{self.territory} {self.category or 'all'}: {self.premium}"
+
+
+class LeadCohort(models.Model):
+    """Leads of one week, source and insurance type, with their conversions.
+
+    ``time_to_convert`` counts converted leads per bucket of
+    ``crm.analytics.TIME_TO_CONVERT_BUCKETS`` (days from lead to conversion).
+    """
+
+    week = models.DateField()
+    source = models.CharField(max_length=100)
+    insurance_type = models.CharField(max_length=40)
+    leads = models.PositiveIntegerField(default=0)
+    converted = models.PositiveIntegerField(default=0)
+    with_policy = models.PositiveIntegerField(default=0)
+    convert_seconds = models.BigIntegerField(default=0)
+    time_to_convert = models.JSONField(default=dict, blank=True)
+    refreshed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ["-week", "source", "insurance_type"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["week", "source", "insurance_type"], name="unique_lead_cohort"
+            )
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.week} {self.source}/{self.insurance_type}: {self.leads}"
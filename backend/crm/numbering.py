@@ -0,0 +1,136 @@
+"""Generated policy and invoice numbers.
+
+Numbers come from ``NumberSequence`` rows. Each process reserves a whole block
+of values in one short transaction and hands them out from memory, so bulk
+invoicing costs one database round trip per block instead of one per number.
+Values left in a block when a process exits are skipped, which leaves gaps but
+never duplicates.
+
+A reservation never waits for the caller's transaction: on PostgreSQL, a
+caller inside ``atomic()`` (bulk invoicing, bordereau chunks) reserves on a
+connection of its own that commits at once, so the sequence row is locked
+for one statement rather than for the whole batch. SQLite allows a single
+writer per database, so there the reservation joins the open transaction;
+as it could still be rolled back, only the numbers requested are reserved.
+"""
+import threading
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import NumberSequence
+
+DEFAULT_FORMATS = {
+    "policy": {"prefix": "POL", "width": 6, "yearly": True, "block_size": 50},
+    "invoice": {"prefix": "INV", "width": 7, "yearly": True, "block_size": 500},
+}
+
+
+def get_format(kind: str) -> dict:
+    formats = getattr(settings, "CRM_NUMBER_FORMATS", {})
+    if kind not in DEFAULT_FORMATS and kind not in formats:
+        raise KeyError(f"Unknown number format: {kind}")
+    return {**DEFAULT_FORMATS.get(kind, {}), **formats.get(kind, {})}
+
+
+_local = threading.local()
+
+
+def reserves_separately() -> bool:
+    """Whether a reservation made now commits independently of the caller."""
+
+    return not connection.in_atomic_block or connection.vendor == "postgresql"
+
+
+def _sequence_connection():
+    """This thread's autocommit connection used for reservations only."""
+
+    side = getattr(_local, "connection", None)
+    if side is None:
+        side = _local.connection = connections.create_connection(DEFAULT_DB_ALIAS)
+    side.close_if_unusable_or_obsolete()
+    return side
+
+
+def _reserve_separately(name: str, size: int) -> range:
+    side = _sequence_connection()
+    table = side.ops.quote_name(NumberSequence._meta.db_table)
+    with side.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} (name, next_value) VALUES (%s, 1) "
+            "ON CONFLICT (name) DO NOTHING",
+            [name],
+        )
+        cursor.execute(
+            f"UPDATE {table} SET next_value = next_value + %s WHERE name = %s "
+            "RETURNING next_value",
+            [size, name],
+        )
+        end = cursor.fetchone()[0]
+    return range(end - size, end)
+
+
+def reserve_block(name: str, size: int) -> range:
+    """Reserve ``size`` consecutive values of sequence ``name``."""
+
+    if connection.in_atomic_block and reserves_separately():
+        return _reserve_separately(name, size)
+    with transaction.atomic():
+        sequence, _ = NumberSequence.objects.select_for_update().get_or_create(name=name)
+        NumberSequence.objects.filter(pk=sequence.pk).update(
+            next_value=F("next_value") + size
+        )
+    return range(sequence.next_value, sequence.next_value + size)
+
+
+class NumberAllocator:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._blocks: dict = {}
+
+    def allocate(self, kind: str, count: int = 1, on_date=None) -> list:
+        """Return ``count`` formatted numbers for ``kind`` (``policy``, ``invoice``)."""
+
+        number_format = get_format(kind)
+        year = (on_date or timezone.localdate()).year
+        name = f"{kind}-{year}" if number_format.get("yearly") else kind
+        block_size = number_format.get("block_size", 100)
+
+        values = []
+        with self._lock:
+            block = self._blocks.get(name, range(0))
+            while len(values) < count:
+                if not block:
+                    missing = count - len(values)
+                    if not reserves_separately():
+                        size = missing
+                    else:
+                        size = max(block_size, -(-missing // block_size) * block_size)
+                    block = reserve_block(name, size)
+                take = min(count - len(values), len(block))
+                values.extend(block[:take])
+                block = block[take:]
+            self._blocks[name] = block
+        return [self.format(number_format, year, value) for value in values]
+
+    @staticmethod
+    def format(number_format: dict, year: int, value: int) -> str:
+        separator = number_format.get("separator", "-")
+        parts = [number_format.get("prefix", "")]
+        if number_format.get("yearly"):
+            parts.append(str(year))
+        parts.append(str(value).zfill(number_format.get("width", 6)))
+        return separator.join(part for part in parts if part)
+
+
+allocator = NumberAllocator()
+
+
+def next_number(kind: str, on_date=None) -> str:
+    return allocator.allocate(kind, 1, on_date=on_date)[0]
+
+
+def allocate_numbers(kind: str, count: int, on_date=None) -> list:
+    return allocator.allocate(kind, count, on_date=on_date)
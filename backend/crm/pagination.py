@@ -0,0 +1,36 @@
+"""Limit/offset pagination whose ``count`` may come from the planner estimate."""
+from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.response import Response
+
+from .counts import estimated_count
+
+
+class EstimatedCountPagination(LimitOffsetPagination):
+    """``?limit=&offset=`` pages; without ``limit`` the full list is returned.
+
+    Large filtered results get the estimated count from ``estimated_count()``
+    and ``count_is_estimate: true`` instead of an exact ``COUNT(*)``.
+    """
+
+    max_limit = 500
+    count_is_estimate = False
+
+    def get_count(self, queryset):
+        count, self.count_is_estimate = estimated_count(queryset)
+        return count
+
+    def get_paginated_response(self, data):
+        return Response(
+            {
+                "count": self.count,
+                "count_is_estimate": self.count_is_estimate,
+                "next": self.get_next_link(),
+                "previous": self.get_previous_link(),
+                "results": data,
+            }
+        )
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema["properties"]["count_is_estimate"] = {"type": "boolean"}
+        return response_schema
@@ -0,0 +1,84 @@
+"""Minimal text-only PDF writer used for invoices and policy declarations."""
+import textwrap
+import zlib
+
+PAGE_WIDTH = 612
+PAGE_HEIGHT = 792
+MARGIN = 54
+FONT_SIZE = 10
+LEADING = 14
+LINE_WIDTH = 95
+LINES_PER_PAGE = int((PAGE_HEIGHT - 2 * MARGIN) / LEADING)
+
+
+def _escape(text: str) -> bytes:
+    encoded = text.encode("cp1252", errors="replace")
+    return encoded.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+
+
+def _wrap(text: str) -> list:
+    lines = []
+    for line in text.splitlines():
+        lines.extend(textwrap.wrap(line, LINE_WIDTH) or [""])
+    return lines
+
+
+def _page_stream(lines) -> bytes:
+    parts = [
+        b"BT",
+        b"/F1 %d Tf" % FONT_SIZE,
+        b"%d TL" % LEADING,
+        b"%d %d Td" % (MARGIN, PAGE_HEIGHT - MARGIN),
+    ]
+    for line in lines:
+        parts.append(b"(" + _escape(line) + b") Tj T*")
+    parts.append(b"ET")
+    return zlib.compress(b"\n".join(parts))
+
+
+def build_pdf(text: str, title: str = "") -> bytes:
+    lines = _wrap(text)
+    pages = [
+        lines[start : start + LINES_PER_PAGE]
+        for start in range(0, max(len(lines), 1), LINES_PER_PAGE)
+    ]
+    objects = []
+    page_ids = [4 + index * 2 for index in range(len(pages))]
+    objects.append(b"<< /Type /Catalog /Pages 2 0 R >>")
+    kids = b" ".join(b"%d 0 R" % page_id for page_id in page_ids)
+    objects.append(b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(pages)))
+    objects.append(
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica "
+        b"/Encoding /WinAnsiEncoding >>"
+    )
+    for page_id, page_lines in zip(page_ids, pages):
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>"
+            % (PAGE_WIDTH, PAGE_HEIGHT, page_id + 1)
+        )
+        stream = _page_stream(page_lines)
+        objects.append(
+            b"<< /Length %d /Filter /FlateDecode >>\nstream\n%s\nendstream"
+            % (len(stream), stream)
+        )
+    objects.append(b"<< /Title (" + _escape(title) + b") /Producer (Cross Insurance) >>")
+
+    output = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        output += b"%010d 00000 n \n" % offset
+    output += (
+        b"trailer\n<< /Size %d /Root 1 0 R /Info %d 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+        % (
+            len(objects) + 1,
+            len(objects),
+            xref,
+        )
+    )
+    return bytes(output)
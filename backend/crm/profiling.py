@@ -0,0 +1,259 @@
+"""Sampled stack profiling of individual API requests.
+
+A request is profiled when a staff user sends ``X-CRM-Profile: 1`` (signed in
+through the session or any of DRF's ``DEFAULT_AUTHENTICATION_CLASSES``, such
+as HTTP Basic), or at random with probability ``CRM_PROFILING_SAMPLE_RATE``
+when its path starts with one of ``CRM_PROFILING_PATHS``. While it runs, one
+sampler thread per process reads the request thread's stack every
+``CRM_PROFILING_INTERVAL`` seconds with ``sys._current_frames()``. Nothing is
+traced, so the view runs at full speed between samples.
+
+The samples of each request are appended in the folded-stack format used
+by ``flamegraph.pl`` and speedscope (``root;caller;callee count``) to
+``CRM_PROFILING_DIR/<endpoint>.folded``. The root frame is the endpoint
+(``GET api/policies/``), so several files can be concatenated into one
+graph. ``requests.jsonl`` in the same directory logs each profiled request's
+duration and sample count. ``manage.py profile_summary`` reads both.
+"""
+import json
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+from asgiref.sync import (
+    async_to_sync,
+    iscoroutinefunction,
+    markcoroutinefunction,
+    sync_to_async,
+)
+from django.conf import settings
+from django.utils import timezone
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+logger = logging.getLogger(__name__)
+
+HEADER = "HTTP_X_CRM_PROFILE"
+REQUEST_LOG = "requests.jsonl"
+# First module prefix found walking up from the sampled frame wins.
+CATEGORIES = (
+    ("orm", ("django.db.",)),
+    (
+        "serializer",
+        ("rest_framework.serializers", "crm.serializers", "crm.fast_serializers"),
+    ),
+    ("renderer", ("rest_framework.renderers", "crm.renderers", "json.")),
+    ("compression", ("crm.compression", "gzip", "zlib")),
+)
+
+
+def frame_name(code, module: str) -> str:
+    return f"{module}.{code.co_qualname}"
+
+
+def categorize(stack) -> str:
+    for frame in reversed(stack):
+        for category, prefixes in CATEGORIES:
+            if frame.startswith(prefixes):
+                return category
+    return "other"
+
+
+class Capture:
+    """Samples of one request, keyed by stack (root first)."""
+
+    def __init__(self, thread_id: int, root_code):
+        self.thread_id = thread_id
+        self.root_code = root_code
+        self.stacks = Counter()
+        self.samples = 0
+
+
+class Sampler:
+    """Background thread sampling the stacks of the requests being profiled."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._active: dict = {}
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._names: dict = {}
+
+    def start(self, capture) -> None:
+        with self._lock:
+            self._active[capture.thread_id] = capture
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="crm-profiler", daemon=True
+                )
+                self._thread.start()
+        self._wakeup.set()
+
+    def stop(self, capture) -> None:
+        with self._lock:
+            self._active.pop(capture.thread_id, None)
+
+    def _stack(self, frame, root_code) -> tuple:
+        names = []
+        while frame is not None and frame.f_code is not root_code:
+            code = frame.f_code
+            name = self._names.get(code)
+            if name is None:
+                name = self._names[code] = frame_name(
+                    code, frame.f_globals.get("__name__", "?")
+                )
+            names.append(name)
+            frame = frame.f_back
+        names.reverse()
+        return tuple(names)
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                captures = list(self._active.values())
+                if not captures:
+                    self._wakeup.clear()
+            if not captures:
+                self._wakeup.wait()
+                continue
+            frames = sys._current_frames()
+            for capture in captures:
+                frame = frames.get(capture.thread_id)
+                if frame is not None:
+                    capture.stacks[self._stack(frame, capture.root_code)] += 1
+                    capture.samples += 1
+            del frames
+            time.sleep(getattr(settings, "CRM_PROFILING_INTERVAL", 0.005))
+
+
+sampler = Sampler()
+_write_lock = threading.Lock()
+
+
+def endpoint_key(request) -> str:
+    match = getattr(request, "resolver_match", None)
+    route = match.route if match is not None and match.route else request.path
+    # Router patterns are regexes (``api/policies/$``).
+    route = re.sub(r"[\^$]", "", route)
+    return f"{request.method} {route}"
+
+
+def endpoint_filename(endpoint: str) -> str:
+    return re.sub(r"[^A-Za-z0-9]+", "_", endpoint).strip("_") + ".folded"
+
+
+def save_capture(endpoint, capture, duration, status_code) -> None:
+    directory = str(getattr(settings, "CRM_PROFILING_DIR", "profiles"))
+    lines = "".join(
+        f"{';'.join((endpoint, *stack))} {count}\n"
+        for stack, count in capture.stacks.items()
+    )
+    entry = {
+        "endpoint": endpoint,
+        "at": timezone.now().isoformat(),
+        "duration_ms": round(duration * 1000, 2),
+        "samples": capture.samples,
+        "status": status_code,
+    }
+    with _write_lock:
+        os.makedirs(directory, exist_ok=True)
+        if lines:
+            with open(
+                os.path.join(directory, endpoint_filename(endpoint)),
+                "a",
+                encoding="utf-8",
+            ) as handle:
+                handle.write(lines)
+        with open(os.path.join(directory, REQUEST_LOG), "a", encoding="utf-8") as handle:
+            handle.write(json.dumps(entry) + "\n")
+
+
+def is_staff(request) -> bool:
+    """Whether the session or the API credentials of ``request`` belong to staff."""
+
+    user = getattr(request, "user", None)
+    if not (user and user.is_authenticated):
+        # API clients send credentials with every request instead of a session;
+        # DRF only reads them in the view, after this middleware has run.
+        user = None
+        drf_request = Request(request)
+        for authenticator in api_settings.DEFAULT_AUTHENTICATION_CLASSES:
+            try:
+                result = authenticator().authenticate(drf_request)
+            except APIException:
+                return False
+            if result is not None:
+                user = result[0]
+                break
+    return bool(user and user.is_authenticated and user.is_staff)
+
+
+def sampled(request) -> bool:
+    rate = getattr(settings, "CRM_PROFILING_SAMPLE_RATE", 0.0)
+    paths = tuple(getattr(settings, "CRM_PROFILING_PATHS", ()))
+    return bool(
+        rate and paths and request.path.startswith(paths) and random.random() < rate
+    )
+
+
+class ProfilingMiddleware:
+    """Profile selected requests (see the module docstring).
+
+    Place it after ``AuthenticationMiddleware`` so the staff header can be
+    checked against the session too. Under ASGI a selected request is handled
+    in a worker thread, which is where Django runs the sync views anyway.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        requested = request.META.get(HEADER) == "1"
+        is_sampled = sampled(request)
+        if not (requested or is_sampled):
+            return self.get_response(request)
+        return self._profile(request, self.get_response, requested, is_sampled)
+
+    async def __acall__(self, request):
+        requested = request.META.get(HEADER) == "1"
+        is_sampled = sampled(request)
+        if not (requested or is_sampled):
+            return await self.get_response(request)
+        # The staff check may load the user from the database: sync context only.
+        return await sync_to_async(self._profile)(
+            request, async_to_sync(self.get_response), requested, is_sampled
+        )
+
+    def _profile(self, request, get_response, requested, is_sampled):
+        requested = requested and is_staff(request)
+        if not (requested or is_sampled):
+            return get_response(request)
+        capture = Capture(threading.get_ident(), sys._getframe().f_code)
+        started = time.perf_counter()
+        sampler.start(capture)
+        try:
+            response = get_response(request)
+        finally:
+            sampler.stop(capture)
+        duration = time.perf_counter() - started
+        try:
+            save_capture(endpoint_key(request), capture, duration, response.status_code)
+        except OSError:
+            logger.exception("Could not save the profile of %s", request.path)
+        if requested:
+            response.headers["X-CRM-Profile-Samples"] = str(capture.samples)
+        return response
@@ -0,0 +1,190 @@
+"""Chunked deletion of clients and retention of old rows.
+
+Deleting a client through the ORM cascades to every policy, renewal, invoice
+and document in one transaction, with all of them loaded by the collector.
+``purge_client()`` deletes the same rows bottom-up instead (commission lines,
+renewals, invoices and documents of a few policies, then those policies, then
+the client). Each chunk of ``CRM_PURGE_CHUNK_SIZE`` rows is deleted in its own
+short transaction, with a pause of ``CRM_PURGE_THROTTLE_SECONDS`` between
+chunks. Chunks still go through ``delete()``, so signals (change log, renewal
+calendar) run as usual. Stored files are removed by a task enqueued in the
+same transaction as their rows.
+
+``apply_retention()`` deletes rows older than ``CRM_RETENTION_DAYS`` per
+policy (leads that never converted, finished tasks, reminder dispatches, and
+change events every consumer has read) the same way.
+"""
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Min, Q
+from django.utils import timezone
+
+from .models import (
+    ChangeConsumer,
+    ChangeEvent,
+    Client,
+    CommissionLine,
+    Document,
+    Invoice,
+    Lead,
+    Policy,
+    PolicyStatusChange,
+    ReminderDispatch,
+    Renewal,
+    Task,
+)
+from .tasks import task
+
+FILE_FIELDS = {Document: ("file",), Lead: ("attachment",)}
+REMINDER_KINDS = {
+    Invoice: ReminderDispatch.Kind.INVOICE,
+    Renewal: ReminderDispatch.Kind.RENEWAL,
+}
+POLICY_CHILDREN = (CommissionLine, PolicyStatusChange, Renewal, Invoice, Document)
+
+
+def _read_position() -> Q:
+    position = ChangeConsumer.objects.aggregate(position=Min("position"))["position"]
+    return Q(pk__lte=position or 0)
+
+
+# name -> (model, age field, extra filter or a callable returning one)
+RETENTION_POLICIES = {
+    "leads": (Lead, "created_at", Q(converted_client__isnull=True)),
+    "tasks": (
+        Task,
+        "updated_at",
+        Q(status__in=[Task.TaskStatus.SUCCEEDED, Task.TaskStatus.FAILED]),
+    ),
+    "reminders": (ReminderDispatch, "created_at", Q()),
+    "change_events": (ChangeEvent, "created_at", _read_position),
+}
+
+
+@task(queue="default")
+def delete_stored_files(model_label: str, field_name: str, names: list) -> None:
+    storage = apps.get_model(model_label)._meta.get_field(field_name).storage
+    for name in names:
+        storage.delete(name)
+
+
+def delete_in_chunks(queryset, stats=None, chunk_size=None, throttle=None) -> int:
+    """Delete the rows of ``queryset`` ``chunk_size`` at a time; return the count."""
+
+    chunk_size = chunk_size or settings.CRM_PURGE_CHUNK_SIZE
+    throttle = settings.CRM_PURGE_THROTTLE_SECONDS if throttle is None else throttle
+    model = queryset.model
+    stats = Counter() if stats is None else stats
+    deleted = 0
+    while True:
+        with transaction.atomic():
+            ids = list(queryset.order_by("pk").values_list("pk", flat=True)[:chunk_size])
+            if not ids:
+                return deleted
+            chunk = model._default_manager.filter(pk__in=ids)
+            for field_name in FILE_FIELDS.get(model, ()):
+                names = [
+                    name for name in chunk.values_list(field_name, flat=True) if name
+                ]
+                if names:
+                    delete_stored_files.defer(model._meta.label, field_name, names)
+                    stats["files"] += len(names)
+            if model in REMINDER_KINDS:
+                ReminderDispatch.objects.filter(
+                    kind=REMINDER_KINDS[model], object_id__in=ids
+                ).delete()
+            _, counts = chunk.delete()
+        for label, count in counts.items():
+            stats[label] += count
+        deleted += len(ids)
+        if throttle:
+            time.sleep(throttle)
+
+
+def purge_policies(policy_ids, stats, chunk_size=None, throttle=None) -> None:
+    """Delete policies after their dependent rows, bottom-up."""
+
+    for model in POLICY_CHILDREN:
+        delete_in_chunks(
+            model._default_manager.filter(policy_id__in=policy_ids),
+            stats,
+            chunk_size,
+            throttle,
+        )
+    Lead.objects.filter(converted_policy_id__in=policy_ids).update(
+        converted_policy=None, updated_at=timezone.now()
+    )
+    delete_in_chunks(
+        Policy.objects.filter(pk__in=policy_ids), stats, chunk_size, throttle
+    )
+
+
+@task(queue="purge")
+def purge_client(
+    client_id: int, chunk_size=None, throttle=None, max_seconds=None
+) -> dict:
+    """Delete a client and everything that belongs to it in bounded chunks.
+
+    Runs at most ``max_seconds`` (``CRM_PURGE_TASK_SECONDS``) per call; if the
+    client is not gone by then, the purge is enqueued again and resumes where
+    it stopped.
+    """
+
+    started = time.monotonic()
+    if max_seconds is None:
+        max_seconds = settings.CRM_PURGE_TASK_SECONDS
+    chunk_size = chunk_size or settings.CRM_PURGE_CHUNK_SIZE
+    stats = Counter()
+    policies = Policy.objects.filter(client_id=client_id).order_by("pk")
+    while policy_ids := list(policies.values_list("pk", flat=True)[:chunk_size]):
+        purge_policies(policy_ids, stats, chunk_size, throttle)
+        if time.monotonic() - started > max_seconds:
+            purge_client.defer(client_id, chunk_size, throttle, max_seconds)
+            return dict(stats)
+    delete_in_chunks(
+        Document.objects.filter(client_id=client_id), stats, chunk_size, throttle
+    )
+    with transaction.atomic():
+        now = timezone.now()
+        Lead.objects.filter(matched_client_id=client_id).update(
+            matched_client=None, match_confidence=None, updated_at=now
+        )
+        Lead.objects.filter(converted_client_id=client_id).update(
+            converted_client=None, updated_at=now
+        )
+        for label, count in Client.objects.filter(pk=client_id).delete()[1].items():
+            stats[label] += count
+    return dict(stats)
+
+
+def request_client_purge(client) -> None:
+    """Hide the client from the API and purge it in the background."""
+
+    with transaction.atomic():
+        now = timezone.now()
+        Client.objects.filter(pk=client.pk).update(purge_requested_at=now, updated_at=now)
+        purge_client.defer(client.pk)
+
+
+def apply_retention(names=None, chunk_size=None, throttle=None) -> dict:
+    """Run the retention policies (all configured ones by default)."""
+
+    days = settings.CRM_RETENTION_DAYS
+    results = {}
+    for name in names or RETENTION_POLICIES:
+        if not days.get(name):
+            continue
+        model, field, condition = RETENTION_POLICIES[name]
+        if callable(condition):
+            condition = condition()
+        cutoff = timezone.now() - timedelta(days=days[name])
+        queryset = model._default_manager.filter(condition, **{f"{field}__lt": cutoff})
+        stats = Counter()
+        delete_in_chunks(queryset, stats, chunk_size, throttle)
+        results[name] = dict(stats)
+    return results
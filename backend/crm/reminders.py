@@ -0,0 +1,271 @@
+"""Batched reminder emails for upcoming renewals and overdue invoices.
+
+A run has two phases. First every due renewal or invoice gets a
+``ReminderDispatch`` row (inserted in bulk, ignoring rows that already exist),
+so re-running never queues the same cycle twice. Then pending dispatches are
+sent in batches over a small pool of reused SMTP connections and their
+statuses, plus the renewal statuses, are updated in bulk. A crash between
+sending a batch and recording it can resend at most that one batch.
+
+Each batch re-reads its renewals and invoices through the same conditions
+that queued them, so a renewal cancelled or completed, or an invoice paid,
+since it was queued is marked ``skipped`` instead of emailed, retries included.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.template.loader import get_template
+from django.utils import timezone
+
+from .models import Invoice, ReminderDispatch, Renewal
+
+MAX_ATTEMPTS = 3
+
+
+@dataclass
+class DispatchResult:
+    due: int = 0
+    sent: int = 0
+    failed: int = 0
+    skipped: int = 0
+    marked_overdue: int = 0
+    errors: list = field(default_factory=list)
+
+
+def _due_renewals(today):
+    # Renewals already past are not "coming up" and get no reminder.
+    horizon = today + timedelta(days=getattr(settings, "CRM_REMINDER_RENEWAL_DAYS", 30))
+    return Renewal.objects.filter(
+        status=Renewal.RenewalStatus.SCHEDULED, renewal_date__range=(today, horizon)
+    ).exclude(policy__client__email="")
+
+
+def _due_invoices(today):
+    return Invoice.objects.filter(
+        status=Invoice.InvoiceStatus.OVERDUE, due_date__lt=today
+    ).exclude(policy__client__email="")
+
+
+def _queue(queryset, kind, date_field, batch_size):
+    due = 0
+    last_id = 0
+    rows = queryset.order_by("pk").values_list("pk", date_field, "policy__client__email")
+    while True:
+        batch = list(rows.filter(pk__gt=last_id)[:batch_size])
+        if not batch:
+            return due
+        last_id = batch[-1][0]
+        ReminderDispatch.objects.bulk_create(
+            [
+                ReminderDispatch(
+                    kind=kind,
+                    object_id=pk,
+                    cycle=cycle.isoformat(),
+                    recipient=email,
+                )
+                for pk, cycle, email in batch
+            ],
+            ignore_conflicts=True,
+        )
+        due += len(batch)
+
+
+def queue_reminders(today=None, batch_size=1000) -> int:
+    """Create missing dispatch rows and return how many items are due."""
+
+    today = today or timezone.localdate()
+    return _queue(
+        _due_renewals(today), ReminderDispatch.Kind.RENEWAL, "renewal_date", batch_size
+    ) + _queue(
+        _due_invoices(today), ReminderDispatch.Kind.INVOICE, "due_date", batch_size
+    )
+
+
+def mark_overdue_invoices(today=None) -> int:
+    today = today or timezone.localdate()
+    return Invoice.objects.filter(
+        status=Invoice.InvoiceStatus.PENDING, due_date__lt=today
+    ).update(status=Invoice.InvoiceStatus.OVERDUE, updated_at=timezone.now())
+
+
+class ConnectionPool:
+    """One SMTP connection per worker thread, opened once and reused."""
+
+    def __init__(self):
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    def get(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = get_connection()
+            connection.open()
+            self._local.connection = connection
+            with self._lock:
+                self._connections.append(connection)
+        return connection
+
+    def close(self):
+        for connection in self._connections:
+            connection.close()
+        self._connections.clear()
+
+
+class ReminderRenderer:
+    def __init__(self):
+        self.templates = {
+            kind: (
+                get_template(f"crm/reminders/{kind}_subject.txt"),
+                get_template(f"crm/reminders/{kind}_body.txt"),
+            )
+            for kind in ReminderDispatch.Kind.values
+        }
+        self.from_email = settings.DEFAULT_FROM_EMAIL
+
+    def render(self, dispatch, obj) -> EmailMessage:
+        subject_template, body_template = self.templates[dispatch.kind]
+        policy = obj.policy
+        context = {
+            "client": policy.client,
+            "policy": policy,
+            "product": policy.product,
+            dispatch.kind: obj,
+        }
+        subject = " ".join(subject_template.render(context).split())
+        return EmailMessage(
+            subject=subject,
+            body=body_template.render(context),
+            from_email=self.from_email,
+            to=[dispatch.recipient],
+        )
+
+
+def _load_objects(dispatches, today):
+    """Still-due objects of ``dispatches`` by kind and id, for the same cycle."""
+
+    ids = {kind: [] for kind in ReminderDispatch.Kind.values}
+    for dispatch in dispatches:
+        ids[dispatch.kind].append(dispatch.object_id)
+    related = ("policy", "policy__client", "policy__product")
+    return {
+        ReminderDispatch.Kind.RENEWAL: _due_renewals(today)
+        .select_related(*related)
+        .in_bulk(ids[ReminderDispatch.Kind.RENEWAL]),
+        ReminderDispatch.Kind.INVOICE: _due_invoices(today)
+        .select_related(*related)
+        .in_bulk(ids[ReminderDispatch.Kind.INVOICE]),
+    }
+
+
+def _cycle(dispatch, obj) -> str:
+    if dispatch.kind == ReminderDispatch.Kind.RENEWAL:
+        return obj.renewal_date.isoformat()
+    return obj.due_date.isoformat()
+
+
+def _send_chunk(pool, messages):
+    sent, failed = [], []
+    try:
+        connection = pool.get()
+    except Exception as exc:
+        return sent, [(dispatch, str(exc)) for dispatch, _ in messages]
+    for dispatch, message in messages:
+        message.connection = connection
+        try:
+            message.send()
+        except Exception as exc:
+            failed.append((dispatch, str(exc)))
+        else:
+            sent.append(dispatch)
+    return sent, failed
+
+
+def _record(sent, failed, result, skipped=()):
+    now = timezone.now()
+    with transaction.atomic():
+        if skipped:
+            ReminderDispatch.objects.filter(pk__in=[d.pk for d in skipped]).update(
+                status=ReminderDispatch.DispatchStatus.SKIPPED, updated_at=now
+            )
+        if sent:
+            ReminderDispatch.objects.filter(pk__in=[d.pk for d in sent]).update(
+                status=ReminderDispatch.DispatchStatus.SENT,
+                sent_at=now,
+                updated_at=now,
+            )
+            renewal_ids = [
+                d.object_id for d in sent if d.kind == ReminderDispatch.Kind.RENEWAL
+            ]
+            Renewal.objects.filter(
+                pk__in=renewal_ids, status=Renewal.RenewalStatus.SCHEDULED
+            ).update(status=Renewal.RenewalStatus.SENT, updated_at=now)
+        for dispatch, error in failed:
+            dispatch.attempts += 1
+            dispatch.last_error = error
+            dispatch.updated_at = now
+            if dispatch.attempts >= MAX_ATTEMPTS:
+                dispatch.status = ReminderDispatch.DispatchStatus.FAILED
+        ReminderDispatch.objects.bulk_update(
+            [dispatch for dispatch, _ in failed],
+            ["attempts", "last_error", "status", "updated_at"],
+        )
+    result.sent += len(sent)
+    result.failed += len(failed)
+    result.skipped += len(skipped)
+    result.errors.extend(error for _, error in failed[:5])
+
+
+def send_pending(batch_size=200, workers=None, result=None, today=None) -> DispatchResult:
+    """Send every pending dispatch that is still due, ``batch_size`` at a time."""
+
+    result = result or DispatchResult()
+    today = today or timezone.localdate()
+    workers = workers or getattr(settings, "CRM_REMINDER_WORKERS", 4)
+    renderer = ReminderRenderer()
+    pool = ConnectionPool()
+    pending = ReminderDispatch.objects.filter(
+        status=ReminderDispatch.DispatchStatus.PENDING
+    ).order_by("pk")
+    last_id = 0
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            while True:
+                dispatches = list(pending.filter(pk__gt=last_id)[:batch_size])
+                if not dispatches:
+                    break
+                last_id = dispatches[-1].pk
+                objects = _load_objects(dispatches, today)
+                messages, skipped = [], []
+                for dispatch in dispatches:
+                    obj = objects[dispatch.kind].get(dispatch.object_id)
+                    # Deleted, no longer due, or rescheduled into another cycle.
+                    if obj is None or _cycle(dispatch, obj) != dispatch.cycle:
+                        skipped.append(dispatch)
+                    else:
+                        messages.append((dispatch, renderer.render(dispatch, obj)))
+                chunks = [messages[index::workers] for index in range(workers)]
+                sent, failed = [], []
+                for chunk_sent, chunk_failed in executor.map(
+                    lambda chunk: _send_chunk(pool, chunk), filter(None, chunks)
+                ):
+                    sent.extend(chunk_sent)
+                    failed.extend(chunk_failed)
+                _record(sent, failed, result, skipped)
+    finally:
+        pool.close()
+    return result
+
+
+def dispatch_reminders(today=None, batch_size=200, workers=None) -> DispatchResult:
+    result = DispatchResult()
+    result.marked_overdue = mark_overdue_invoices(today)
+    result.due = queue_reminders(today)
+    return send_pending(
+        batch_size=batch_size, workers=workers, result=result, today=today
+    )
@@ -0,0 +1,51 @@
+"""JSON renderer backed by orjson, with the same bytes as DRF's ``JSONRenderer``."""
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # The stdlib encoder is used when orjson is not installed.
+    orjson = None
+
+# Dates, times and dataclasses are handed to DRF's encoder (``default``) so they
+# are formatted exactly as on the stdlib path.
+ORJSON_OPTIONS = (
+    orjson.OPT_NON_STR_KEYS
+    | orjson.OPT_PASSTHROUGH_DATETIME
+    | orjson.OPT_PASSTHROUGH_DATACLASS
+    if orjson
+    else 0
+)
+
+# Floats printed identically by orjson and json.dumps (no exponent).
+FLOAT_SAFE_RANGE = (1e-4, 1e16)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """Compact JSON through orjson; anything it cannot match falls back to DRF.
+
+    orjson writes floats in exponent form differently (``1e-7`` instead of
+    ``1e-07``), so only use it for data whose floats are known to fall in
+    ``FLOAT_SAFE_RANGE``, as ``crm.fast_serializers`` checks.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None
+            or data is None
+            or not (self.compact and self.strict)
+            or self.ensure_ascii
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=_encoder.default, option=ORJSON_OPTIONS)
+        except (TypeError, ValueError):
+            return super().render(data, accepted_media_type, renderer_context)
+        # Same escaping as JSONRenderer, which keeps the output a JavaScript subset.
+        return ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(
+            b"\xe2\x80\xa9", b"\\u2029"
+        )
+
+
+_encoder = JSONEncoder()
@@ -0,0 +1,219 @@
+"""Renewal calendar aggregates, cached per week or month bucket.
+
+Buckets are invalidated by whichever process writes the rows (API requests,
+``send_reminders``, the task worker, bordereau imports), so they are only
+cached in a backend every process shares. With a process-local
+``LocMemCache`` (the default ``CACHE_URL``) the calendar is computed on
+every request instead of serving another process's stale buckets.
+"""
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core import checks
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth, TruncWeek
+
+from .models import Policy, Renewal
+
+GRANULARITIES = ("week", "month")
+CACHE_TIMEOUT = 60 * 60 * 24
+EXCLUDED_STATUSES = (Policy.PolicyStatus.CANCELLED, Policy.PolicyStatus.EXPIRED)
+
+# Policy and Renewal fields the cached buckets depend on.
+CALENDAR_FIELDS = frozenset(
+    {
+        "renewal_date",
+        "status",
+        "product",
+        "product_id",
+        "premium_amount",
+        "policy",
+        "policy_id",
+    }
+)
+
+# InsuranceProduct fields copied into every bucket; a change drops all buckets.
+PRODUCT_FIELDS = ("name", "category")
+GENERATION_KEY = "crm:renewal-calendar:generation"
+
+_TRUNCATE = {"week": TruncWeek, "month": TruncMonth}
+
+
+def is_cached() -> bool:
+    return not isinstance(caches[DEFAULT_CACHE_ALIAS], LocMemCache)
+
+
+@checks.register(checks.Tags.caches, deploy=True)
+def check_calendar_cache(app_configs=None, **kwargs):
+    if is_cached():
+        return []
+    return [
+        checks.Warning(
+            "The renewal calendar is not cached: the default cache is process-local.",
+            hint="Set CACHE_URL to a shared backend (redis://, dbcache://).",
+            id="crm.W004",
+        )
+    ]
+
+
+def bucket_start(value: date, granularity: str) -> date:
+    if granularity == "week":
+        return value - timedelta(days=value.weekday())
+    return value.replace(day=1)
+
+
+def next_bucket(value: date, granularity: str) -> date:
+    if granularity == "week":
+        return value + timedelta(days=7)
+    return (value.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def bucket_starts(start: date, end: date, granularity: str) -> list:
+    current = bucket_start(start, granularity)
+    starts = []
+    while current <= end:
+        starts.append(current)
+        current = next_bucket(current, granularity)
+    return starts
+
+
+def _generation() -> int:
+    return cache.get_or_set(GENERATION_KEY, 0, timeout=None)
+
+
+def cache_key(granularity: str, start: date, generation: int = 0) -> str:
+    return f"crm:renewal-calendar:{generation}:{granularity}:{start.isoformat()}"
+
+
+def invalidate(*dates) -> None:
+    if not is_cached():
+        return
+    generation = _generation()
+    keys = {
+        cache_key(granularity, bucket_start(value, granularity), generation)
+        for value in dates
+        if value
+        for granularity in GRANULARITIES
+    }
+    if keys:
+        cache.delete_many(list(keys))
+
+
+def invalidate_all() -> None:
+    """Drop every cached bucket by moving to a new key generation."""
+
+    if not is_cached():
+        return
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, 1, timeout=None)
+
+
+def invalidate_on_commit(dates, using="default") -> None:
+    dates = {value for value in dates if value}
+    if dates:
+        transaction.on_commit(lambda: invalidate(*dates), using=using)
+
+
+def _money(value) -> str:
+    return str(Decimal(value).quantize(Decimal("0.01")))
+
+
+def _as_date(value):
+    return value.date() if hasattr(value, "date") else value
+
+
+def _compute(first: date, last: date, granularity: str) -> dict:
+    """Aggregate every bucket between ``first`` and ``last`` (inclusive)."""
+
+    truncate = _TRUNCATE[granularity]
+    end = next_bucket(last, granularity) - timedelta(days=1)
+    products = defaultdict(dict)
+
+    policy_rows = (
+        Policy.objects.filter(renewal_date__range=(first, end))
+        .exclude(status__in=EXCLUDED_STATUSES)
+        .annotate(bucket=truncate("renewal_date"))
+        .values("bucket", "product_id", "product__name", "product__category")
+        .annotate(policies=Count("id"), premium=Sum("premium_amount"))
+        .order_by()
+    )
+    for row in policy_rows:
+        products[_as_date(row["bucket"])][row["product_id"]] = {
+            "product": row["product_id"],
+            "name": row["product__name"],
+            "category": row["product__category"],
+            "policies": row["policies"],
+            "premium": row["premium"] or Decimal("0"),
+            "renewals": {},
+        }
+
+    renewal_rows = (
+        Renewal.objects.filter(renewal_date__range=(first, end))
+        .annotate(bucket=truncate("renewal_date"))
+        .values(
+            "bucket",
+            "status",
+            "policy__product_id",
+            "policy__product__name",
+            "policy__product__category",
+        )
+        .annotate(total=Count("id"))
+        .order_by()
+    )
+    for row in renewal_rows:
+        entry = products[_as_date(row["bucket"])].setdefault(
+            row["policy__product_id"],
+            {
+                "product": row["policy__product_id"],
+                "name": row["policy__product__name"],
+                "category": row["policy__product__category"],
+                "policies": 0,
+                "premium": Decimal("0"),
+                "renewals": {},
+            },
+        )
+        entry["renewals"][row["status"]] = row["total"]
+
+    buckets = {}
+    for start in bucket_starts(first, last, granularity):
+        rows = sorted(products.get(start, {}).values(), key=lambda row: row["name"])
+        premium = sum((row["premium"] for row in rows), Decimal("0"))
+        buckets[start] = {
+            "start": start.isoformat(),
+            "end": (next_bucket(start, granularity) - timedelta(days=1)).isoformat(),
+            "policies": sum(row["policies"] for row in rows),
+            "premium": _money(premium),
+            "products": [{**row, "premium": _money(row["premium"])} for row in rows],
+        }
+    return buckets
+
+
+def renewal_calendar(start: date, end: date, granularity: str = "week") -> list:
+    """Return the calendar buckets covering ``start``..``end``.
+
+    Cached buckets are reused; the missing ones are filled with one grouped
+    query per model over the span they cover.
+    """
+
+    starts = bucket_starts(start, end, granularity)
+    if not is_cached():
+        computed = _compute(starts[0], starts[-1], granularity)
+        return [computed[bucket] for bucket in starts]
+    generation = _generation()
+    keys = {bucket: cache_key(granularity, bucket, generation) for bucket in starts}
+    cached = cache.get_many(list(keys.values()))
+    missing = [bucket for bucket in starts if keys[bucket] not in cached]
+    if missing:
+        computed = _compute(missing[0], missing[-1], granularity)
+        cache.set_many(
+            {keys[bucket]: computed[bucket] for bucket in missing},
+            timeout=CACHE_TIMEOUT,
+        )
+        cached.update({keys[bucket]: computed[bucket] for bucket in missing})
+    return [cached[keys[bucket]] for bucket in starts]
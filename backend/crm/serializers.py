@@ -70,6 +70,7 @@ class PolicySerializer(serializers.ModelSerializer):
             "end_date",
             "renewal_date",
             "premium_amount",
+            "payment_plan",
             "coverage_summary",
             "created_at",
             "updated_at",
@@ -105,17 +106,19 @@ class InvoiceSerializer(serializers.ModelSerializer):
             "id",
             "policy",
             "invoice_number",
+            "installment_number",
             "issue_date",
             "due_date",
             "amount",
             "currency",
             "is_manual",
             "status",
+            "paid_on",
             "description",
             "created_at",
             "updated_at",
         ]
-        read_only_fields = ["created_at", "updated_at"]
+        read_only_fields = ["installment_number", "created_at", "updated_at"]
 
 
 class DocumentSerializer(serializers.ModelSerializer):
@@ -142,6 +145,8 @@ class DocumentSerializer(serializers.ModelSerializer):
 
 
 class LeadSerializer(serializers.ModelSerializer):
+    """Lead as the public form sees it, without client matching or conversion."""
+
     class Meta:
         model = Lead
         fields = [
@@ -153,7 +158,32 @@ class LeadSerializer(serializers.ModelSerializer):
             "notes",
             "attachment",
             "source",
+            "submission_id",
             "created_at",
             "updated_at",
         ]
-        read_only_fields = ["source", "created_at", "updated_at"]
+        read_only_fields = ["source", "submission_id", "created_at", "updated_at"]
+
+
+STAFF_LEAD_FIELDS = [
+    "matched_client",
+    "match_confidence",
+    "converted_client",
+    "converted_policy",
+    "converted_at",
+]
+
+
+class StaffLeadSerializer(LeadSerializer):
+    class Meta(LeadSerializer.Meta):
+        fields = [*LeadSerializer.Meta.fields, *STAFF_LEAD_FIELDS]
+        read_only_fields = [*LeadSerializer.Meta.read_only_fields, *STAFF_LEAD_FIELDS]
+
+
+class LeadConversionSerializer(serializers.Serializer):
+    client = serializers.PrimaryKeyRelatedField(
+        queryset=Client.objects.all(), required=False, allow_null=True
+    )
+    policy = serializers.PrimaryKeyRelatedField(
+        queryset=Policy.objects.all(), required=False, allow_null=True
+    )
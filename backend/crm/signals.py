@@ -0,0 +1,116 @@
+from copy import copy
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from . import renewal_calendar
+from .billing import BILLING_FIELDS, regenerate_policy_schedule
+from .changes import delete_context, record_changes
+from .matching import contact_index
+from .models import (
+    Client,
+    InsuranceProduct,
+    Invoice,
+    Lead,
+    Policy,
+    Renewal,
+    record_policy_statuses,
+)
+
+
+# The contact index is process-wide: only committed contacts may enter it.
+@receiver(post_save, sender=Client)
+def index_client_contacts(sender, instance, using=None, **kwargs):
+    transaction.on_commit(partial(contact_index.update, copy(instance)), using=using)
+
+
+@receiver(post_delete, sender=Client)
+def unindex_client_contacts(sender, instance, using=None, **kwargs):
+    transaction.on_commit(partial(contact_index.remove, instance.pk), using=using)
+
+
+@receiver(post_init, sender=Policy)
+@receiver(post_init, sender=Renewal)
+def remember_renewal_date(sender, instance, **kwargs):
+    instance._loaded_renewal_date = instance.__dict__.get("renewal_date")
+
+
+@receiver(post_save, sender=Policy)
+@receiver(post_delete, sender=Policy)
+@receiver(post_save, sender=Renewal)
+@receiver(post_delete, sender=Renewal)
+def invalidate_renewal_calendar(sender, instance, **kwargs):
+    renewal_calendar.invalidate(instance.renewal_date, instance._loaded_renewal_date)
+    instance._loaded_renewal_date = instance.renewal_date
+
+
+@receiver(post_init, sender=InsuranceProduct)
+def remember_product_labels(sender, instance, **kwargs):
+    instance._loaded_labels = [
+        instance.__dict__.get(name) for name in renewal_calendar.PRODUCT_FIELDS
+    ]
+
+
+@receiver(post_save, sender=InsuranceProduct)
+def invalidate_renewal_calendar_labels(sender, instance, created, using=None, **kwargs):
+    labels = [getattr(instance, name) for name in renewal_calendar.PRODUCT_FIELDS]
+    if not created and labels != instance._loaded_labels:
+        transaction.on_commit(renewal_calendar.invalidate_all, using=using)
+    instance._loaded_labels = labels
+
+
+@receiver(post_init, sender=Policy)
+def remember_billing_fields(sender, instance, **kwargs):
+    instance._loaded_billing = {
+        name: instance.__dict__[name]
+        for name in BILLING_FIELDS
+        if name in instance.__dict__
+    }
+
+
+@receiver(post_save, sender=Policy)
+def regenerate_installments(sender, instance, created, **kwargs):
+    loaded = instance._loaded_billing
+    current = {name: instance.__dict__[name] for name in loaded}
+    instance._loaded_billing = current
+    if not (current.get("payment_plan") or loaded.get("payment_plan")):
+        return
+    if created or current != loaded:
+        transaction.on_commit(partial(regenerate_policy_schedule.defer, instance.pk))
+
+
+@receiver(post_init, sender=Policy)
+def remember_policy_status(sender, instance, **kwargs):
+    instance._loaded_status = instance.__dict__.get("status")
+
+
+# Commission rates follow the status a policy had on the date of the premium.
+@receiver(post_save, sender=Policy)
+def record_policy_status(sender, instance, created, using=None, **kwargs):
+    status = instance.__dict__.get("status")
+    if status is not None and (created or status != instance._loaded_status):
+        record_policy_statuses([(instance.pk, status)], using=using)
+    instance._loaded_status = status
+
+
+@receiver(post_save, sender=Client)
+@receiver(post_save, sender=Policy)
+@receiver(post_save, sender=Invoice)
+@receiver(post_save, sender=Renewal)
+@receiver(post_save, sender=Lead)
+def log_saved_change(sender, instance, created, update_fields=None, using=None, **kwargs):
+    operation = "create" if created else "update"
+    record_changes(sender, [instance.pk], operation, update_fields or (), using=using)
+
+
+@receiver(post_delete, sender=Client)
+@receiver(post_delete, sender=Policy)
+@receiver(post_delete, sender=Invoice)
+@receiver(post_delete, sender=Renewal)
+@receiver(post_delete, sender=Lead)
+def log_deleted_change(sender, instance, using=None, **kwargs):
+    record_changes(
+        sender, [instance.pk], "delete", using=using, context=delete_context(instance)
+    )
@@ -0,0 +1,273 @@
+"""Columnar (Parquet or Arrow IPC) snapshots of the main crm tables for BI tools.
+
+Each table is partitioned by the month of ``created_at`` (which never changes),
+one file per partition: ``<output>/<table>/created_month=YYYY-MM/part.parquet``.
+``manifest.json`` records the row count and latest ``updated_at`` of every
+partition; the next run rewrites only partitions whose numbers differ (new,
+edited or deleted rows) and drops partitions that no longer exist.
+
+All tables are read inside one read-only transaction (``REPEATABLE READ`` on
+PostgreSQL), streamed in chunks ordered by ``created_at``, so the snapshot is
+consistent across tables without holding the rows in memory. Files are
+written next to their target and renamed into place, and the manifest is
+written last, so readers never see half a partition.
+"""
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime
+
+from django.db import connection, models, transaction
+from django.db.models import Count, Max
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .models import Client, Invoice, Lead, Policy, Renewal
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Snapshots need pyarrow; the rest of the app does not.
+    pa = pq = None
+
+TABLES = {
+    "clients": Client,
+    "policies": Policy,
+    "invoices": Invoice,
+    "renewals": Renewal,
+    "leads": Lead,
+}
+FORMATS = {"parquet": "part.parquet", "arrow": "part.arrow"}
+MANIFEST = "manifest.json"
+
+
+def arrow_type(field):
+    """Arrow type for a concrete model field."""
+
+    if isinstance(field, models.DecimalField):
+        return pa.decimal128(field.max_digits, field.decimal_places)
+    if isinstance(field, models.DateTimeField):
+        return pa.timestamp("us", tz="UTC")
+    if isinstance(field, models.DateField):
+        return pa.date32()
+    if isinstance(field, models.BooleanField):
+        return pa.bool_()
+    if isinstance(field, models.FloatField):
+        return pa.float64()
+    if isinstance(field, (models.IntegerField, models.AutoField, models.ForeignKey)):
+        return pa.int64()
+    return pa.string()
+
+
+def _month_key(value) -> str:
+    """``YYYY-MM`` of a ``created_at`` value in the current time zone."""
+
+    return timezone.localtime(value).strftime("%Y-%m")
+
+
+def _converter(field):
+    if isinstance(field, models.JSONField):
+        return lambda value: None if value is None else json.dumps(value)
+    if isinstance(field, models.FileField):
+        return lambda value: value or None
+    if isinstance(field, models.UUIDField):
+        return lambda value: None if value is None else str(value)
+    return None
+
+
+class TableExport:
+    def __init__(self, name, model):
+        self.name = name
+        self.model = model
+        self.fields = list(model._meta.concrete_fields)
+        self.columns = [field.attname for field in self.fields]
+        self.schema = pa.schema(
+            [
+                pa.field(field.attname, arrow_type(field), nullable=field.null)
+                for field in self.fields
+            ]
+        )
+        self.converters = [_converter(field) for field in self.fields]
+
+    def partitions(self) -> dict:
+        """``{"YYYY-MM": {"rows": n, "max_updated_at": iso}}`` from the database."""
+
+        rows = (
+            self.model._base_manager.order_by()
+            .annotate(month=TruncMonth("created_at"))
+            .values_list("month")
+            .annotate(Count("pk"), Max("updated_at"))
+        )
+        return {
+            _month_key(month): {"rows": count, "max_updated_at": latest.isoformat()}
+            for month, count, latest in rows
+        }
+
+    def rows(self, months, chunk_size):
+        """Stream the rows of ``months`` ordered by ``created_at``."""
+
+        ranges = models.Q()
+        for month in months:
+            start = datetime.strptime(month, "%Y-%m")
+            end = start.replace(
+                year=start.year + start.month // 12, month=start.month % 12 + 1
+            )
+            ranges |= models.Q(
+                created_at__gte=timezone.make_aware(start),
+                created_at__lt=timezone.make_aware(end),
+            )
+        return (
+            self.model._base_manager.filter(ranges)
+            .order_by("created_at", "pk")
+            .values_list(*self.columns)
+            .iterator(chunk_size=chunk_size)
+        )
+
+    def batch(self, rows) -> "pa.RecordBatch":
+        columns = list(zip(*rows))
+        arrays = []
+        for values, convert, field in zip(columns, self.converters, self.schema):
+            if convert is not None:
+                values = [convert(value) for value in values]
+            arrays.append(pa.array(values, type=field.type))
+        return pa.RecordBatch.from_arrays(arrays, schema=self.schema)
+
+
+class PartitionWriter:
+    """Writes one partition file to a temporary name and renames it on close."""
+
+    def __init__(self, path, schema, file_format):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        handle, self.temp_path = tempfile.mkstemp(
+            dir=os.path.dirname(path), suffix=".tmp"
+        )
+        os.close(handle)
+        if file_format == "parquet":
+            self.writer = pq.ParquetWriter(self.temp_path, schema, compression="zstd")
+        else:
+            self.writer = pa.ipc.new_file(self.temp_path, schema)
+
+    def write(self, batch) -> None:
+        self.writer.write_batch(batch)
+
+    def close(self) -> None:
+        self.writer.close()
+        os.replace(self.temp_path, self.path)
+
+    def abort(self) -> None:
+        self.writer.close()
+        os.unlink(self.temp_path)
+
+
+def _read_manifest(output) -> dict:
+    try:
+        with open(os.path.join(output, MANIFEST), encoding="utf-8") as handle:
+            return json.load(handle)
+    except FileNotFoundError:
+        return {}
+
+
+def _write_manifest(output, manifest) -> None:
+    path = os.path.join(output, MANIFEST)
+    with open(f"{path}.tmp", "w", encoding="utf-8") as handle:
+        json.dump(manifest, handle, indent=2, sort_keys=True)
+    os.replace(f"{path}.tmp", path)
+
+
+def _begin_snapshot() -> None:
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY")
+
+
+def export_snapshot(
+    output, tables=None, file_format="parquet", full=False, chunk_size=10000, log=None
+) -> dict:
+    """Write changed partitions of ``tables`` under ``output``; return a summary.
+
+    ``full`` rewrites every partition, as does a change of format or columns.
+    """
+
+    if pa is None:
+        raise RuntimeError("Snapshots need pyarrow (pip install pyarrow).")
+    os.makedirs(output, exist_ok=True)
+    previous = _read_manifest(output)
+    if previous and previous.get("format") != file_format:
+        full = True
+    manifest = {"format": file_format, "tables": dict(previous.get("tables", {}))}
+    summary = {}
+    with transaction.atomic():
+        _begin_snapshot()
+        manifest["generated_at"] = timezone.now().isoformat()
+        for name in tables or TABLES:
+            export = TableExport(name, TABLES[name])
+            current = export.partitions()
+            schema = {field.name: str(field.type) for field in export.schema}
+            stored = previous.get("tables", {}).get(name, {})
+            known = stored.get("partitions", {})
+            if full or stored.get("schema") != schema:
+                # Also drops files left in another format or with old columns.
+                shutil.rmtree(os.path.join(output, name), ignore_errors=True)
+                known = {}
+            changed = sorted(
+                month for month, stats in current.items() if known.get(month) != stats
+            )
+            removed = sorted(set(known) - set(current))
+            _write_partitions(output, export, changed, file_format, chunk_size)
+            for month in removed:
+                shutil.rmtree(_partition_dir(output, name, month), ignore_errors=True)
+            manifest["tables"][name] = {
+                "partitions": current,
+                "schema": schema,
+            }
+            summary[name] = {
+                "partitions": len(current),
+                "rewritten": len(changed),
+                "removed": len(removed),
+                "rows": sum(current[month]["rows"] for month in changed),
+            }
+            if log:
+                log(name, summary[name])
+    _write_manifest(output, manifest)
+    return summary
+
+
+def _partition_dir(output, table, month) -> str:
+    return os.path.join(output, table, f"created_month={month}")
+
+
+def _write_partitions(output, export, months, file_format, chunk_size) -> None:
+    if not months:
+        return
+    created_at = export.columns.index("created_at")
+    writer, month, pending = None, None, []
+    try:
+        for row in export.rows(months, chunk_size):
+            row_month = _month_key(row[created_at])
+            if row_month != month or len(pending) >= chunk_size:
+                if pending:
+                    writer.write(export.batch(pending))
+                    pending = []
+                if row_month != month:
+                    if writer is not None:
+                        writer.close()
+                    month = row_month
+                    writer = PartitionWriter(
+                        os.path.join(
+                            _partition_dir(output, export.name, month),
+                            FORMATS[file_format],
+                        ),
+                        export.schema,
+                        file_format,
+                    )
+            pending.append(row)
+        if pending:
+            writer.write(export.batch(pending))
+        if writer is not None:
+            writer.close()
+            writer = None
+    finally:
+        if writer is not None:
+            writer.abort()
@@ -0,0 +1,239 @@
+"""Database-backed background tasks for the crm app.
+
+Request handlers enqueue work with ``enqueue()`` (or ``some_task.defer()`` for
+functions decorated with ``@task``) and ``manage.py run_crm_worker`` runs it.
+Workers claim rows with ``SELECT ... FOR UPDATE SKIP LOCKED`` where the
+database supports it, and with a conditional ``UPDATE`` per row elsewhere, so
+several workers can share one queue without a broker.
+
+A worker renews ``locked_at`` on its running tasks every quarter of
+``CRM_TASK_TIMEOUT``; only tasks whose worker stopped renewing them for the
+whole timeout are requeued, so a long task is never run twice at once. Only
+functions registered with ``@task`` run: a row naming anything else fails.
+"""
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import timedelta
+
+import django
+from django.conf import settings
+from django.db import close_old_connections, connection, connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+_registry: dict = {}
+
+
+def task(queue="default", priority=0, max_attempts=3):
+    """Register a function as a task and give it a ``defer()`` helper.
+
+    Workers only know the tasks of modules imported at startup, so the
+    defining module must be imported from ``CrmConfig.ready()``.
+    """
+
+    def decorator(func):
+        name = f"{func.__module__}.{func.__qualname__}"
+        _registry[name] = func
+
+        def defer(*args, **kwargs):
+            return enqueue(
+                name,
+                args=args,
+                kwargs=kwargs,
+                queue=queue,
+                priority=priority,
+                max_attempts=max_attempts,
+            )
+
+        func.task_name = name
+        func.defer = defer
+        return func
+
+    return decorator
+
+
+def enqueue(
+    name,
+    args=(),
+    kwargs=None,
+    queue="default",
+    priority=0,
+    run_at=None,
+    max_attempts=3,
+) -> Task:
+    if callable(name):
+        name = getattr(name, "task_name", f"{name.__module__}.{name.__qualname__}")
+    return Task.objects.create(
+        name=name,
+        args=list(args),
+        kwargs=kwargs or {},
+        queue=queue,
+        priority=priority,
+        run_at=run_at or timezone.now(),
+        max_attempts=max_attempts,
+    )
+
+
+def claim_tasks(queue: str, limit: int, worker_id: str) -> list:
+    """Mark up to ``limit`` runnable tasks of ``queue`` as running for ``worker_id``."""
+
+    now = timezone.now()
+    runnable = Task.objects.filter(
+        queue=queue, status=Task.TaskStatus.QUEUED, run_at__lte=now
+    ).order_by("-priority", "run_at", "pk")
+    running = {
+        "status": Task.TaskStatus.RUNNING,
+        "locked_by": worker_id,
+        "locked_at": now,
+        "attempts": F("attempts") + 1,
+    }
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            ids = list(
+                runnable.select_for_update(skip_locked=True).values_list("pk", flat=True)[
+                    :limit
+                ]
+            )
+            Task.objects.filter(pk__in=ids).update(**running)
+    else:
+        ids = [
+            pk
+            for pk in runnable.values_list("pk", flat=True)[:limit]
+            if Task.objects.filter(pk=pk, status=Task.TaskStatus.QUEUED).update(**running)
+        ]
+    return ids
+
+
+def heartbeat(worker_id: str) -> int:
+    """Renew the lock of every task ``worker_id`` is running."""
+
+    return Task.objects.filter(
+        status=Task.TaskStatus.RUNNING, locked_by=worker_id
+    ).update(locked_at=timezone.now())
+
+
+def requeue_stale_tasks(timeout: timedelta) -> int:
+    """Give tasks whose worker died (no heartbeat for ``timeout``) another run."""
+
+    stale = Task.objects.filter(
+        status=Task.TaskStatus.RUNNING, locked_at__lt=timezone.now() - timeout
+    )
+    failed = stale.filter(attempts__gte=F("max_attempts")).update(
+        status=Task.TaskStatus.FAILED, last_error="Worker timed out"
+    )
+    return failed + stale.update(status=Task.TaskStatus.QUEUED, locked_by="")
+
+
+def _finish(task_id: int, worker_id: str, **values) -> None:
+    # A task requeued and claimed elsewhere meanwhile belongs to that worker now.
+    rows = Task.objects.filter(pk=task_id)
+    if worker_id:
+        rows = rows.filter(locked_by=worker_id)
+    rows.update(locked_by="", updated_at=timezone.now(), **values)
+
+
+def execute_task(task_id: int, worker_id: str = "") -> str:
+    close_old_connections()
+    try:
+        task_row = Task.objects.get(pk=task_id)
+        func = _registry.get(task_row.name)
+        if func is None:
+            logger.error("Task %s names unknown task %r", task_row.pk, task_row.name)
+            _finish(
+                task_id,
+                worker_id,
+                status=Task.TaskStatus.FAILED,
+                last_error=f"Unknown task: {task_row.name}",
+            )
+            return Task.TaskStatus.FAILED
+        try:
+            func(*task_row.args, **task_row.kwargs)
+        except Exception:
+            error = traceback.format_exc()
+            logger.warning("Task %s (%s) failed", task_row.pk, task_row.name)
+            if task_row.attempts >= task_row.max_attempts:
+                status, run_at = Task.TaskStatus.FAILED, task_row.run_at
+            else:
+                backoff = getattr(settings, "CRM_TASK_RETRY_BACKOFF", 30)
+                status = Task.TaskStatus.QUEUED
+                run_at = timezone.now() + timedelta(
+                    seconds=backoff * 2 ** (task_row.attempts - 1)
+                )
+            _finish(task_id, worker_id, status=status, run_at=run_at, last_error=error)
+            return status
+        _finish(task_id, worker_id, status=Task.TaskStatus.SUCCEEDED)
+        return Task.TaskStatus.SUCCEEDED
+    finally:
+        close_old_connections()
+
+
+class Worker:
+    """Polls the configured queues and runs claimed tasks on a pool.
+
+    ``queues`` maps each queue name to the number of its tasks that may run at
+    the same time; the pool is sized to the sum of those limits.
+    """
+
+    def __init__(self, queues: dict, pool="thread", poll_interval=1.0):
+        self.queues = queues
+        self.pool = pool
+        self.poll_interval = poll_interval
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.timeout = timedelta(seconds=getattr(settings, "CRM_TASK_TIMEOUT", 900))
+        self._stopping = threading.Event()
+        self._inflight = {queue: set() for queue in queues}
+
+    def stop(self, *args):
+        self._stopping.set()
+
+    def _executor(self):
+        size = sum(self.queues.values())
+        if self.pool == "process":
+            connections.close_all()
+            return ProcessPoolExecutor(
+                max_workers=size,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=django.setup,
+            )
+        return ThreadPoolExecutor(max_workers=size, thread_name_prefix="crm-task")
+
+    def run(self, burst=False):
+        """Process tasks until stopped; with ``burst`` exit once the queues are empty."""
+
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, self.stop)
+            signal.signal(signal.SIGINT, self.stop)
+        last_recovery = 0.0
+        with self._executor() as executor:
+            while not self._stopping.is_set():
+                if time.monotonic() - last_recovery > self.timeout.total_seconds() / 4:
+                    heartbeat(self.worker_id)
+                    requeue_stale_tasks(self.timeout)
+                    last_recovery = time.monotonic()
+                claimed = 0
+                for queue, limit in self.queues.items():
+                    inflight = self._inflight[queue]
+                    free = limit - len(inflight)
+                    if free <= 0:
+                        continue
+                    for task_id in claim_tasks(queue, free, self.worker_id):
+                        future = executor.submit(execute_task, task_id, self.worker_id)
+                        inflight.add(future)
+                        future.add_done_callback(inflight.discard)
+                        claimed += 1
+                busy = any(self._inflight.values())
+                if burst and not claimed and not busy:
+                    break
+                if not claimed:
+                    self._stopping.wait(self.poll_interval)
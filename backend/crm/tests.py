@@ -1,3 +1,1514 @@
-from django.test import TestCase
+import asyncio
+import base64
+import csv
+import gzip
+import os
+import re
+import tempfile
+import threading
+import zlib
+import unittest
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from decimal import ROUND_HALF_UP, Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import (
+    RequestFactory,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework import viewsets
+
+from .admin import EstimatedCountPaginator, ScalableAdminMixin
+from .analytics import (
+    cohort_week,
+    rebuild_territories,
+    refresh_lead_cohorts,
+    refresh_territories,
+)
+from .billing import generate_schedules
+from .bordereau import BordereauImporter
+from .changes import ChangeFeed
+from .commissions import compute_statements, month_periods
+from .compression import CODECS, CompressionMiddleware, negotiate
+from .dashboard import DashboardBroadcaster, broadcaster, build_dashboard_metrics
+from .dedup import build_blocks, find_duplicates, merge_clients
+from .document_generation import generate_documents
+from .filters import DateRangeFilter, Filter, check_indexed_filters
+from .lead_buffer import write_leads
+from .ledger import client_ledger, outstanding_statements
+from .matching import ContactIndex, contact_index
+from .models import (
+    ChangeEvent,
+    Client,
+    CommissionLine,
+    CommissionSchedule,
+    Document,
+    ImportRun,
+    InsuranceProduct,
+    Invoice,
+    Lead,
+    LeadCohort,
+    NumberSequence,
+    Policy,
+    PolicyStatusChange,
+    ReminderDispatch,
+    Renewal,
+    Task,
+    TerritoryRollup,
+)
+from .numbering import NumberAllocator, _reserve_separately
+from .pdf import build_pdf
+from .profiling import Capture, save_capture
+from .purge import apply_retention, purge_client, request_client_purge
+from .renderers import FastJSONRenderer
+from .reminders import DispatchResult, _record, queue_reminders, send_pending
+from .renewal_calendar import check_calendar_cache, renewal_calendar
+from .snapshots import export_snapshot, pa
+from .tasks import (
+    claim_tasks,
+    enqueue,
+    execute_task,
+    heartbeat,
+    requeue_stale_tasks,
+    task,
+)
+from .urls import router
+
+LOCMEM_CACHE = "django.core.cache.backends.locmem.LocMemCache"
+
+
+@task(max_attempts=2)
+def failing_task():
+    raise RuntimeError("boom")
+
+
+def pdf_text(data: bytes) -> str:
+    """Decode the text shown by the ``Tj`` operators of every page stream."""
+
+    lines = []
+    for match in re.finditer(rb"/Length (\d+) /Filter /FlateDecode >>\nstream\n", data):
+        stream = data[match.end() : match.end() + int(match.group(1))]
+        for literal in re.findall(rb"\(((?:[^()\\]|\\.)*)\) Tj", zlib.decompress(stream)):
+            lines.append(re.sub(rb"\\(.)", rb"\1", literal).decode("cp1252"))
+    return "\n".join(lines)
+
+
+def reference_commission_lines(periods) -> set:
+    """Straightforward Decimal version of ``compute_statements`` lines."""
+
+    schedules = list(CommissionSchedule.objects.all())
+
+    def status_on(policy, day):
+        changes = list(policy.status_changes.order_by("changed_on"))
+        if not changes:
+            return policy.status
+        applicable = [change for change in changes if change.changed_on <= day]
+        return (applicable[-1] if applicable else changes[0]).status
+
+    def schedule_for(basis, category, status, day):
+        for wanted in (status, ""):
+            for schedule in schedules:
+                if (
+                    (schedule.basis, schedule.category, schedule.policy_status)
+                    == (basis, category, wanted)
+                    and schedule.effective_from <= day
+                    and (schedule.effective_to is None or day <= schedule.effective_to)
+                ):
+                    return schedule
+        return None
+
+    items = [
+        ("written", policy, policy.premium_amount, policy.start_date)
+        for policy in Policy.objects.exclude(start_date=None)
+    ] + [
+        (
+            "collected",
+            invoice.policy,
+            invoice.amount,
+            invoice.paid_on or invoice.issue_date,
+        )
+        for invoice in Invoice.objects.filter(status="paid")
+    ]
+    bases = {}
+    for basis, policy, amount, day in items:
+        period = next((start for start, end in periods if start <= day <= end), None)
+        if period is None:
+            continue
+        status = status_on(policy, day)
+        schedule = schedule_for(basis, policy.product.category, status, day)
+        key = (period, policy.pk, schedule, basis, status)
+        bases[key] = bases.get(key, Decimal("0")) + amount
+    return {
+        (
+            period,
+            policy_id,
+            schedule.pk,
+            basis,
+            status,
+            base,
+            schedule.rate,
+            (base * schedule.rate).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP),
+        )
+        for (period, policy_id, schedule, basis, status), base in bases.items()
+    }
+
+
+if pa is not None:
+    import pyarrow.parquet as pq
+
+
+@unittest.skipIf(pa is None, "pyarrow is not installed")
+class SnapshotTests(TestCase):
+    def test_lead_submission_id_round_trip(self):
+        submission_id = uuid.uuid4()
+        Lead.objects.create(
+            name="Ana Rivera",
+            phone="787-555-0100",
+            email="ana@example.com",
+            submission_id=submission_id,
+        )
+        Lead.objects.create(name="Luis Ortiz", phone="787-555-0101", email="l@ex.com")
+        with tempfile.TemporaryDirectory() as output:
+            export_snapshot(output, tables=["leads"])
+            table = pq.read_table(f"{output}/leads")
+        self.assertEqual(table.schema.field("submission_id").type, pa.string())
+        self.assertCountEqual(
+            table.column("submission_id").to_pylist(), [str(submission_id), None]
+        )
+
+    def test_merged_clients_rewrite_the_policy_partitions(self):
+        primary, duplicate = (
+            Client.objects.create(first_name="Ana", last_name="Rivera") for _ in range(2)
+        )
+        policy = Policy.objects.create(
+            client=duplicate, product=InsuranceProduct.objects.create(name="Auto")
+        )
+        old = timezone.now() - timedelta(days=400)
+        Policy.objects.filter(pk=policy.pk).update(created_at=old, updated_at=old)
+        with tempfile.TemporaryDirectory() as output:
+            export_snapshot(output, tables=["policies"])
+            merge_clients(primary.pk, [duplicate.pk])
+            summary = export_snapshot(output, tables=["policies"])
+            table = pq.read_table(f"{output}/policies")
+        self.assertEqual(summary["policies"]["rewritten"], 1)
+        self.assertEqual(table.column("client_id").to_pylist(), [primary.pk])
+
+
+@override_settings(CRM_CHANGE_LOG_SETTLE_SECONDS=0, CRM_PURGE_THROTTLE_SECONDS=0)
+class AnalyticsDeletionTests(TransactionTestCase):
+    def test_lead_retention_keeps_closed_cohorts(self):
+        old = timezone.now() - timedelta(days=800)
+        client = Client.objects.create(first_name="Ana", last_name="Rivera")
+        for number in range(10):
+            Lead.objects.create(name=f"Lead {number}", phone="787-555-0100", email="")
+        leads = Lead.objects.order_by("pk")
+        leads.update(created_at=old)
+        Lead.objects.filter(pk=leads[0].pk).update(
+            converted_client=client, converted_at=old + timedelta(days=2)
+        )
+        with self.settings(CRM_RETENTION_DAYS={}):
+            refresh_lead_cohorts()
+        cohort = LeadCohort.objects.get(week=cohort_week(old))
+        self.assertEqual((cohort.leads, cohort.converted), (10, 1))
+
+        self.assertEqual(apply_retention(["leads"]), {})
+        self.assertEqual(Lead.objects.count(), 10)
+        with self.settings(CRM_RETENTION_DAYS={"leads": 730}):
+            apply_retention(["leads"])
+            refresh_lead_cohorts()
+        self.assertEqual(Lead.objects.count(), 1)
+        cohort.refresh_from_db()
+        self.assertEqual((cohort.leads, cohort.converted), (10, 1))
+
+    def test_purge_refreshes_only_the_client_territory(self):
+        kept = Client.objects.create(first_name="Luis", last_name="Ortiz", city="Ponce")
+        purged = Client.objects.create(
+            first_name="Ana", last_name="Rivera", city="Caguas"
+        )
+        rebuild_territories()
+        refresh_territories()
+        kept_rollup = TerritoryRollup.objects.get(territory__clients=kept)
+
+        purge_client(purged.pk)
+        refresh_territories()
+        self.assertFalse(TerritoryRollup.objects.exclude(pk=kept_rollup.pk).exists())
+        self.assertEqual(
+            TerritoryRollup.objects.get().refreshed_at, kept_rollup.refreshed_at
+        )
+
+
+class PurgeVisibilityTests(TestCase):
+    def test_clients_waiting_for_purge_are_hidden_everywhere(self):
+        product = InsuranceProduct.objects.create(name="Auto")
+        kept, purged = (
+            Client.objects.create(
+                first_name="Ana", last_name="Rivera", email="ana@example.com"
+            )
+            for _ in range(2)
+        )
+        for number, client in enumerate((kept, purged)):
+            policy = Policy.objects.create(
+                client=client, product=product, policy_number=f"POL-{number}"
+            )
+            Renewal.objects.create(policy=policy, renewal_date=date(2027, 1, 31))
+            Invoice.objects.create(
+                policy=policy,
+                invoice_number=f"INV-{number}",
+                issue_date=date(2026, 2, 1),
+                amount=Decimal("10"),
+            )
+            Document.objects.create(client=client, title="Licencia")
+        request_client_purge(purged)
+
+        for path in ("policies", "renewals", "invoices", "documents"):
+            with self.subTest(path=path):
+                response = self.client.get(
+                    f"/api/{path}/", HTTP_ACCEPT="application/json"
+                )
+                self.assertEqual(len(response.json()), 1)
+        summary = build_dashboard_metrics()["summary"]
+        self.assertEqual(
+            (
+                summary["total_clients"],
+                summary["total_policies"],
+                summary["invoices_pending"],
+            ),
+            (1, 1, 1),
+        )
+        self.assertEqual(find_duplicates(), [])
+        self.assertEqual(list(build_blocks()[0]), [kept.pk])
+
+
+class BordereauTests(TestCase):
+    def test_reimport_does_not_duplicate_unnumbered_invoices(self):
+        product = InsuranceProduct.objects.create(name="Auto Plus")
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "bordereau.csv")
+            with open(path, "w", newline="") as handle:
+                writer = csv.writer(handle)
+                writer.writerow(
+                    [
+                        "poliza",
+                        "nombre",
+                        "producto",
+                        "monto",
+                        "fecha_factura",
+                        "estado_factura",
+                    ]
+                )
+                writer.writerow(
+                    ["B-1", "Ana Rivera", product.name, "100", "2026-01-01", "paid"]
+                )
+                writer.writerow(
+                    ["B-1", "Ana Rivera", product.name, "100", "2026-02-01", ""]
+                )
+            for restart in (False, True):
+                BordereauImporter(path, workers=0).run(restart=restart)
+        invoices = Invoice.objects.order_by("issue_date")
+        self.assertEqual(
+            [(str(invoice.issue_date), invoice.paid_on) for invoice in invoices],
+            [("2026-01-01", invoices[0].issue_date), ("2026-02-01", None)],
+        )
+
+    def test_xlsx_is_refused_up_front_without_openpyxl(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "bordereau.xlsx")
+            with open(path, "wb") as handle:
+                handle.write(b"PK")
+            with mock.patch("crm.bordereau.openpyxl", None):
+                with self.assertRaisesMessage(CommandError, "Instala openpyxl"):
+                    call_command("import_bordereau", path, stdout=StringIO())
+        self.assertFalse(ImportRun.objects.exists())
+
+
+class RenewalCalendarTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        shared = self.settings(
+            CACHES={
+                "default": {
+                    "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                    "LOCATION": directory.name,
+                }
+            }
+        )
+        shared.enable()
+        self.addCleanup(shared.disable)
+
+    def test_reminder_status_update_invalidates_calendar(self):
+        day = date(2026, 3, 4)
+        policy = Policy.objects.create(
+            client=Client.objects.create(first_name="Ana", last_name="Rivera"),
+            product=InsuranceProduct.objects.create(name="Auto Plus"),
+            renewal_date=day,
+        )
+        renewal = Renewal.objects.create(
+            policy=policy, renewal_date=day, status=Renewal.RenewalStatus.SCHEDULED
+        )
+
+        def statuses():
+            return renewal_calendar(day, day)[0]["products"][0]["renewals"]
+
+        self.assertEqual(statuses(), {"scheduled": 1})
+        with self.captureOnCommitCallbacks(execute=True):
+            dispatch = ReminderDispatch.objects.create(
+                kind=ReminderDispatch.Kind.RENEWAL,
+                object_id=renewal.pk,
+                cycle=day.isoformat(),
+                recipient="ana@example.com",
+            )
+            _record([dispatch], [], DispatchResult())
+        self.assertEqual(statuses(), {"sent": 1})
+
+    def test_product_rename_invalidates_calendar(self):
+        day = date(2026, 3, 4)
+        product = InsuranceProduct.objects.create(name="Auto Plus")
+        Policy.objects.create(
+            client=Client.objects.create(first_name="Ana", last_name="Rivera"),
+            product=product,
+            renewal_date=day,
+        )
+
+        def name():
+            return renewal_calendar(day, day, "month")[0]["products"][0]["name"]
+
+        self.assertEqual(name(), "Auto Plus")
+        product = InsuranceProduct.objects.get(pk=product.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            product.name = "Auto Total"
+            product.save()
+        self.assertEqual(name(), "Auto Total")
+
+    def test_process_local_cache_is_not_used(self):
+        day = date(2026, 3, 4)
+        policy = Policy.objects.create(
+            client=Client.objects.create(first_name="Ana", last_name="Rivera"),
+            product=InsuranceProduct.objects.create(name="Auto Plus"),
+            renewal_date=day,
+        )
+        with self.settings(CACHES={"default": {"BACKEND": LOCMEM_CACHE}}):
+            self.assertEqual([error.id for error in check_calendar_cache()], ["crm.W004"])
+            self.assertEqual(renewal_calendar(day, day)[0]["policies"], 1)
+            # A write another process made: this one never sees its invalidation.
+            Policy._base_manager.filter(pk=policy.pk).update(
+                status=Policy.PolicyStatus.CANCELLED
+            )
+            self.assertEqual(renewal_calendar(day, day)[0]["policies"], 0)
+
+
+class ReminderTests(TestCase):
+    def test_past_renewals_are_not_queued(self):
+        today = date(2026, 3, 4)
+        policy = Policy.objects.create(
+            client=Client.objects.create(
+                first_name="Ana", last_name="Rivera", email="ana@example.com"
+            ),
+            product=InsuranceProduct.objects.create(name="Auto Plus"),
+        )
+        upcoming, past = (
+            Renewal(
+                policy=policy,
+                renewal_date=today + timedelta(days=offset),
+                status=Renewal.RenewalStatus.SCHEDULED,
+            )
+            for offset in (10, -10)
+        )
+        Renewal.objects.bulk_create([upcoming, past])
+        self.assertEqual(queue_reminders(today), 1)
+        self.assertEqual(
+            list(ReminderDispatch.objects.values_list("object_id", flat=True)),
+            [upcoming.pk],
+        )
+
+    def test_items_no_longer_due_are_skipped_at_send_time(self):
+        today = date(2026, 3, 4)
+        policy = Policy.objects.create(
+            client=Client.objects.create(
+                first_name="Ana", last_name="Rivera", email="ana@example.com"
+            ),
+            product=InsuranceProduct.objects.create(name="Auto Plus"),
+        )
+        cancelled, due = (
+            Renewal.objects.create(
+                policy=policy,
+                renewal_date=today + timedelta(days=10),
+                status=Renewal.RenewalStatus.SCHEDULED,
+            )
+            for _ in range(2)
+        )
+        paid = Invoice.objects.create(
+            policy=policy,
+            amount=Decimal("100.00"),
+            issue_date=today - timedelta(days=40),
+            due_date=today - timedelta(days=10),
+            status=Invoice.InvoiceStatus.OVERDUE,
+        )
+        self.assertEqual(queue_reminders(today), 3)
+        Renewal.objects.filter(pk=cancelled.pk).update(
+            status=Renewal.RenewalStatus.CANCELLED
+        )
+        Invoice.objects.filter(pk=paid.pk).update(status=Invoice.InvoiceStatus.PAID)
+
+        result = send_pending(workers=1, today=today)
+        self.assertEqual((result.sent, result.skipped, result.failed), (1, 2, 0))
+        self.assertEqual(len(mail.outbox), 1)
+        statuses = {
+            (kind, object_id): status
+            for kind, object_id, status in ReminderDispatch.objects.values_list(
+                "kind", "object_id", "status"
+            )
+        }
+        self.assertEqual(
+            statuses,
+            {
+                ("renewal", cancelled.pk): "skipped",
+                ("renewal", due.pk): "sent",
+                ("invoice", paid.pk): "skipped",
+            },
+        )
+
+
+class InstallmentTests(TestCase):
+    def test_premium_cut_below_issued_amount_issues_a_credit(self):
+        policy = Policy.objects.create(
+            client=Client.objects.create(first_name="Ana", last_name="Rivera"),
+            product=InsuranceProduct.objects.create(name="Auto Plus"),
+            premium_amount=Decimal("1200.00"),
+            start_date=date(2026, 1, 1),
+            payment_plan=Policy.PaymentPlan.QUARTERLY,
+        )
+        policies = Policy.objects.filter(pk=policy.pk)
+        today = date(2026, 5, 1)
+        generate_schedules(policies, today=today)
+        policies.update(premium_amount=Decimal("500.00"))
+        with self.assertLogs("crm.billing", "WARNING"):
+            for _ in range(2):
+                stats = generate_schedules(policies, today=today)
+
+        installments = policy.invoices.order_by("installment_number")
+        self.assertEqual(
+            [(invoice.amount, invoice.status) for invoice in installments],
+            [
+                (Decimal("300.00"), Invoice.InvoiceStatus.PENDING),
+                (Decimal("300.00"), Invoice.InvoiceStatus.PENDING),
+                (Decimal("-100.00"), Invoice.InvoiceStatus.PENDING),
+            ],
+        )
+        self.assertEqual(stats["credited"], 0)
+
+
+class LeadApiTests(TestCase):
+    def setUp(self):
+        self.client_record = Client.objects.create(
+            first_name="Ana", last_name="Rivera", email="ana@example.com"
+        )
+        self.lead = Lead.objects.create(
+            name="Ana Rivera",
+            phone="787-555-0100",
+            email="ana@example.com",
+            matched_client=self.client_record,
+            match_confidence=1.0,
+        )
+
+    def test_anonymous_callers_do_not_see_client_matches(self):
+        response = self.client.get("/api/leads/", HTTP_ACCEPT="application/json")
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("matched_client", response.json()[0])
+        response = self.client.get(f"/api/leads/?matched_client={self.client_record.pk}")
+        self.assertEqual(response.status_code, 403)
+        response = self.client.post(
+            "/api/leads/",
+            {"name": "Luis Ortiz", "phone": "787-555-0101", "email": "ana@example.com"},
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertNotIn("matched_client", response.json())
+
+    def test_staff_see_client_matches(self):
+        staff = User.objects.create_user("staff", password="secret", is_staff=True)
+        self.client.force_login(staff)
+        response = self.client.get(
+            f"/api/leads/{self.lead.pk}/", HTTP_ACCEPT="application/json"
+        )
+        self.assertEqual(response.json()["matched_client"], self.client_record.pk)
+
+
+class DedupTests(TestCase):
+    def create_client(self, first, last, email="", phone=""):
+        return Client.objects.create(
+            first_name=first, last_name=last, email=email, phone_primary=phone
+        )
+
+    def test_blocks_share_normalized_phone(self):
+        left = self.create_client("Ana", "Rivera", phone="(787) 555-0100")
+        right = self.create_client("Luis", "Ortiz", phone="1-787-555-0100")
+        _fingerprints, blocks = build_blocks()
+        self.assertEqual(blocks["p:7875550100"], [left.pk, right.pk])
+
+    def test_clusters_are_not_chained_through_a_shared_phone(self):
+        first = self.create_client("Ana", "Rivera", "ana@example.com", "787-555-0100")
+        second = self.create_client("Ana", "Rivera", "ana@example.com", "787-555-0199")
+        third = self.create_client("Ana", "Rivera", "", "787-555-0199")
+        proposals = find_duplicates()
+        self.assertEqual(
+            [(proposal.primary_id, proposal.duplicate_ids) for proposal in proposals],
+            [(first.pk, [second.pk])],
+        )
+        self.assertNotIn(third.pk, proposals[0].duplicate_ids)
+
+    def test_no_input_merges_only_confident_groups(self):
+        self.create_client("Ana", "Rivera", "ana@example.com")
+        self.create_client("Ana", "Rivera", "ana@example.com")
+        self.create_client("Luis", "Ortiz", phone="787-555-0100")
+        self.create_client("Luis", "Ortiz", phone="787-555-0100")
+        call_command("dedupe_clients", "--merge", "--no-input", stdout=StringIO())
+        self.assertEqual(Client.objects.filter(last_name="Rivera").count(), 1)
+        self.assertEqual(Client.objects.filter(last_name="Ortiz").count(), 2)
+
+    def test_merge_repoints_policies_and_leads(self):
+        primary = self.create_client("Ana", "Rivera", "ana@example.com")
+        duplicate = self.create_client("Ana", "Rivera", phone="787-555-0100")
+        policy = Policy.objects.create(
+            client=duplicate, product=InsuranceProduct.objects.create(name="Auto Plus")
+        )
+        lead = Lead.objects.create(
+            name="Ana Rivera", phone="", email="", matched_client=duplicate
+        )
+        merge_clients(primary.pk, [duplicate.pk])
+        primary.refresh_from_db()
+        self.assertEqual(primary.phone_primary, "787-555-0100")
+        self.assertFalse(Client.objects.filter(pk=duplicate.pk).exists())
+        policy.refresh_from_db()
+        lead.refresh_from_db()
+        self.assertEqual((policy.client_id, lead.matched_client_id), (primary.pk,) * 2)
+
+
+@override_settings(CRM_CHANGE_LOG_SETTLE_SECONDS=0)
+class ChangeFeedTests(TransactionTestCase):
+    def events(self):
+        return list(ChangeEvent.objects.values_list("operation", "object_id"))
+
+    def test_replayed_lead_submissions_are_logged_once(self):
+        record = {
+            "name": "Luis Ortiz",
+            "phone": "787-555-0101",
+            "email": "luis@example.com",
+            "submission_id": str(uuid.uuid4()),
+            "source": "web_form",
+            "attachment": "",
+            "matched_client": None,
+            "match_confidence": None,
+        }
+        self.assertEqual(write_leads([record]), 1)
+        self.assertEqual(write_leads([record]), 0)
+        lead = Lead.objects.get(submission_id=record["submission_id"])
+        self.assertEqual(self.events(), [("create", lead.pk)])
+
+    def test_events_are_written_once_on_commit(self):
+        with transaction.atomic():
+            client = Client.objects.create(first_name="Ana", last_name="Rivera")
+            Client.objects.filter(pk=client.pk).update(email="ana@example.com")
+            self.assertEqual(self.events(), [])
+        self.assertEqual(self.events(), [("create", client.pk), ("update", client.pk)])
+
+        with self.assertRaises(ValueError), transaction.atomic():
+            Client.objects.filter(pk=client.pk).update(email="")
+            raise ValueError
+        self.assertEqual(len(self.events()), 2)
+
+    def test_updates_are_logged_in_chunks(self):
+        for number in range(5):
+            Lead.objects.create(name=f"Lead {number}", phone="787-555-0100", email="")
+        ChangeEvent.objects.all().delete()
+        leads = Lead.objects.filter(source="web_form")
+        with mock.patch.object(type(leads), "update_chunk_size", 2):
+            with CaptureQueriesContext(connection) as queries:
+                rows = leads.update(source="import")
+        self.assertEqual(rows, 5)
+        self.assertFalse(Lead.objects.filter(source="web_form").exists())
+        self.assertCountEqual(
+            self.events(),
+            [("update", pk) for pk in Lead.objects.values_list("pk", flat=True)],
+        )
+        updates = [q for q in queries if q["sql"].startswith('UPDATE "crm_lead"')]
+        self.assertEqual(len(updates), 3)
+
+    def test_readers_wait_for_the_settle_delay(self):
+        Client.objects.create(first_name="Ana", last_name="Rivera")
+        feed = ChangeFeed("tests")
+        with self.settings(CRM_CHANGE_LOG_SETTLE_SECONDS=60):
+            self.assertEqual(feed.read(), [])
+            ChangeEvent.objects.update(created_at=timezone.now() - timedelta(seconds=61))
+            self.assertEqual(len(feed.read()), 1)
+
+    def test_consumers_keep_their_own_position(self):
+        clients = [
+            Client.objects.create(first_name=f"Cliente {number}", last_name="Rivera")
+            for number in range(3)
+        ]
+        Policy.objects.create(
+            client=clients[0], product=InsuranceProduct.objects.create(name="Auto")
+        )
+        seen = []
+        clients_feed = ChangeFeed("clients", models=["crm.client"])
+        self.assertEqual(clients_feed.consume(seen.extend, batch_size=2), 3)
+        self.assertEqual([event.object_id for event in seen], [c.pk for c in clients])
+        self.assertEqual(clients_feed.position, seen[-1].pk)
+        self.assertEqual(clients_feed.consume(seen.extend), 0)
+
+        def fail(events):
+            raise RuntimeError
+
+        everything = ChangeFeed("everything")
+        with self.assertRaises(RuntimeError):
+            everything.consume(fail)
+        self.assertEqual(everything.position, 0)
+        self.assertEqual(everything.consume(lambda events: None), 4)
+        everything.ack(1)
+        self.assertEqual(everything.position, ChangeEvent.objects.last().pk)
+
+
+@override_settings(CRM_CONTACT_INDEX=True)
+class ContactIndexTests(TransactionTestCase):
+    def setUp(self):
+        self.client_record = Client.objects.create(
+            first_name="Ana", last_name="Rivera", email="ana@example.com"
+        )
+        contact_index.warm()
+        self.addCleanup(contact_index.reset)
+
+    def test_rolled_back_saves_are_not_indexed(self):
+        with self.assertRaises(ValueError), transaction.atomic():
+            Client.objects.create(
+                first_name="Luis", last_name="Ortiz", phone_primary="787-555-0100"
+            )
+            raise ValueError
+        self.assertEqual(contact_index.match(phone="787-555-0100"), (None, None))
+
+        client = Client.objects.create(
+            first_name="Luis", last_name="Ortiz", phone_primary="787-555-0100"
+        )
+        self.assertEqual(contact_index.match(phone="787-555-0100"), (client.pk, 0.5))
+
+    def test_refresh_replays_bulk_updates_deletes_and_purges(self):
+        index = ContactIndex()
+        other = Client.objects.create(
+            first_name="Luis", last_name="Ortiz", email="luis@example.com"
+        )
+        purged = Client.objects.create(
+            first_name="Eva", last_name="Cruz", email="eva@example.com"
+        )
+        index.warm()
+        self.assertEqual(index.match(email="luis@example.com"), (other.pk, 0.7))
+        Client.objects.filter(pk=self.client_record.pk).update(
+            email="ana.rivera@example.com"
+        )
+        Client.objects.filter(pk=purged.pk).update(purge_requested_at=timezone.now())
+        other.delete()
+        index.refresh()
+        self.assertEqual(index.match(email="ana@example.com"), (None, None))
+        self.assertEqual(
+            index.match(email="ana.rivera@example.com"), (self.client_record.pk, 0.7)
+        )
+        self.assertEqual(index.match(email="luis@example.com"), (None, None))
+        self.assertEqual(index.match(email="eva@example.com"), (None, None))
+
+
+class NumberingTests(TransactionTestCase):
+    day = date(2026, 1, 1)
+
+    def sequence_value(self, name):
+        return NumberSequence.objects.get(name=name).next_value
+
+    def test_interleaved_allocators_never_share_numbers(self):
+        first, second = NumberAllocator(), NumberAllocator()
+        numbers = []
+        for _ in range(3):
+            numbers += first.allocate("policy", 30, on_date=self.day)
+            numbers += second.allocate("policy", 30, on_date=self.day)
+        self.assertEqual(len(set(numbers)), 180)
+        self.assertEqual(self.sequence_value("policy-2026"), 201)
+
+    def test_separate_reservation_returns_consecutive_blocks(self):
+        self.assertEqual(_reserve_separately("invoice-2026", 500), range(1, 501))
+        self.assertEqual(_reserve_separately("invoice-2026", 10), range(501, 511))
+        self.assertEqual(self.sequence_value("invoice-2026"), 511)
+
+    @unittest.skipUnless(connection.vendor == "sqlite", "SQLite reserves in-transaction")
+    def test_nested_reservation_joins_the_transaction_on_sqlite(self):
+        allocator = NumberAllocator()
+        with self.assertRaises(ValueError), transaction.atomic():
+            self.assertEqual(
+                allocator.allocate("invoice", 3, on_date=self.day),
+                ["INV-2026-0000001", "INV-2026-0000002", "INV-2026-0000003"],
+            )
+            self.assertEqual(self.sequence_value("invoice-2026"), 4)
+            raise ValueError
+        self.assertEqual(
+            allocator.allocate("invoice", 1, on_date=self.day), ["INV-2026-0000001"]
+        )
+        self.assertEqual(self.sequence_value("invoice-2026"), 501)
+
+    @unittest.skipUnless(connection.vendor == "postgresql", "PostgreSQL only")
+    def test_nested_reservation_commits_separately_on_postgresql(self):
+        allocator = NumberAllocator()
+        with self.assertRaises(ValueError), transaction.atomic():
+            allocator.allocate("invoice", 3, on_date=self.day)
+            raise ValueError
+        self.assertEqual(self.sequence_value("invoice-2026"), 501)
+        self.assertEqual(
+            allocator.allocate("invoice", 1, on_date=self.day), ["INV-2026-0000004"]
+        )
+
+
+class AdminScalingTests(TestCase):
+    def test_paginator_uses_the_estimated_count(self):
+        with mock.patch("crm.admin.estimated_count", return_value=(250_000, True)):
+            paginator = EstimatedCountPaginator(Client.objects.all(), 100)
+            self.assertEqual(paginator.num_pages, 2500)
+        self.assertEqual(EstimatedCountPaginator([1, 2, 3], 2).count, 3)
+
+    def test_checks_flag_unindexed_dates_and_distinct_filters(self):
+        class ClientScanAdmin(ScalableAdminMixin, admin.ModelAdmin):
+            date_hierarchy = "purge_requested_at"
+            list_filter = ("city",)
+
+        ids = {error.id for error in ClientScanAdmin(Client, admin.site).check()}
+        self.assertEqual(ids, {"crm.W001", "crm.W003"})
+        self.assertEqual(
+            [
+                error.id
+                for error in admin.site._registry[Lead].check()
+                if error.id.startswith("crm.")
+            ],
+            [],
+        )
+
+    def test_lead_changelist_does_not_scan_for_filter_values(self):
+        LeadCohort.objects.create(
+            week=date(2026, 3, 2), source="facebook", insurance_type="auto"
+        )
+        Lead.objects.create(name="Ana Rivera", phone="787-555-0100", email="")
+        self.client.force_login(
+            User.objects.create_superuser("admin", password="secret", email="")
+        )
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/admin/crm/lead/")
+        self.assertContains(response, "?source=facebook")
+        self.assertFalse(
+            [
+                query["sql"]
+                for query in queries
+                if "DISTINCT" in query["sql"] and '"crm_lead"."source"' in query["sql"]
+            ]
+        )
+
+
+@override_settings(CRM_TASK_RETRY_BACKOFF=30)
+class TaskQueueTests(TestCase):
+    def test_claims_by_priority_once(self):
+        low = enqueue(failing_task, priority=0)
+        high = enqueue(failing_task, priority=5)
+        enqueue(failing_task, queue="purge")
+        self.assertEqual(claim_tasks("default", 1, "worker-a"), [high.pk])
+        self.assertEqual(claim_tasks("default", 5, "worker-b"), [low.pk])
+        self.assertEqual(claim_tasks("default", 5, "worker-c"), [])
+        high.refresh_from_db()
+        self.assertEqual(
+            (high.status, high.locked_by, high.attempts), ("running", "worker-a", 1)
+        )
+
+    def test_failures_back_off_then_fail(self):
+        row = failing_task.defer()
+        claim_tasks("default", 1, "worker-a")
+        started = timezone.now()
+        with self.assertLogs("crm.tasks", "WARNING"):
+            self.assertEqual(execute_task(row.pk, "worker-a"), Task.TaskStatus.QUEUED)
+        row.refresh_from_db()
+        self.assertEqual(row.locked_by, "")
+        self.assertGreaterEqual(row.run_at, started + timedelta(seconds=30))
+        self.assertIn("RuntimeError: boom", row.last_error)
+
+        Task.objects.filter(pk=row.pk).update(run_at=timezone.now())
+        claim_tasks("default", 1, "worker-a")
+        with self.assertLogs("crm.tasks", "WARNING"):
+            self.assertEqual(execute_task(row.pk, "worker-a"), Task.TaskStatus.FAILED)
+
+    def test_unregistered_names_are_not_imported(self):
+        row = enqueue("os.getcwd")
+        claim_tasks("default", 1, "worker-a")
+        with self.assertLogs("crm.tasks", "ERROR"):
+            self.assertEqual(execute_task(row.pk, "worker-a"), Task.TaskStatus.FAILED)
+        row.refresh_from_db()
+        self.assertEqual(row.last_error, "Unknown task: os.getcwd")
+
+    def test_heartbeat_keeps_long_tasks_from_being_requeued(self):
+        alive, dead = enqueue(failing_task), enqueue(failing_task)
+        claim_tasks("default", 1, "worker-a")
+        claim_tasks("default", 1, "worker-b")
+        Task.objects.update(locked_at=timezone.now() - timedelta(hours=1))
+        heartbeat("worker-a")
+        self.assertEqual(requeue_stale_tasks(timedelta(minutes=15)), 1)
+        self.assertEqual(
+            dict(Task.objects.values_list("pk", "status")),
+            {alive.pk: "running", dead.pk: "queued"},
+        )
+        # The requeued run's late result no longer applies once another worker owns it.
+        claim_tasks("default", 1, "worker-c")
+        with self.assertLogs("crm.tasks", "WARNING"):
+            execute_task(dead.pk, "worker-b")
+        dead.refresh_from_db()
+        self.assertEqual((dead.status, dead.locked_by), ("running", "worker-c"))
+
+
+class DocumentGenerationTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        # Render in threads: spawned workers would not see the test database rows,
+        # and closing connections would end the test transaction.
+        self.enterContext(
+            mock.patch(
+                "crm.document_generation._executor",
+                lambda workers: ThreadPoolExecutor(workers),
+            )
+        )
+        self.policy = Policy.objects.create(
+            client=Client.objects.create(first_name="Ana", last_name="Rivera"),
+            product=InsuranceProduct.objects.create(name="Auto Plus"),
+            policy_number="POL-001",
+            premium_amount=Decimal("1200.00"),
+        )
+
+    def test_rerunning_skips_or_replaces_instead_of_duplicating(self):
+        ids = [self.policy.pk]
+        self.assertEqual(
+            generate_documents("policy", ids, workers=1),
+            {"created": 1, "replaced": 0, "unchanged": 0},
+        )
+        first = Document.objects.get()
+        self.assertEqual(
+            generate_documents("policy", ids, workers=1),
+            {"created": 0, "replaced": 0, "unchanged": 1},
+        )
+        Policy.objects.filter(pk=self.policy.pk).update(premium_amount=Decimal("900.00"))
+        with self.captureOnCommitCallbacks(execute=True):
+            stats = generate_documents("policy", ids, workers=1)
+        self.assertEqual(stats, {"created": 0, "replaced": 1, "unchanged": 0})
+
+        document = Document.objects.get()
+        self.assertEqual(document.pk, first.pk)
+        self.assertNotEqual(document.generated_version, first.generated_version)
+        self.assertFalse(first.file.storage.exists(first.file.name))
+        self.assertIn("900.00", pdf_text(document.file.read()))
+
+    def test_pdf_writer_output_parses(self):
+        text = "Línea (1) con acentos\\ y paréntesis\n" + "relleno\n" * 60
+        data = build_pdf(text, title="Póliza POL-001")
+        self.assertTrue(data.startswith(b"%PDF-1.4\n"))
+        startxref = int(re.search(rb"startxref\n(\d+)\n%%EOF\n$", data).group(1))
+        xref = data[startxref:].split(b"trailer")[0].split(b"\n")
+        count = int(xref[1].split()[1])
+        offsets = [int(entry[:10]) for entry in xref[3 : 2 + count]]
+        for number, offset in enumerate(offsets, start=1):
+            self.assertTrue(data[offset:].startswith(b"%d 0 obj\n" % number))
+        self.assertIn(b"/Count 2", data)
+        self.assertIn(b"/Title (P\xf3liza POL-001)", data)
+        page_text = pdf_text(data)
+        self.assertIn("Línea (1) con acentos\\ y paréntesis", page_text)
+        self.assertEqual(page_text.count("relleno"), 60)
+
+
+class DashboardStreamTests(TestCase):
+    def setUp(self):
+        self.lead = Lead.objects.create(name="Ana Rivera", phone="787-555-0100")
+        self.started = timezone.now().replace(hour=23, minute=59, second=0)
+
+    async def refresh_at(self, broadcaster, moment):
+        with mock.patch("django.utils.timezone.now", return_value=moment):
+            await broadcaster._refresh()
+
+    async def test_metrics_are_recomputed_on_period_and_date_rollover(self):
+        broadcaster = DashboardBroadcaster()
+        queue = asyncio.Queue()
+        broadcaster.subscribers.add(queue)
+        with mock.patch(
+            "crm.dashboard.build_dashboard_metrics", wraps=build_dashboard_metrics
+        ) as build:
+            await self.refresh_at(broadcaster, self.started)
+            self.assertEqual(broadcaster.snapshot["summary"]["leads_last_7_days"], 1)
+            await self.refresh_at(broadcaster, self.started + timedelta(seconds=30))
+            self.assertEqual(build.call_count, 1)
+            # Past midnight, well within CRM_DASHBOARD_REFRESH_SECONDS.
+            await self.refresh_at(broadcaster, self.started + timedelta(seconds=65))
+            self.assertEqual(build.call_count, 2)
+            self.assertTrue(queue.empty())
+            await self.refresh_at(broadcaster, self.started + timedelta(days=8))
+            self.assertEqual(build.call_count, 3)
+        message = queue.get_nowait()
+        self.assertEqual(message["summary"], {"leads_last_7_days": 0})
+        self.assertEqual(message["alerts"]["leads"], [])
+
+    @override_settings(CRM_DASHBOARD_STREAM_SECONDS=1)
+    async def test_stream_sends_snapshot_then_deltas(self):
+        user = await User.objects.acreate(username="staff", is_staff=True)
+        await sync_to_async(self.async_client.force_login)(user)
+        response = await self.async_client.get("/api/dashboard/stream/")
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        self.assertNotIn("Content-Encoding", response)
+        events = response.streaming_content
+        try:
+            self.assertEqual(await anext(events), b"retry: 3000\n\n")
+            snapshot = await anext(events)
+            self.assertTrue(snapshot.startswith(b"event: snapshot\ndata: {"))
+            self.assertIn(b'"leads_last_7_days":1', snapshot)
+            broadcaster._publish({"summary": {"leads_last_7_days": 2}})
+            self.assertEqual(
+                await anext(events),
+                b'event: metrics\ndata: {"summary":{"leads_last_7_days":2}}\n\n',
+            )
+            # The stream ends after CRM_DASHBOARD_STREAM_SECONDS and unsubscribes.
+            self.assertEqual([chunk async for chunk in events], [b": keep-alive\n\n"])
+        finally:
+            broadcaster._task.cancel()
+            broadcaster.snapshot = broadcaster._task = None
+        self.assertEqual(broadcaster.subscribers, set())
+
+    async def test_stream_requires_staff(self):
+        user = await User.objects.acreate(username="agent")
+        await sync_to_async(self.async_client.force_login)(user)
+        response = await self.async_client.get("/api/dashboard/stream/")
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(broadcaster.subscribers, set())
+
+
+@override_settings(TIME_ZONE="America/Puerto_Rico")
+class FastSerializationTests(TestCase):
+    """The fast path must return the same bytes as DRF for every opted-in viewset."""
+
+    def setUp(self):
+        staff = User.objects.create(username="staff", is_staff=True)
+        self.client.force_login(staff)
+        self.customer = Client.objects.create(
+            first_name="José", last_name="Rivera ", email="jose@example.com"
+        )
+        product = InsuranceProduct.objects.create(
+            name="Auto Plus", category=InsuranceProduct.ProductCategory.AUTO
+        )
+        self.policy = Policy.objects.create(
+            client=self.customer,
+            product=product,
+            policy_number="POL-001",
+            premium_amount=Decimal("1234.5"),
+            start_date=date(2026, 1, 31),
+            payment_plan=Policy.PaymentPlan.MONTHLY,
+        )
+        Renewal.objects.create(policy=self.policy, renewal_date=date(2027, 1, 31))
+        Invoice.objects.create(
+            policy=self.policy,
+            invoice_number="INV-1",
+            issue_date=date(2026, 2, 1),
+            amount=Decimal("-100.1"),
+            paid_on=None,
+        )
+        Document.objects.create(
+            client=self.customer, title="Licencia", file="documents/licencia.pdf"
+        )
+        Lead.objects.create(
+            name="Ana",
+            phone="787-555-0100",
+            email="ana@example.com",
+            matched_client=self.customer,
+            match_confidence=0.7,
+        )
+
+    def assertSameBytes(self, path):
+        with self.settings(CRM_FAST_SERIALIZATION=False):
+            expected = self.client.get(path)
+        with self.settings(CRM_FAST_SERIALIZATION=True):
+            response = self.client.get(path)
+        self.assertEqual(expected.status_code, 200)
+        self.assertIs(type(response.accepted_renderer), FastJSONRenderer)
+        self.assertEqual(response.content, expected.content)
+
+    def assertViewSetMatches(self, prefix, model):
+        self.assertSameBytes(f"/api/{prefix}/")
+        self.assertSameBytes(f"/api/{prefix}/{model.objects.get().pk}/")
+
+    def test_clients(self):
+        self.assertViewSetMatches("clients", Client)
+
+    def test_products(self):
+        self.assertViewSetMatches("products", InsuranceProduct)
+
+    def test_policies(self):
+        self.assertSameBytes("/api/policies/")
+        self.assertSameBytes("/api/policies/POL-001/")
+
+    def test_renewals(self):
+        self.assertViewSetMatches("renewals", Renewal)
+
+    def test_invoices(self):
+        self.assertViewSetMatches("invoices", Invoice)
+
+    def test_documents(self):
+        self.assertViewSetMatches("documents", Document)
+
+    def test_leads(self):
+        self.assertViewSetMatches("leads", Lead)
+        self.assertIn(b'"match_confidence":0.7', self.client.get("/api/leads/").content)
+
+
+class CompressionTests(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.middleware = CompressionMiddleware(lambda request: None)
+
+    def process(self, response, accept="gzip", path="/api/products/"):
+        request = self.factory.get(path, HTTP_ACCEPT_ENCODING=accept)
+        return self.middleware.process_response(request, response)
+
+    def test_negotiation_follows_q_values_and_preference(self):
+        self.assertIsNone(negotiate(""))
+        self.assertIsNone(negotiate("identity, gzip;q=0"))
+        self.assertEqual(negotiate("gzip;q=0.5, deflate").name, "gzip")
+        self.assertEqual(negotiate("*").name, next(iter(CODECS)))
+        self.assertEqual(negotiate("gzip, *;q=0.1").name, "gzip")
+        self.assertIsNone(negotiate("gzip;q=abc"))
+        if "br" in CODECS:
+            self.assertEqual(negotiate("gzip;q=0.8, br").name, "br")
+            self.assertEqual(negotiate("br;q=0.5, GZIP").name, "gzip")
+
+    def test_large_json_is_compressed_and_etag_weakened(self):
+        body = b'{"items":[' + b'"poliza",' * 500 + b'""]}'
+        response = HttpResponse(body, content_type="application/json")
+        response["ETag"] = '"abc"'
+        response = self.process(response)
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(response["Vary"], "Accept-Encoding")
+        self.assertEqual(response["ETag"], 'W/"abc"')
+        self.assertEqual(int(response["Content-Length"]), len(response.content))
+        self.assertEqual(gzip.decompress(response.content), body)
+
+    def test_small_other_path_and_binary_bodies_are_left_alone(self):
+        cases = [
+            (HttpResponse(b"{}", content_type="application/json"), "/api/products/"),
+            (HttpResponse(b"x" * 5000, content_type="application/json"), "/admin/"),
+            (HttpResponse(b"x" * 5000, content_type="application/pdf"), "/api/docs/"),
+        ]
+        for response, path in cases:
+            with self.subTest(path=path):
+                self.assertFalse(
+                    self.process(response, path=path).has_header("Content-Encoding")
+                )
+
+    def test_event_streams_are_never_compressed(self):
+        response = StreamingHttpResponse(
+            iter([b"event: snapshot\ndata: {}\n\n"]), content_type="text/event-stream"
+        )
+        response = self.process(response, accept="gzip, br, zstd")
+        self.assertFalse(response.has_header("Content-Encoding"))
+        self.assertEqual(b"".join(response), b"event: snapshot\ndata: {}\n\n")
+
+    def test_streamed_chunks_are_flushed_one_by_one(self):
+        chunks = [b'{"row":%d}\n' % number for number in range(3)]
+        response = StreamingHttpResponse(iter(chunks), content_type="application/json")
+        response["Content-Length"] = "33"
+        response = self.process(response)
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertFalse(response.has_header("Content-Length"))
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        received = [decompressor.decompress(part) for part in response]
+        # Each chunk decodes as soon as it arrives, nothing waits in the compressor.
+        self.assertEqual(received[:3], chunks)
+        self.assertEqual(b"".join(received), b"".join(chunks))
+        self.assertTrue(decompressor.eof)
+
+
+class IndexedFilterTests(TestCase):
+    def setUp(self):
+        policy = Policy.objects.create(
+            client=Client.objects.create(first_name="Ana", last_name="Rivera"),
+            product=InsuranceProduct.objects.create(name="Auto Plus"),
+            policy_number="POL-001",
+        )
+        self.invoices = [
+            Invoice.objects.create(
+                policy=policy,
+                invoice_number=f"INV-{number}",
+                issue_date=issue_date,
+                amount=Decimal("100.00"),
+                is_manual=True,
+            )
+            for number, issue_date in enumerate(
+                [date(2026, 1, 1), date(2026, 2, 1), date(2026, 2, 1)]
+            )
+        ]
+
+    def ids(self, response):
+        self.assertEqual(response.status_code, 200, response.content)
+        return [row["id"] for row in response.json()]
+
+    def test_only_unindexed_filters_are_refused(self):
+        response = self.client.get("/api/invoices/", {"is_manual": "true"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("no usan un índice", response.json()["detail"])
+        self.assertIn("status", response.json()["detail"])
+        response = self.client.get(
+            "/api/invoices/", {"is_manual": "true", "status": "draft,pending"}
+        )
+        self.assertEqual(len(self.ids(response)), 3)
+        response = self.client.get("/api/invoices/", {"issue_date_after": "2026-02-01"})
+        self.assertEqual(len(self.ids(response)), 2)
+
+    def test_ordering_is_whitelisted_with_a_pk_tiebreak(self):
+        response = self.client.get("/api/invoices/", {"ordering": "amount"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("ordering", response.json())
+        first, second, third = (invoice.pk for invoice in self.invoices)
+        self.assertEqual(
+            self.ids(self.client.get("/api/invoices/", {"ordering": "-issue_date"})),
+            [third, second, first],
+        )
+        self.assertEqual(
+            self.ids(self.client.get("/api/invoices/", {"ordering": "issue_date"})),
+            [first, second, third],
+        )
+
+    def test_requests_without_limit_keep_the_plain_list(self):
+        self.assertEqual(len(self.ids(self.client.get("/api/invoices/"))), 3)
+        page = self.client.get("/api/invoices/", {"limit": 2, "ordering": "issue_date"})
+        body = page.json()
+        self.assertEqual((body["count"], body["count_is_estimate"]), (3, False))
+        self.assertEqual(len(body["results"]), 2)
+        self.assertIn("offset=2", body["next"])
+        self.assertIsNone(body["previous"])
+
+    def test_unindexed_filters_and_orderings_are_reported(self):
+        self.assertEqual(check_indexed_filters(None), [])
+        viewset = type(
+            "NotesViewSet",
+            (viewsets.ModelViewSet,),
+            {
+                "queryset": Client.objects.all(),
+                "query_filters": {
+                    "notes": Filter("notes"),
+                    "city": Filter("city", indexed=False),
+                    "updated": DateRangeFilter("updated_at", is_datetime=True),
+                },
+                "ordering_fields": ("updated_at", "notes"),
+            },
+        )
+        with mock.patch.object(router, "registry", [("notes", viewset, "notes")]):
+            warnings = check_indexed_filters(None)
+        self.assertEqual([warning.id for warning in warnings], ["crm.W002"] * 2)
+        self.assertEqual(
+            [warning.msg for warning in warnings],
+            [
+                "Filter 'notes' (notes) is not backed by an index.",
+                "Ordering 'notes' is not backed by an index.",
+            ],
+        )
+
+
+class CommissionTests(TestCase):
+    def setUp(self):
+        auto = InsuranceProduct.objects.create(name="Auto Plus", category="auto")
+        life = InsuranceProduct.objects.create(name="Vida", category="life")
+        customer = Client.objects.create(first_name="Ana", last_name="Rivera")
+        CommissionSchedule.objects.bulk_create(
+            [
+                CommissionSchedule(
+                    category=category,
+                    policy_status=status,
+                    basis=basis,
+                    rate=Decimal(rate),
+                    effective_from=start,
+                    effective_to=end,
+                )
+                for category, status, basis, rate, start, end in [
+                    ("auto", "", "collected", "0.1250", date(2026, 1, 1), None),
+                    ("auto", "lapsed", "collected", "0.0500", date(2026, 1, 1), None),
+                    (
+                        "auto",
+                        "",
+                        "written",
+                        "0.1000",
+                        date(2026, 1, 1),
+                        date(2026, 1, 31),
+                    ),
+                    ("auto", "", "written", "0.2000", date(2026, 2, 1), None),
+                    ("life", "", "collected", "0.0333", date(2026, 1, 1), None),
+                ]
+            ]
+        )
+        # Lapsed now, but active when its January premium was written and paid.
+        lapsed = Policy.objects.create(
+            client=customer,
+            product=auto,
+            status=Policy.PolicyStatus.LAPSED,
+            start_date=date(2026, 1, 10),
+            premium_amount=Decimal("1234.55"),
+        )
+        PolicyStatusChange.objects.filter(policy=lapsed).delete()
+        PolicyStatusChange.objects.bulk_create(
+            [
+                PolicyStatusChange(
+                    policy=lapsed, status="active", changed_on=date(2025, 12, 1)
+                ),
+                PolicyStatusChange(
+                    policy=lapsed, status="lapsed", changed_on=date(2026, 2, 15)
+                ),
+            ]
+        )
+        active = Policy.objects.create(
+            client=customer,
+            product=auto,
+            status=Policy.PolicyStatus.ACTIVE,
+            start_date=date(2026, 2, 3),
+            premium_amount=Decimal("999.99"),
+        )
+        life_policy = Policy.objects.create(
+            client=customer, product=life, status=Policy.PolicyStatus.ACTIVE
+        )
+        for policy, amount, issued, paid_on, status in [
+            # Issued in January, paid in February after the policy lapsed.
+            (lapsed, "0.12", date(2026, 1, 5), date(2026, 2, 20), "paid"),
+            (lapsed, "100.10", date(2026, 1, 20), date(2026, 1, 25), "paid"),
+            (lapsed, "0.12", date(2026, 1, 21), date(2026, 1, 28), "paid"),
+            (active, "-0.12", date(2026, 2, 1), date(2026, 2, 10), "paid"),
+            (active, "80.00", date(2026, 2, 27), date(2026, 3, 2), "paid"),
+            (life_policy, "45.45", date(2026, 2, 14), None, "paid"),
+            (life_policy, "50.00", date(2026, 2, 14), None, "pending"),
+        ]:
+            invoice = Invoice.objects.create(
+                policy=policy,
+                amount=Decimal(amount),
+                issue_date=issued,
+                paid_on=paid_on,
+                status=status,
+            )
+            if paid_on is None:
+                # Paid before paid_on existed: the issue date stands in for it.
+                Invoice.objects.filter(pk=invoice.pk).update(paid_on=None)
+
+    def test_statements_match_a_decimal_reference(self):
+        periods = month_periods(2026)[:2]
+        statements = compute_statements(periods)
+        lines = {
+            (
+                line.statement.period_start,
+                line.policy_id,
+                line.schedule_id,
+                line.basis,
+                line.policy_status,
+                line.base_amount,
+                line.rate,
+                line.amount,
+            )
+            for line in CommissionLine.objects.select_related("statement")
+        }
+        expected = reference_commission_lines(periods)
+        self.assertEqual(lines, expected)
+        self.assertEqual(len(lines), 6)
+        # Half-up rounding away from zero, once per line.
+        self.assertEqual(
+            sorted(line[-1] for line in lines),
+            [
+                Decimal("-0.02"),
+                Decimal("0.01"),
+                Decimal("1.51"),
+                Decimal("12.53"),
+                Decimal("123.46"),
+                Decimal("200.00"),
+            ],
+        )
+        for statement in statements:
+            period_lines = [line for line in lines if line[0] == statement.period_start]
+            self.assertEqual(
+                statement.commission_total, sum(line[-1] for line in period_lines)
+            )
+            self.assertEqual(statement.line_count, len(period_lines))
+            self.assertEqual(statement.unmatched_count, 0)
+        self.assertEqual(
+            [statement.collected_premium for statement in statements],
+            [Decimal("100.22"), Decimal("45.45")],
+        )
+
+    def test_status_changes_are_recorded_for_saves_and_bulk_updates(self):
+        policy = Policy.objects.filter(status=Policy.PolicyStatus.ACTIVE).first()
+        today = timezone.localdate()
+        policy.status = Policy.PolicyStatus.CANCELLED
+        policy.save()
+        self.assertEqual(policy.status_changes.get(changed_on=today).status, "cancelled")
+        Policy.objects.filter(pk=policy.pk).update(status=Policy.PolicyStatus.EXPIRED)
+        self.assertEqual(
+            list(policy.status_changes.values_list("changed_on", "status")),
+            [(today, "expired")],
+        )
+
+
+class LedgerTests(TestCase):
+    def setUp(self):
+        product = InsuranceProduct.objects.create(name="Auto")
+        self.clients = [
+            Client.objects.create(first_name=name, last_name="Rivera")
+            for name in ("Ana", "Luis", "Marta")
+        ]
+        self.policies = [
+            Policy.objects.create(client=client, product=product, policy_number=f"P-{n}")
+            for n, client in enumerate(self.clients)
+        ]
+
+    def create_invoices(self):
+        paid, pending, overdue, draft = (
+            Invoice.InvoiceStatus.PAID,
+            Invoice.InvoiceStatus.PENDING,
+            Invoice.InvoiceStatus.OVERDUE,
+            Invoice.InvoiceStatus.DRAFT,
+        )
+        rows = [
+            (0, "A-1", "100", date(2026, 1, 1), date(2026, 2, 1), paid, date(2026, 1, 9)),
+            (0, "A-2", "200", date(2026, 2, 1), date(2026, 3, 3), pending, None),
+            # Credit note: a negative charge lowers the balance and its bucket.
+            (0, "A-3", "-50", date(2026, 2, 10), date(2026, 2, 10), pending, None),
+            (0, "A-4", "75.50", date(2025, 10, 1), date(2025, 10, 31), overdue, None),
+            (0, "A-5", "999", date(2026, 2, 1), None, draft, None),
+            (1, "B-1", "300", date(2026, 1, 5), date(2026, 2, 4), paid, date(2026, 1, 6)),
+            (1, "B-2", "40", date(2026, 3, 1), date(2026, 3, 31), pending, None),
+            (2, "C-1", "60", date(2026, 1, 10), date(2026, 2, 9), paid, date(2026, 2, 1)),
+        ]
+        for policy, number, amount, issued, due, status, paid_on in rows:
+            Invoice.objects.create(
+                policy=self.policies[policy],
+                invoice_number=number,
+                amount=Decimal(amount),
+                issue_date=issued,
+                due_date=due,
+                status=status,
+                paid_on=paid_on,
+            )
+
+    def test_running_balance_and_aging(self):
+        self.create_invoices()
+        statement = client_ledger(self.clients[0].pk, as_of=date(2026, 3, 10))
+        self.assertEqual(
+            [
+                (
+                    entry["type"],
+                    entry["invoice_number"],
+                    entry["amount"],
+                    entry["balance"],
+                )
+                for entry in statement["entries"]
+            ],
+            [
+                ("charge", "A-4", "75.50", "75.50"),
+                ("charge", "A-1", "100.00", "175.50"),
+                ("payment", "A-1", "-100.00", "75.50"),
+                ("charge", "A-2", "200.00", "275.50"),
+                ("charge", "A-3", "-50.00", "225.50"),
+            ],
+        )
+        self.assertEqual(statement["balance"], "225.50")
+        self.assertEqual(
+            statement["aging"],
+            {
+                "current": "0.00",
+                "1-30": "150.00",
+                "31-60": "0.00",
+                "61-90": "0.00",
+                "90+": "75.50",
+            },
+        )
+        statement = client_ledger(self.clients[1].pk, as_of=date(2026, 3, 10))
+        self.assertEqual(statement["balance"], "40.00")
+        self.assertEqual(statement["aging"]["current"], "40.00")
+
+    def test_outstanding_statements_reads_clients_in_batches(self):
+        self.create_invoices()
+        # Two batches with one ledger query each, plus the empty batch that ends it.
+        with self.assertNumQueries(5):
+            statements = list(outstanding_statements(date(2026, 3, 10), batch_size=2))
+        self.assertEqual(
+            [(client.pk, statement["balance"]) for client, statement in statements],
+            [(self.clients[0].pk, "225.50"), (self.clients[1].pk, "40.00")],
+        )
+        self.assertEqual(
+            [
+                client.pk
+                for client, _ in outstanding_statements(date(2026, 3, 10), batch_size=1)
+            ],
+            [self.clients[0].pk, self.clients[1].pk],
+        )
+
+
+@override_settings(CRM_PROFILING_SAMPLE_RATE=0)
+class ProfilingTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.enterContext(self.settings(CRM_PROFILING_DIR=self.directory))
+
+    def basic_auth(self, username):
+        User.objects.create_user(
+            username, password="secret", is_staff=username == "staff"
+        )
+        token = base64.b64encode(f"{username}:secret".encode()).decode()
+        return {"HTTP_AUTHORIZATION": f"Basic {token}"}
+
+    def test_staff_api_credentials_can_request_a_profile(self):
+        for username, profiled in (("staff", True), ("agent", False)):
+            with self.subTest(username=username):
+                response = self.client.get(
+                    "/api/policies/", HTTP_X_CRM_PROFILE="1", **self.basic_auth(username)
+                )
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual("X-CRM-Profile-Samples" in response.headers, profiled)
+        response = self.client.get("/api/policies/", HTTP_X_CRM_PROFILE="1")
+        self.assertNotIn("X-CRM-Profile-Samples", response.headers)
+
+    def test_summary_reads_saved_captures(self):
+        capture = Capture(threading.get_ident(), None)
+        capture.stacks[("crm.views.list", "django.db.models.query.QuerySet.__iter__")] = 3
+        capture.stacks[
+            ("crm.views.list", "rest_framework.serializers.Serializer.data")
+        ] = 1
+        capture.samples = 4
+        save_capture("GET api/policies/", capture, 0.010, 200)
+        save_capture("GET api/policies/", capture, 0.020, 200)
+        with open(os.path.join(self.directory, "GET_api_policies.folded")) as handle:
+            self.assertEqual(
+                handle.readline(),
+                "GET api/policies/;crm.views.list;"
+                "django.db.models.query.QuerySet.__iter__ 3\n",
+            )
+
+        out = StringIO()
+        call_command("profile_summary", dir=self.directory, stdout=out)
+        report = out.getvalue()
+        self.assertIn("GET api/policies/  (GET_api_policies.folded)", report)
+        self.assertIn("2 requests, median 15.0 ms, max 20.0 ms, 8 samples", report)
+        self.assertIn("by layer: orm 75%, serializer 25%", report)
+        self.assertIn(" 75.0%  75.0%  django.db.models.query.QuerySet.__iter__", report)
+        self.assertIn(" 25.0%  25.0%  rest_framework.serializers.Serializer.data", report)
+        self.assertNotIn("crm.views.list", report)
+
+        call_command("profile_summary", dir=self.directory, clear=True, stdout=StringIO())
+        self.assertFalse(os.path.exists(self.directory))
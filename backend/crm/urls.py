@@ -4,7 +4,9 @@ from rest_framework import routers
 from .views import (
     ClientViewSet,
     DashboardMetricsView,
+    DashboardStreamView,
     DocumentViewSet,
+    FunnelAnalyticsView,
     InsuranceProductViewSet,
     InvoiceViewSet,
     LeadViewSet,
@@ -13,6 +15,7 @@ from .views import (
     SessionLoginView,
     SessionLogoutView,
     SessionStatusView,
+    TerritoryAnalyticsView,
 )
 
 router = routers.DefaultRouter()
@@ -26,6 +29,13 @@ router.register(r"leads", LeadViewSet)
 
 urlpatterns = router.urls + [
     path("dashboard/metrics/", DashboardMetricsView.as_view(), name="dashboard-metrics"),
+    path("dashboard/stream/", DashboardStreamView.as_view(), name="dashboard-stream"),
+    path(
+        "analytics/territories/",
+        TerritoryAnalyticsView.as_view(),
+        name="analytics-territories",
+    ),
+    path("analytics/funnel/", FunnelAnalyticsView.as_view(), name="analytics-funnel"),
     path("auth/login/", SessionLoginView.as_view(), name="session-login"),
     path("auth/logout/", SessionLogoutView.as_view(), name="session-logout"),
     path("auth/session/", SessionStatusView.as_view(), name="session-status"),
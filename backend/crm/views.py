@@ -1,172 +1,392 @@
-from datetime import timedelta
+from datetime import date, timedelta
 
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib.auth import authenticate, login, logout
+from django.http import JsonResponse, StreamingHttpResponse
 from django.utils import timezone
+from django.utils.dateparse import parse_date
 from django.utils.decorators import method_decorator
+from django.views import View
 from django.views.decorators.csrf import csrf_exempt
 from rest_framework import status, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import PermissionDenied
 from rest_framework.parsers import FormParser, MultiPartParser
-from rest_framework.permissions import AllowAny, BasePermission
+from rest_framework.permissions import SAFE_METHODS, AllowAny, BasePermission
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from rest_framework.views import APIView
 
+from .analytics import funnel_report, territory_report
+from .dashboard import broadcaster, build_dashboard_metrics, dashboard_events
+from .fast_serializers import FastReadMixin
+from .filters import BooleanFilter, ChoiceFilter, DateRangeFilter, Filter, IdFilter
+from .lead_buffer import lead_buffer
+from .ledger import client_ledger
+from .matching import contact_index
+from .purge import request_client_purge
+from .renewal_calendar import GRANULARITIES, renewal_calendar
 from .models import Client, Document, InsuranceProduct, Invoice, Lead, Policy, Renewal
 from .serializers import (
     ClientSerializer,
     DocumentSerializer,
     InsuranceProductSerializer,
     InvoiceSerializer,
+    LeadConversionSerializer,
     LeadSerializer,
     PolicySerializer,
     RenewalSerializer,
+    StaffLeadSerializer,
 )
 
 
-class ClientViewSet(viewsets.ModelViewSet):
-    queryset = Client.objects.all().order_by("last_name", "first_name")
+class DashboardAccessPermission(BasePermission):
+    message = "Acceso restringido al dashboard"
+
+    def has_permission(self, request, view):
+        user = getattr(request, "user", None)
+        return bool(user and user.is_authenticated and user.is_staff)
+
+
+class ClientViewSet(FastReadMixin, viewsets.ModelViewSet):
+    queryset = Client.objects.filter(purge_requested_at__isnull=True).order_by(
+        "last_name", "first_name"
+    )
     serializer_class = ClientSerializer
 
+    def destroy(self, request, *args, **kwargs):
+        """Hide the client and delete it with its policies in background chunks."""
+
+        request_client_purge(self.get_object())
+        return Response({"status": "purge_queued"}, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=True, methods=["get"], permission_classes=(DashboardAccessPermission,))
+    def ledger(self, request, pk=None):
+        """Charges and payments in date order with running balance and aging.
 
-class InsuranceProductViewSet(viewsets.ModelViewSet):
+        ``?as_of=AAAA-MM-DD`` sets the date the aging is computed for.
+        """
+
+        client = self.get_object()
+        as_of = None
+        if "as_of" in request.query_params:
+            as_of = parse_date(request.query_params["as_of"])
+            if as_of is None:
+                return Response(
+                    {"detail": "as_of debe tener formato AAAA-MM-DD."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+        return Response(client_ledger(client.pk, as_of))
+
+
+class InsuranceProductViewSet(FastReadMixin, viewsets.ModelViewSet):
     queryset = InsuranceProduct.objects.filter(is_active=True).order_by("name")
     serializer_class = InsuranceProductSerializer
 
 
-class PolicyViewSet(viewsets.ModelViewSet):
+class PolicyViewSet(FastReadMixin, viewsets.ModelViewSet):
     queryset = (
         Policy.objects.select_related("client", "product")
         .prefetch_related("renewals", "invoices")
-        .all()
+        .filter(client__purge_requested_at__isnull=True)
     )
     serializer_class = PolicySerializer
     lookup_field = "policy_number"
     lookup_value_regex = "[\w-]+"
-
-
-class RenewalViewSet(viewsets.ModelViewSet):
-    queryset = Renewal.objects.select_related("policy", "policy__client").all()
+    query_filters = {
+        "status": ChoiceFilter("status", Policy.PolicyStatus.choices),
+        "category": ChoiceFilter(
+            "product__category",
+            InsuranceProduct.ProductCategory.choices,
+            indexed=False,
+        ),
+        "product": IdFilter("product"),
+        "client": IdFilter("client"),
+        "renewal_date": DateRangeFilter("renewal_date"),
+        "created": DateRangeFilter("created_at", is_datetime=True),
+    }
+    ordering_fields = ("created_at", "renewal_date", "policy_number")
+
+
+class RenewalViewSet(FastReadMixin, viewsets.ModelViewSet):
+    queryset = Renewal.objects.select_related("policy", "policy__client").filter(
+        policy__client__purge_requested_at__isnull=True
+    )
     serializer_class = RenewalSerializer
+    query_filters = {
+        "status": ChoiceFilter("status", Renewal.RenewalStatus.choices),
+        "policy": IdFilter("policy"),
+        "client": IdFilter("policy__client"),
+        "renewal_date": DateRangeFilter("renewal_date"),
+    }
+    ordering_fields = ("renewal_date",)
+
+    @action(
+        detail=False,
+        methods=["get"],
+        permission_classes=(DashboardAccessPermission,),
+    )
+    def calendar(self, request):
+        granularity = request.query_params.get("granularity", "week")
+        if granularity not in GRANULARITIES:
+            return Response(
+                {"detail": "granularity debe ser 'week' o 'month'."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        start = timezone.now().date()
+        if "start" in request.query_params:
+            start = parse_date(request.query_params["start"])
+            if start is None:
+                return Response(
+                    {"detail": "start debe tener formato AAAA-MM-DD."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+        try:
+            months = min(max(int(request.query_params.get("months", 12)), 1), 24)
+        except ValueError:
+            return Response(
+                {"detail": "months debe ser un número entero."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
-
-class InvoiceViewSet(viewsets.ModelViewSet):
-    queryset = Invoice.objects.select_related("policy", "policy__client").all()
-    serializer_class = InvoiceSerializer
+        end_month = start.month - 1 + months
+        end = date(start.year + end_month // 12, end_month % 12 + 1, 1) - timedelta(
+            days=1
+        )
+        buckets = renewal_calendar(start, end, granularity)
+        return Response(
+            {
+                "granularity": granularity,
+                "start": start.isoformat(),
+                "end": end.isoformat(),
+                "buckets": buckets,
+            }
+        )
 
 
-class DocumentViewSet(viewsets.ModelViewSet):
-    queryset = Document.objects.select_related("client", "policy").all()
+class InvoiceViewSet(FastReadMixin, viewsets.ModelViewSet):
+    queryset = Invoice.objects.select_related("policy", "policy__client").filter(
+        policy__client__purge_requested_at__isnull=True
+    )
+    serializer_class = InvoiceSerializer
+    query_filters = {
+        "status": ChoiceFilter("status", Invoice.InvoiceStatus.choices),
+        "policy": IdFilter("policy"),
+        "policy_number": Filter("policy__policy_number"),
+        "client": IdFilter("policy__client"),
+        "is_manual": BooleanFilter("is_manual", indexed=False),
+        "issue_date": DateRangeFilter("issue_date"),
+        # Served by the (status, due_date) index, so it needs ?status=.
+        "due_date": DateRangeFilter("due_date", indexed=False),
+    }
+    ordering_fields = ("issue_date", "invoice_number")
+
+
+class DocumentViewSet(FastReadMixin, viewsets.ModelViewSet):
+    queryset = Document.objects.select_related("client", "policy").filter(
+        client__purge_requested_at__isnull=True
+    )
     serializer_class = DocumentSerializer
 
 
-class LeadViewSet(viewsets.ModelViewSet):
+class LeadViewSet(FastReadMixin, viewsets.ModelViewSet):
     queryset = Lead.objects.all()
     serializer_class = LeadSerializer
+    query_filters = {
+        "source": Filter("source"),
+        "insurance_type": ChoiceFilter(
+            "insurance_type", Lead.InsuranceType.choices, indexed=False
+        ),
+        "matched_client": IdFilter("matched_client"),
+        "created": DateRangeFilter("created_at", is_datetime=True),
+    }
+    ordering_fields = ("created_at",)
     parser_classes = (MultiPartParser, FormParser)
     permission_classes = (AllowAny,)
     authentication_classes: list = []
+    # Client matching reveals which contacts belong to clients: staff only.
+    staff_query_filters = ("matched_client",)
+    write_behind = True
+
+    def initialize_request(self, request, *args, **kwargs):
+        request = super().initialize_request(request, *args, **kwargs)
+        if request.method in SAFE_METHODS and not self.authentication_classes:
+            # Reads identify staff; the public form's posts stay anonymous, so
+            # they need no CSRF token.
+            request.authenticators = tuple(
+                authenticator()
+                for authenticator in api_settings.DEFAULT_AUTHENTICATION_CLASSES
+            )
+        return request
 
-    def perform_create(self, serializer):
-        serializer.save(source="web_form")
+    def is_staff_request(self) -> bool:
+        return DashboardAccessPermission().has_permission(self.request, self)
 
+    def get_serializer_class(self):
+        return StaffLeadSerializer if self.is_staff_request() else LeadSerializer
 
-class DashboardAccessPermission(BasePermission):
-    message = "Acceso restringido al dashboard"
+    def filter_queryset(self, queryset):
+        used = [
+            name for name in self.staff_query_filters if name in self.request.query_params
+        ]
+        if used and not self.is_staff_request():
+            raise PermissionDenied(
+                f"El filtro {', '.join(used)} es solo para el personal."
+            )
+        return super().filter_queryset(queryset)
 
-    def has_permission(self, request, view):
-        user = getattr(request, "user", None)
-        return bool(user and user.is_authenticated and user.is_staff)
+    def create(self, request, *args, **kwargs):
+        """Queue the lead for a batched insert (``crm.lead_buffer``) and answer 202.
+
+        Only with ``CRM_LEAD_BUFFER`` on (and ``write_behind`` left on the view);
+        otherwise the lead is inserted right away and the answer is 201.
+        """
+
+        if not (self.write_behind and getattr(settings, "CRM_LEAD_BUFFER", False)):
+            return super().create(request, *args, **kwargs)
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        submission_id = lead_buffer.submit(serializer.validated_data)
+        return Response(
+            {"submission_id": submission_id, "status": "queued"},
+            status=status.HTTP_202_ACCEPTED,
+        )
+
+    def perform_create(self, serializer):
+        client_id, confidence = contact_index.match(
+            phone=serializer.validated_data.get("phone", ""),
+            email=serializer.validated_data.get("email", ""),
+        )
+        if client_id and not Client.objects.filter(pk=client_id).exists():
+            client_id, confidence = None, None
+        serializer.save(
+            source="web_form",
+            matched_client_id=client_id,
+            match_confidence=confidence,
+        )
+
+    @action(
+        detail=True,
+        methods=["post"],
+        permission_classes=(DashboardAccessPermission,),
+        authentication_classes=api_settings.DEFAULT_AUTHENTICATION_CLASSES,
+        parser_classes=api_settings.DEFAULT_PARSER_CLASSES,
+    )
+    def convert(self, request, pk=None):
+        """Link the lead to the client (and policy) it became.
+
+        Without ``client`` the converted or matched client is used, or a new
+        client is created from the lead's contact data.
+        """
+
+        lead = self.get_object()
+        serializer = LeadConversionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        policy = serializer.validated_data.get("policy")
+        client = (
+            serializer.validated_data.get("client")
+            or lead.converted_client
+            or (policy.client if policy else None)
+            or lead.matched_client
+        )
+        if client is None:
+            first_name, _, last_name = lead.name.strip().partition(" ")
+            client = Client.objects.create(
+                first_name=first_name,
+                last_name=last_name,
+                email=lead.email,
+                phone_primary=lead.phone,
+            )
+        if policy is not None and policy.client_id != client.pk:
+            return Response(
+                {"policy": ["La póliza no pertenece al cliente del lead."]},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        lead.converted_client = client
+        lead.converted_policy = policy or lead.converted_policy
+        lead.converted_at = lead.converted_at or timezone.now()
+        lead.save(
+            update_fields=[
+                "converted_client",
+                "converted_policy",
+                "converted_at",
+                "updated_at",
+            ]
+        )
+        return Response(self.get_serializer(lead).data)
 
 
 class DashboardMetricsView(APIView):
     permission_classes = (DashboardAccessPermission,)
 
     def get(self, request):
-        today = timezone.now().date()
-        next_30_days = today + timedelta(days=30)
-        last_seven_days = timezone.now() - timedelta(days=7)
-
-        summary = {
-            "total_clients": Client.objects.count(),
-            "total_policies": Policy.objects.count(),
-            "active_policies": Policy.objects.filter(
-                status=Policy.PolicyStatus.ACTIVE
-            ).count(),
-            "pending_policies": Policy.objects.filter(
-                status=Policy.PolicyStatus.PENDING
-            ).count(),
-            "renewals_next_30_days": Policy.objects.filter(
-                renewal_date__range=(today, next_30_days)
-            ).count(),
-            "manual_invoices": Invoice.objects.filter(is_manual=True).count(),
-            "invoices_pending": Invoice.objects.exclude(
-                status=Invoice.InvoiceStatus.PAID
-            ).count(),
-            "leads_last_7_days": Lead.objects.filter(
-                created_at__gte=last_seven_days
-            ).count(),
-        }
+        return Response(build_dashboard_metrics())
 
-        renewal_alert_qs = (
-            Policy.objects.select_related("client", "product")
-            .filter(renewal_date__range=(today, next_30_days))
-            .order_by("renewal_date")[:5]
-        )
-        invoice_alert_qs = (
-            Invoice.objects.select_related("policy", "policy__client")
-            .filter(
-                status__in=[
-                    Invoice.InvoiceStatus.DRAFT,
-                    Invoice.InvoiceStatus.PENDING,
-                    Invoice.InvoiceStatus.OVERDUE,
-                ]
+
+class TerritoryAnalyticsView(APIView):
+    """Book of business per territory, read from the precomputed rollups."""
+
+    permission_classes = (DashboardAccessPermission,)
+
+    def get(self, request):
+        category = request.query_params.get("category", "")
+        if category and category not in InsuranceProduct.ProductCategory.values:
+            return Response(
+                {"detail": "category no es una categoría de producto válida."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return Response(
+            territory_report(
+                category,
+                country=request.query_params.get("country", ""),
+                state=request.query_params.get("state", ""),
             )
-            .order_by("-issue_date")[:5]
         )
-        lead_alert_qs = (
-            Lead.objects.filter(created_at__gte=last_seven_days)
-            .order_by("-created_at")[:5]
+
+
+class FunnelAnalyticsView(APIView):
+    """Lead conversion by weekly cohort, source and insurance type (precomputed)."""
+
+    permission_classes = (DashboardAccessPermission,)
+
+    def get(self, request):
+        bounds = {}
+        for name in ("start", "end"):
+            value = request.query_params.get(name)
+            if value:
+                bounds[name] = parse_date(value)
+                if bounds[name] is None:
+                    return Response(
+                        {"detail": f"{name} debe tener formato AAAA-MM-DD."},
+                        status=status.HTTP_400_BAD_REQUEST,
+                    )
+        return Response(
+            funnel_report(
+                **bounds,
+                source=request.query_params.get("source", ""),
+                insurance_type=request.query_params.get("insurance_type", ""),
+            )
         )
 
-        alerts = {
-            "renewals": [
-                {
-                    "policy_number": policy.policy_number,
-                    "client": str(policy.client),
-                    "product": policy.product.name,
-                    "renewal_date": policy.renewal_date.isoformat()
-                    if policy.renewal_date
-                    else None,
-                    "status": policy.status,
-                }
-                for policy in renewal_alert_qs
-            ],
-            "invoices": [
-                {
-                    "invoice_number": invoice.invoice_number,
-                    "policy_number": invoice.policy.policy_number,
-                    "client": str(invoice.policy.client),
-                    "status": invoice.status,
-                    "amount": str(invoice.amount),
-                    "due_date": invoice.due_date.isoformat()
-                    if invoice.due_date
-                    else None,
-                    "is_manual": invoice.is_manual,
-                }
-                for invoice in invoice_alert_qs
-            ],
-            "leads": [
-                {
-                    "name": lead.name,
-                    "insurance_type": lead.insurance_type,
-                    "created_at": lead.created_at.isoformat(),
-                    "phone": lead.phone,
-                }
-                for lead in lead_alert_qs
-            ],
-        }
 
-        data = {"summary": summary, "alerts": alerts}
-        return Response(data)
+class DashboardStreamView(View):
+    """Server-sent events with dashboard metric deltas (requires an ASGI server)."""
+
+    async def get(self, request):
+        allowed = await sync_to_async(
+            lambda: bool(request.user.is_authenticated and request.user.is_staff)
+        )()
+        if not allowed:
+            return JsonResponse({"detail": DashboardAccessPermission.message}, status=403)
+        queue = await broadcaster.subscribe()
+        max_seconds = getattr(settings, "CRM_DASHBOARD_STREAM_SECONDS", 300)
+        response = StreamingHttpResponse(
+            dashboard_events(queue, max_seconds), content_type="text/event-stream"
+        )
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"
+        return response
 
 
 @method_decorator(csrf_exempt, name="dispatch")
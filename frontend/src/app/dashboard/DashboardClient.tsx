@@ -109,7 +109,31 @@ export function DashboardClient() {
 
     load();
 
-    return () => controller.abort();
+    const events = new EventSource(`${config.apiBaseUrl}/dashboard/stream/`, {
+      withCredentials: true,
+    });
+    events.addEventListener("snapshot", (event) => {
+      setData(JSON.parse((event as MessageEvent).data) as DashboardResponse);
+    });
+    events.addEventListener("metrics", (event) => {
+      const delta = JSON.parse((event as MessageEvent).data) as {
+        summary?: Partial<Summary>;
+        alerts?: DashboardResponse["alerts"];
+      };
+      setData((current) =>
+        current
+          ? {
+              summary: { ...current.summary, ...delta.summary },
+              alerts: delta.alerts ?? current.alerts,
+            }
+          : current,
+      );
+    });
+
+    return () => {
+      controller.abort();
+      events.close();
+    };
   }, [router]);
 
   const summaryItems = useMemo(() => {